@@ -0,0 +1,132 @@
+"""
+Сборка процесса бота: бот, диспетчер, обработчики, планировщик, метрики, прогрев
+
+BotApp используется и в обычном режиме (один процесс, long polling или вебхук),
+и в воркерах супервизора (supervisor.py), которым обновления приходят сырым JSON.
+"""
+
+import asyncio
+import logging
+import signal
+from typing import Optional
+
+from maxapi import Bot, Dispatcher
+from maxapi.methods.types.getted_updates import process_update_webhook
+
+from config import (
+    BOT_TOKEN, METRICS_HOST, RECORD_UPDATES_SALT, PROFILE_DEFAULT_SECONDS, WARMUP_PRELOAD_USERS,
+    SCHEDULER_WORKERS, SCHEDULER_MAX_PENDING,
+)
+from handlers import DatingBotHandlers
+from database import db
+from db_async import adb
+from db_instrumentation import query_instrumentation
+from jobs import JobScheduler, build_scheduler
+from metrics import instrument_bot, set_ready, start_metrics_server
+from outbox import outbox
+from profiler import profiler
+from scheduler import UpdateScheduler, get_payload_user_id
+from tracing import tracer
+from update_recorder import UpdateRecorder
+from warmup import warm_up
+
+logger = logging.getLogger(__name__)
+
+
+class BotApp:
+    """Всё, что нужно процессу для обработки обновлений"""
+
+    def __init__(self, metrics_port: int = 0, record_path: str = '', rate_share: float = 1.0):
+        self.metrics_port = metrics_port
+        self.record_path = record_path
+        # Доля общего лимита исходящих сообщений (воркеры супервизора делят его между собой)
+        self.rate_share = rate_share
+        self.bot: Optional[Bot] = None
+        self.dp: Optional[Dispatcher] = None
+        self.handlers: Optional[DatingBotHandlers] = None
+        self.scheduler: Optional[UpdateScheduler] = None
+        self.jobs: Optional[JobScheduler] = None
+        self.recorder: Optional[UpdateRecorder] = None
+        self.metrics_server = None
+
+    async def start(self, polling: bool):
+        """Собрать бота и прогреть процесс; polling=False - обновления придут через handle_payload"""
+        self.bot = Bot(BOT_TOKEN)
+        instrument_bot(self.bot)
+        self.dp = Dispatcher()
+
+        # Регистрируем обработчики
+        self.handlers = DatingBotHandlers(self.dp, self.bot)
+        logger.info("✅ Обработчики зарегистрированы")
+
+        # Обновления одного пользователя - по порядку, разных пользователей - параллельно
+        if SCHEDULER_WORKERS:
+            self.scheduler = UpdateScheduler(SCHEDULER_WORKERS, SCHEDULER_MAX_PENDING)
+            self.scheduler.start()
+            if polling:
+                self.dp.handle = self.scheduler.wrap(self.dp.handle)
+
+        # Ответы обработчиков уходят через очередь с ограничением частоты
+        outbox.start(self.rate_share)
+
+        # Фоновое обслуживание (очистка, распад рейтинга); задачи над общей базой
+        # выполняет только один процесс из всех воркеров
+        self.jobs = build_scheduler()
+        if self.jobs:
+            self.jobs.start()
+
+        # Необязательная запись входящих обновлений для replay_updates.py
+        if self.record_path:
+            self.recorder = UpdateRecorder(self.record_path, RECORD_UPDATES_SALT, self.handlers.router.prefixes())
+            self.recorder.install(self.dp)
+
+        # Эндпоинт метрик для Prometheus
+        if self.metrics_port:
+            self.metrics_server = await start_metrics_server(METRICS_HOST, self.metrics_port)
+
+        # kill -USR2 <pid> снимает профиль на PROFILE_DEFAULT_SECONDS секунд
+        if hasattr(signal, 'SIGUSR2'):
+            loop = asyncio.get_running_loop()
+            loop.add_signal_handler(signal.SIGUSR2, lambda: profiler.start(PROFILE_DEFAULT_SECONDS, loop))
+
+        # Прогрев до приёма обновлений: пул, кэши, клавиатуры
+        try:
+            await warm_up(db, WARMUP_PRELOAD_USERS)
+        except Exception as e:
+            logger.warning(f"⚠️ Прогрев не удался, стартуем с холодными кэшами: {e}")
+            set_ready(True)
+
+        if not polling:
+            # start_polling делает это сам, для приёма JSON - вручную
+            await self.dp.startup(self.bot)
+
+    async def _handle_payload(self, update: dict):
+        event = await process_update_webhook(update, self.bot)
+        if event is not None:
+            await self.dp.handle(event)
+
+    async def handle_payload(self, update: dict):
+        """Обработать сырой JSON обновления (вебхук или супервизор)"""
+        # Разбор обновления maxapi может ходить в API, поэтому в очередь пользователя
+        # ставим ещё сырой JSON - иначе порядок его обновлений мог бы нарушиться
+        if self.scheduler:
+            await self.scheduler.submit(get_payload_user_id(update), lambda: self._handle_payload(update))
+        else:
+            await self._handle_payload(update)
+
+    async def stop(self):
+        set_ready(False)
+        if self.jobs:
+            await self.jobs.stop()
+        if self.scheduler:
+            await self.scheduler.stop()
+        await outbox.stop()
+        adb.close()
+        db.close_pool()
+        if self.metrics_server:
+            self.metrics_server.close()
+        logger.info("📊 Статистика запросов к БД:\n" + query_instrumentation.format_report())
+        tracer.close()
+        if self.recorder:
+            self.recorder.close()
+            logger.info(f"📼 Записано обновлений: {self.recorder.recorded}")
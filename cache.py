@@ -0,0 +1,90 @@
+"""
+LRU-кэш в памяти процесса для горячих чтений из БД
+
+Записи живут не дольше ttl секунд, чтобы изменения, сделанные другим процессом,
+рано или поздно стали видны. Попадания и промахи считаются в метрике
+dating_bot_cache_requests_total{cache=...}. maxsize=0 выключает кэш. С maxbytes
+кэш ограничен ещё и по памяти: размер записи считает sizeof (по умолчанию
+sys.getsizeof, что для строк точно).
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from metrics import observe_cache
+
+# Признак промаха (None — допустимое закэшированное значение)
+MISSING = object()
+
+
+class LRUCache:
+    """Кэш с вытеснением давно не использованных записей и сроком жизни"""
+
+    def __init__(self, name: str, maxsize: int, ttl: float, maxbytes: int = 0,
+                 sizeof: Callable[[Any], int] = sys.getsizeof):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.nbytes = 0
+        # ключ -> (значение, истекает, размер)
+        self._data: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        """Значение по ключу или MISSING"""
+        if not self.maxsize:
+            return MISSING
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] < time.monotonic():
+                del self._data[key]
+                self.nbytes -= entry[2]
+                entry = None
+            if entry is not None:
+                self._data.move_to_end(key)
+        observe_cache(self.name, entry is not None)
+        return entry[0] if entry is not None else MISSING
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Сохранить значение; ttl - срок жизни записи, если он меньше срока кэша"""
+        if not self.maxsize:
+            return
+        size = self.sizeof(value) if self.maxbytes else 0
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[2]
+            lifetime = self.ttl if ttl is None else min(ttl, self.ttl)
+            self._data[key] = (value, time.monotonic() + lifetime, size)
+            self.nbytes += size
+            while len(self._data) > self.maxsize or (self.maxbytes and self.nbytes > self.maxbytes):
+                _, evicted = self._data.popitem(last=False)
+                self.nbytes -= evicted[2]
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is not None:
+                self.nbytes -= entry[2]
+
+    def purge_expired(self) -> int:
+        """Удалить записи с истёкшим сроком; вернуть их число"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, entry in self._data.items() if entry[1] < now]
+            for key in expired:
+                self.nbytes -= self._data.pop(key)[2]
+        return len(expired)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,42 @@
+"""
+Кэш отрисованных карточек анкет
+
+Популярную анкету показывают тысячи раз в час, и каждый раз format_profile_card
+собирал одну и ту же строку. Карточка зависит только от профиля, поэтому ключ
+кэша - (вид карточки, user_id, updated_at). update_user сдвигает updated_at,
+и старая карточка просто перестаёт запрашиваться и со временем вытесняется:
+явная инвалидация не нужна, а другие процессы не увидят устаревшую карточку.
+Кэш ограничен и числом карточек, и памятью.
+"""
+
+from typing import Callable, Dict
+
+from cache import LRUCache, MISSING
+from config import PROFILE_CARD_CACHE_SIZE, PROFILE_CARD_CACHE_BYTES
+from keyboards import format_profile_card
+from utils import format_user_profile
+
+# Срок жизни не нужен: версия профиля входит в ключ
+card_cache = LRUCache('profile_cards', PROFILE_CARD_CACHE_SIZE, float('inf'), PROFILE_CARD_CACHE_BYTES)
+
+
+def _render(kind: str, profile: Dict, formatter: Callable[[Dict], str]) -> str:
+    updated_at = profile.get('updated_at')
+    if updated_at is None:
+        return formatter(profile)
+    key = (kind, profile['user_id'], updated_at)
+    card = card_cache.get(key)
+    if card is MISSING:
+        card = formatter(profile)
+        card_cache.set(key, card)
+    return card
+
+
+def render_profile_card(profile: Dict) -> str:
+    """Карточка чужой анкеты при просмотре (format_profile_card с кэшем)"""
+    return _render('card', profile, format_profile_card)
+
+
+def render_user_profile(user: Dict) -> str:
+    """Свой профиль (format_user_profile с кэшем)"""
+    return _render('own', user, format_user_profile)
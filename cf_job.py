@@ -0,0 +1,43 @@
+"""
+Пересчёт офлайн-рекомендаций (collaborative.py)
+
+Запускается по расписанию отдельно от бота:
+    python cf_job.py           # только пользователи с новыми лайками/дизлайками
+    python cf_job.py --full    # пересчитать всех
+"""
+
+import argparse
+import logging
+import sys
+from typing import List, Optional
+
+from config import DATABASE_URL, CF_CHUNK_USERS
+from collaborative import run_job
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Пересчёт рекомендаций «нравится похожим людям»')
+    parser.add_argument('--database-url', default=DATABASE_URL, help='строка подключения к БД')
+    parser.add_argument('--full', action='store_true', help='пересчитать всех, а не только изменившихся')
+    parser.add_argument('--chunk-size', type=int, default=CF_CHUNK_USERS,
+                        help='пользователей на один шаг записи')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    try:
+        stats = run_job(args.database_url, full=args.full, chunk_size=args.chunk_size)
+    except Exception as e:
+        print(f"❌ Ошибка пересчёта рекомендаций: {e}")
+        return 1
+
+    print(f"📊 Лайков: {stats['likes']}, загрузка {stats['load_seconds']:.1f} с, "
+          f"сходство {stats['similarity_seconds']:.1f} с, всего {stats['total_seconds']:.1f} с")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,231 @@
+"""
+Офлайн-рекомендации «нравится похожим людям» (коллаборативная фильтрация)
+
+Задача (cf_job.py) строит по таблице likes разреженную матрицу пользователь x
+анкета и считает сходство анкет (item-item): две анкеты похожи, если их лайкают
+одни и те же люди (косинус столбцов матрицы). Оценка кандидата для пользователя -
+сумма сходств с анкетами, которые он лайкнул, минус CF_DISLIKE_WEIGHT сходств с
+дизлайкнутыми. Всё считается операциями scipy.sparse, без циклов по лайкам.
+
+Для каждого пользователя в таблицу recommendations пишется CF_TOP_K лучших
+непросмотренных кандидатов; get_profile_for_user берёт кандидатов сначала оттуда.
+
+Задача инкрементальная: в job_state хранится водяной знак - последние
+обработанные id в likes и dislikes. Сходство каждый раз пересчитывается по всей
+матрице (это быстро), а оценки и запись - самая дорогая часть - только для
+пользователей с новыми лайками/дизлайками. --full пересчитывает всех.
+
+id выдаётся при вставке, а не при фиксации транзакции: лайк с id меньше водяного
+знака мог ещё не быть зафиксирован, когда задача читала снимок. Поэтому
+следующий запуск перепроверяет CF_WATERMARK_MARGIN id ниже водяного знака, и
+такой пользователь будет пересчитан.
+"""
+
+import io
+import json
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import psycopg2
+from scipy import sparse
+
+from config import CF_TOP_K, CF_NEIGHBOURS, CF_DISLIKE_WEIGHT, CF_CHUNK_USERS, CF_WATERMARK_MARGIN
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = 'collaborative'
+
+# Сколько строк likes/dislikes забирать с сервера за раз
+FETCH_SIZE = 100_000
+
+
+class Interactions:
+    """Лайки и дизлайки в виде разреженных матриц над общим индексом пользователей"""
+
+    def __init__(self, ids: List[str], likes: sparse.csr_matrix, dislikes: sparse.csr_matrix,
+                 watermark: Dict[str, int]):
+        self.ids = ids
+        self.index = {user_id: i for i, user_id in enumerate(ids)}
+        self.likes = likes
+        self.dislikes = dislikes
+        self.watermark = watermark
+
+
+def _load_pairs(conn, table: str, index: Dict[str, int], ids: List[str]) -> Tuple[np.ndarray, np.ndarray, int]:
+    rows, cols = [], []
+    max_id = 0
+    # Именованный курсор: строки приходят пачками, а не все сразу в память
+    with conn.cursor(name=f'cf_{table}') as cursor:
+        cursor.itersize = FETCH_SIZE
+        cursor.execute(f'SELECT id, user_from, user_to FROM {table}')
+        for row_id, user_from, user_to in cursor:
+            for user_id in (user_from, user_to):
+                if user_id not in index:
+                    index[user_id] = len(ids)
+                    ids.append(user_id)
+            rows.append(index[user_from])
+            cols.append(index[user_to])
+            max_id = max(max_id, row_id)
+    return np.array(rows, dtype=np.int32), np.array(cols, dtype=np.int32), max_id
+
+
+def load_interactions(conn) -> Interactions:
+    """Прочитать likes и dislikes одним снимком БД"""
+    conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+    try:
+        index: Dict[str, int] = {}
+        ids: List[str] = []
+        like_rows, like_cols, max_like = _load_pairs(conn, 'likes', index, ids)
+        dislike_rows, dislike_cols, max_dislike = _load_pairs(conn, 'dislikes', index, ids)
+        conn.commit()
+    finally:
+        conn.set_session(isolation_level='DEFAULT', readonly=False)
+
+    size = (len(ids), len(ids))
+    likes = sparse.csr_matrix((np.ones(len(like_rows), dtype=np.float32), (like_rows, like_cols)), shape=size)
+    dislikes = sparse.csr_matrix((np.ones(len(dislike_rows), dtype=np.float32), (dislike_rows, dislike_cols)),
+                                 shape=size)
+    return Interactions(ids, likes, dislikes, {'likes': max_like, 'dislikes': max_dislike})
+
+
+def top_k_per_row(matrix: sparse.csr_matrix, k: int) -> sparse.csr_matrix:
+    """Оставить в каждой строке k наибольших элементов"""
+    matrix = matrix.tocsr()
+    keep = np.zeros(matrix.nnz, dtype=bool)
+    indptr, data = matrix.indptr, matrix.data
+    for row in range(matrix.shape[0]):
+        start, end = indptr[row], indptr[row + 1]
+        if end - start <= k:
+            keep[start:end] = True
+        else:
+            keep[start + np.argpartition(data[start:end], -k)[-k:]] = True
+    matrix.data = np.where(keep, matrix.data, 0)
+    matrix.eliminate_zeros()
+    return matrix
+
+
+def item_similarity(likes: sparse.csr_matrix, neighbours: int = CF_NEIGHBOURS) -> sparse.csr_matrix:
+    """Косинусное сходство анкет по лайкам; у каждой анкеты neighbours ближайших"""
+    # Лайки бинарные, поэтому норма столбца - корень из числа лайков анкеты
+    norms = np.sqrt(np.asarray(likes.sum(axis=0)).ravel())
+    norms[norms == 0] = 1
+    normalized = likes @ sparse.diags(1 / norms).astype(np.float32)
+    similarity = (normalized.T @ normalized).tocsr()
+    similarity.setdiag(0)
+    similarity.eliminate_zeros()
+    return top_k_per_row(similarity, neighbours)
+
+
+def score_users(interactions: Interactions, similarity: sparse.csr_matrix, users: np.ndarray,
+                top_k: int = CF_TOP_K, dislike_weight: float = CF_DISLIKE_WEIGHT) -> sparse.csr_matrix:
+    """Оценки кандидатов для строк users: top_k лучших непросмотренных в каждой строке"""
+    likes = interactions.likes[users]
+    dislikes = interactions.dislikes[users]
+    scores = ((likes - dislike_weight * dislikes) @ similarity).tocsr()
+
+    # Убираем уже просмотренных и самого пользователя
+    seen = (likes + dislikes + sparse.csr_matrix(
+        (np.ones(len(users), dtype=np.float32), (np.arange(len(users)), users)), shape=likes.shape)).tocsr()
+    scores = scores - scores.multiply(seen > 0)
+    scores.data[scores.data < 0] = 0
+    scores.eliminate_zeros()
+    return top_k_per_row(scores, top_k)
+
+
+def read_watermark(conn) -> Optional[Dict[str, int]]:
+    """Водяной знак прошлого запуска (None - задача ещё не запускалась)"""
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT state FROM job_state WHERE job = %s', (JOB_NAME,))
+        row = cursor.fetchone()
+    conn.rollback()
+    return row[0] if row else None
+
+
+def changed_users(conn, since: Dict[str, int], until: Dict[str, int],
+                  margin: int = CF_WATERMARK_MARGIN) -> List[str]:
+    """Пользователи с лайками/дизлайками между двумя водяными знаками
+
+    margin id ниже since перепроверяются: там могут быть лайки, зафиксированные
+    после снимка прошлого запуска
+    """
+    with conn.cursor() as cursor:
+        cursor.execute('''
+            SELECT user_from FROM likes WHERE id > %s AND id <= %s
+            UNION
+            SELECT user_from FROM dislikes WHERE id > %s AND id <= %s
+        ''', (since.get('likes', 0) - margin, until['likes'], since.get('dislikes', 0) - margin, until['dislikes']))
+        users = [row[0] for row in cursor.fetchall()]
+    conn.rollback()
+    return users
+
+
+def write_recommendations(conn, interactions: Interactions, users: np.ndarray, scores: sparse.csr_matrix):
+    """Заменить рекомендации пользователей users (одна транзакция на шаг)"""
+    ids = interactions.ids
+    buffer = io.StringIO()
+    for row, user in enumerate(users):
+        start, end = scores.indptr[row], scores.indptr[row + 1]
+        for candidate, score in zip(scores.indices[start:end], scores.data[start:end]):
+            buffer.write(f'{ids[user]}\t{ids[candidate]}\t{score:.6g}\n')
+    buffer.seek(0)
+
+    with conn.cursor() as cursor:
+        cursor.execute('DELETE FROM recommendations WHERE user_id = ANY(%s)', ([ids[user] for user in users],))
+        cursor.copy_expert('COPY recommendations (user_id, candidate_id, score) FROM STDIN', buffer)
+    conn.commit()
+
+
+def save_watermark(conn, watermark: Dict[str, int]):
+    with conn.cursor() as cursor:
+        cursor.execute('''
+            INSERT INTO job_state (job, state) VALUES (%s, %s)
+            ON CONFLICT (job) DO UPDATE SET state = EXCLUDED.state, updated_at = NOW()
+        ''', (JOB_NAME, json.dumps(watermark)))
+    conn.commit()
+
+
+def run_job(database_url: str, full: bool = False, chunk_size: int = CF_CHUNK_USERS) -> Dict[str, float]:
+    """Пересчитать рекомендации; вернуть статистику запуска"""
+    started = time.perf_counter()
+    conn = psycopg2.connect(database_url)
+    try:
+        watermark = None if full else read_watermark(conn)
+        interactions = load_interactions(conn)
+        loaded = time.perf_counter()
+
+        if watermark is None:
+            # Первый запуск или --full: все, кто хоть раз лайкал или дизлайкал
+            active = np.flatnonzero(interactions.likes.getnnz(axis=1) + interactions.dislikes.getnnz(axis=1))
+        else:
+            # Только то, что вошло в прочитанный снимок: остальное - следующему запуску
+            users = changed_users(conn, watermark, interactions.watermark)
+            active = np.array(sorted(interactions.index[user] for user in users if user in interactions.index),
+                              dtype=np.int64)
+
+        similarity = item_similarity(interactions.likes) if len(active) else None
+        computed = time.perf_counter()
+
+        written = 0
+        for offset in range(0, len(active), chunk_size):
+            users = active[offset:offset + chunk_size]
+            scores = score_users(interactions, similarity, users)
+            write_recommendations(conn, interactions, users, scores)
+            written += scores.nnz
+
+        save_watermark(conn, interactions.watermark)
+    finally:
+        conn.close()
+
+    stats = {
+        'users': len(active),
+        'likes': interactions.likes.nnz,
+        'recommendations': written,
+        'load_seconds': loaded - started,
+        'similarity_seconds': computed - loaded,
+        'total_seconds': time.perf_counter() - started,
+    }
+    logger.info(f"✅ Рекомендации пересчитаны: {stats['users']} пользователей, "
+                f"{stats['recommendations']} кандидатов за {stats['total_seconds']:.1f} с")
+    return stats
@@ -17,8 +17,165 @@ DB_NAME = os.getenv('DB_NAME', 'dating_bot_db')
 DB_USER = os.getenv('DB_USER', 'postgres')
 DB_PASSWORD = os.getenv('DB_PASSWORD', '123456')
 
-# Построение строки подключения
-DATABASE_URL = f'postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+# Построение строки подключения (DATABASE_URL из окружения имеет приоритет,
+# например чтобы направить бенчмарки на отдельную БД)
+DATABASE_URL = os.getenv(
+    'DATABASE_URL',
+    f'postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+)
+
+# Способ получения обновлений: polling (long polling) или webhook
+UPDATES_MODE = os.getenv('UPDATES_MODE', 'polling')
+# Вебхук: адрес и путь локального сервера, публичный URL для подписки (пусто - не
+# подписываться, например если подпиской управляет балансировщик), секрет
+# (обязателен: без него бот в режиме вебхука не запустится), размер очереди
+# (при переполнении - 503) и число воркеров. По умолчанию сервер слушает только
+# локальный адрес - наружу его выставляет балансировщик или WEBHOOK_HOST=0.0.0.0
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '1000'))
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '4'))
+
+# Планировщик обновлений: воркеры (0 - обрабатывать по одному, как раньше)
+# и предел обновлений, ожидающих обработки
+SCHEDULER_WORKERS = int(os.getenv('SCHEDULER_WORKERS', '16'))
+SCHEDULER_MAX_PENDING = int(os.getenv('SCHEDULER_MAX_PENDING', '1000'))
+
+# Очередь исходящих сообщений: общий лимит процесса (сообщений в секунду и запас),
+# лимит на один чат, воркеры, предел неотправленных сообщений и число повторов
+# при 429/5xx (в многопроцессном режиме общий лимит делится между воркерами)
+OUTBOX_RATE = float(os.getenv('OUTBOX_RATE', '25'))
+OUTBOX_BURST = float(os.getenv('OUTBOX_BURST', '25'))
+OUTBOX_CHAT_RATE = float(os.getenv('OUTBOX_CHAT_RATE', '1'))
+OUTBOX_CHAT_BURST = float(os.getenv('OUTBOX_CHAT_BURST', '5'))
+OUTBOX_WORKERS = int(os.getenv('OUTBOX_WORKERS', '8'))
+OUTBOX_MAX_PENDING = int(os.getenv('OUTBOX_MAX_PENDING', '10000'))
+OUTBOX_MAX_RETRIES = int(os.getenv('OUTBOX_MAX_RETRIES', '5'))
+
+# Многопроцессный режим: число воркеров (1 - обычный режим в одном процессе),
+# размер очереди обновлений воркера и через сколько секунд без heartbeat воркер
+# считается зависшим и перезапускается
+BOT_WORKERS = int(os.getenv('BOT_WORKERS', '1'))
+WORKER_QUEUE_SIZE = int(os.getenv('WORKER_QUEUE_SIZE', '1000'))
+WORKER_HEARTBEAT_TIMEOUT = float(os.getenv('WORKER_HEARTBEAT_TIMEOUT', '30'))
+
+# Пул подключений: сколько открыть при прогреве и сколько держать простаивающими
+# (не меньше DB_THREADS, иначе подключения будут открываться заново)
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '2'))
+DB_POOL_MAX_IDLE = int(os.getenv('DB_POOL_MAX_IDLE', '16'))
+# Подключение, простоявшее в пуле дольше стольких секунд, перед выдачей проверяется SELECT 1
+DB_POOL_CHECK_AFTER = float(os.getenv('DB_POOL_CHECK_AFTER', '30'))
+# Потоки для вызовов Database из обработчиков (db_async.py): столько обновлений
+# одновременно ждут базу, не блокируя цикл событий
+DB_THREADS = int(os.getenv('DB_THREADS', '16'))
+
+# Кэш профилей и состояний FSM в памяти процесса (0 - выключен), срок жизни записи в секундах
+DB_CACHE_SIZE = int(os.getenv('DB_CACHE_SIZE', '10000'))
+DB_CACHE_TTL = float(os.getenv('DB_CACHE_TTL', '300'))
+# Кэш состояний FSM верен, только если все обновления пользователя приходят в один
+# процесс: при long polling так и есть (супервизор раскладывает их по пользователю).
+# За балансировщиком вебхуков они попадают в разные процессы, и процесс мог бы
+# действовать по устаревшему состоянию, поэтому в режиме вебхука кэш по умолчанию
+# выключен. Включай его там только при «липкой» маршрутизации по пользователю
+STATE_CACHE_ENABLED = os.getenv(
+    'STATE_CACHE_ENABLED', 'false' if UPDATES_MODE == 'webhook' else 'true').lower() in ('1', 'true', 'yes')
+
+# Кэш отрисованных карточек анкет: число карточек (0 - выключен) и предел по памяти в байтах
+PROFILE_CARD_CACHE_SIZE = int(os.getenv('PROFILE_CARD_CACHE_SIZE', '20000'))
+PROFILE_CARD_CACHE_BYTES = int(os.getenv('PROFILE_CARD_CACHE_BYTES', str(32 * 1024 * 1024)))
+
+# Рекомендации при просмотре анкет: сколько кандидатов ранжировать за раз, веса
+# признаков (например "age=1,categories=2,gender=1.5,activity=0.5,popularity=0.5,rating=0.5,collaborative=2";
+# не указанные - по умолчанию из recommender.py) и степень случайности выбора
+RECOMMENDER_BATCH_SIZE = int(os.getenv('RECOMMENDER_BATCH_SIZE', '200'))
+RECOMMENDER_WEIGHTS = {
+    name.strip(): float(value)
+    for name, _, value in (item.partition('=') for item in os.getenv('RECOMMENDER_WEIGHTS', '').split(','))
+    if name.strip() and value.strip()
+}
+RECOMMENDER_TEMPERATURE = float(os.getenv('RECOMMENDER_TEMPERATURE', '0.1'))
+
+# Поиск анкет поблизости: радиус по умолчанию и максимальный для /radius, км
+GEO_DEFAULT_RADIUS_KM = int(os.getenv('GEO_DEFAULT_RADIUS_KM', '50'))
+GEO_MAX_RADIUS_KM = int(os.getenv('GEO_MAX_RADIUS_KM', '1000'))
+
+# Поиск по описанию (/search): анкет на странице и сколько совпадений ранжировать
+# (при очень частых словах ранжируются только SEARCH_MAX_MATCHES анкет с наибольшим рейтингом)
+SEARCH_PAGE_SIZE = int(os.getenv('SEARCH_PAGE_SIZE', '5'))
+SEARCH_MAX_MATCHES = int(os.getenv('SEARCH_MAX_MATCHES', '1000'))
+
+# Офлайн-рекомендации (cf_job.py): кандидатов на пользователя, соседей на анкету,
+# вес дизлайка против лайка и сколько пользователей считать за один шаг
+CF_TOP_K = int(os.getenv('CF_TOP_K', '50'))
+CF_NEIGHBOURS = int(os.getenv('CF_NEIGHBOURS', '100'))
+CF_DISLIKE_WEIGHT = float(os.getenv('CF_DISLIKE_WEIGHT', '0.5'))
+CF_CHUNK_USERS = int(os.getenv('CF_CHUNK_USERS', '5000'))
+# Сколько id ниже водяного знака перепроверять при инкрементальном запуске: лайки,
+# вставленные до снимка прошлого запуска, но зафиксированные после него
+CF_WATERMARK_MARGIN = int(os.getenv('CF_WATERMARK_MARGIN', '10000'))
+
+# Рейтинг анкет (rating.py): шаг за одну оценку, множитель отклонения при распаде
+# (python rating.py, раз в сутки), строк на транзакцию распада и насколько далеко от
+# рейтинга зрителя может начинаться срез кандидатов (0 - случайная пачка без рейтинга)
+RATING_K = float(os.getenv('RATING_K', '32'))
+RATING_DECAY = float(os.getenv('RATING_DECAY', '0.98'))
+RATING_DECAY_BATCH = int(os.getenv('RATING_DECAY_BATCH', '10000'))
+RATING_BUCKET = float(os.getenv('RATING_BUCKET', '200'))
+# Расписание распада рейтинга в процессе бота (cron, пусто - только python rating.py)
+RATING_DECAY_CRON = os.getenv('RATING_DECAY_CRON', '30 4 * * *')
+
+# Фоновые задачи обслуживания (jobs.py): включены ли, случайная добавка к времени
+# запуска в секундах и сколько строк удалять за одну транзакцию
+JOBS_ENABLED = os.getenv('JOBS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+JOB_JITTER = float(os.getenv('JOB_JITTER', '30'))
+MAINTENANCE_BATCH = int(os.getenv('MAINTENANCE_BATCH', '1000'))
+
+# Прочитанные уведомления старше стольких дней удаляются; как часто проверять, в секундах (0 - никогда)
+NOTIFICATIONS_TTL_DAYS = int(os.getenv('NOTIFICATIONS_TTL_DAYS', '30'))
+NOTIFICATIONS_CLEANUP_INTERVAL = float(os.getenv('NOTIFICATIONS_CLEANUP_INTERVAL', '3600'))
+
+# Состояние FSM, не менявшееся столько дней, считается брошенным: бот его не видит,
+# фоновая задача удаляет (0 - бессрочно); как часто удалять, в секундах
+USER_STATE_TTL_DAYS = float(os.getenv('USER_STATE_TTL_DAYS', '7'))
+USER_STATES_CLEANUP_INTERVAL = float(os.getenv('USER_STATES_CLEANUP_INTERVAL', '3600'))
+
+# Прогрев перед стартом: сколько недавно активных пользователей загрузить в кэш
+WARMUP_PRELOAD_USERS = int(os.getenv('WARMUP_PRELOAD_USERS', '1000'))
+
+# Slow-query лог: порог в мс, после которого вызов метода Database логируется
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+# Добавлять к медленным SELECT план EXPLAIN ANALYZE (запрос выполняется повторно!)
+SLOW_QUERY_EXPLAIN = os.getenv('SLOW_QUERY_EXPLAIN', 'false').lower() in ('1', 'true', 'yes')
+# Не чаще одного EXPLAIN на метод за столько секунд
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.getenv('SLOW_QUERY_EXPLAIN_INTERVAL', '60'))
+
+# HTTP-эндпоинт /metrics для Prometheus (порт 0 - выключен)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
+
+# Администраторы бота (user_id через запятую) - им доступны служебные команды
+ADMIN_IDS = {user_id.strip() for user_id in os.getenv('ADMIN_IDS', '').split(',') if user_id.strip()}
+
+# Трассировка обновлений: кольцевой буфер для /traces и необязательный JSON lines файл
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+TRACE_BUFFER_SIZE = int(os.getenv('TRACE_BUFFER_SIZE', '200'))
+TRACE_FILE = os.getenv('TRACE_FILE', '')
+
+# Семплирующий профилировщик (/profile, SIGUSR2): каталог для .folded файлов,
+# интервал семплирования, длительность по умолчанию и верхний предел
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', '5'))
+PROFILE_DEFAULT_SECONDS = float(os.getenv('PROFILE_DEFAULT_SECONDS', '30'))
+PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', '300'))
+
+# Запись входящих обновлений для воспроизведения (пусто - запись выключена)
+RECORD_UPDATES_PATH = os.getenv('RECORD_UPDATES_PATH', '')
+# Соль для анонимизации user_id в записи (держи в секрете). Без своей соли запись
+# не запускается: HMAC с известной солью от числовых user_id обращается перебором
+RECORD_UPDATES_SALT = os.getenv('RECORD_UPDATES_SALT', '')
 
 # Для совместимости (если нужна SQLite)
 DATABASE_PATH = 'dating_bot.db'
@@ -37,6 +194,7 @@ MIN_AGE = 18
 MAX_AGE = 100
 MAX_PHOTOS = 3
 MAX_BIO_LENGTH = 500
+MAX_SEARCH_QUERY_LENGTH = 100
 
 # Сообщения
 MESSAGES = {
@@ -169,4 +169,5 @@ def create_test_users():
 
 
 if __name__ == '__main__':
+    db.init_db()
     create_test_users()
@@ -5,141 +5,111 @@
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from psycopg2 import sql
+import copy
 import json
+import logging
+import random
 from datetime import datetime
-from typing import Optional, List, Dict, Any
-from config import DATABASE_URL, CATEGORIES
-
-
+from typing import Optional, List, Dict, Any, Tuple
+from config import (
+    DATABASE_URL, CATEGORIES, DB_POOL_MIN_SIZE, DB_POOL_MAX_IDLE, DB_POOL_CHECK_AFTER, DB_CACHE_SIZE, DB_CACHE_TTL,
+    RECOMMENDER_BATCH_SIZE, MIN_AGE, MAX_AGE, GEO_DEFAULT_RADIUS_KM, SEARCH_PAGE_SIZE, SEARCH_MAX_MATCHES,
+    RATING_BUCKET, USER_STATE_TTL_DAYS, STATE_CACHE_ENABLED,
+)
+from cache import LRUCache, MISSING
+from db_instrumentation import query_instrumentation
+from db_pool import ConnectionPool
+from migrations import migrate
+from recommender import CATEGORY_KEYS, CandidateBatch, recommender
+from geo import EARTH_RADIUS_KM, expanding_cells
+from rating import RATING_INITIAL, RATING_UPDATE_SQL
+
+logger = logging.getLogger(__name__)
+
+# Запросы горячих путей с фиктивными параметрами: прогон на свежем подключении
+# заранее загружает в backend каталог, описания таблиц и индексов
+WARM_QUERIES = [
+    ('SELECT * FROM users WHERE user_id = %s', ('',)),
+    ('SELECT state, other_id, EXTRACT(EPOCH FROM NOW() - updated_at) AS age FROM user_states WHERE user_id = %s',
+     ('',)),
+    ('SELECT 1 FROM likes WHERE user_from = %s AND user_to = %s', ('', '')),
+    ('SELECT 1 FROM dislikes WHERE user_from = %s AND user_to = %s', ('', '')),
+    ('SELECT 1 FROM blocked_chats WHERE user1_id = %s AND user2_id = %s', ('', '')),
+    ('SELECT COUNT(*) FROM notifications WHERE user_id = %s AND is_read = FALSE', ('',)),
+    ('SELECT 1 FROM messages WHERE from_user = %s AND to_user = %s LIMIT 1', ('', '')),
+]
+
+
+# Срок жизни состояния FSM в секундах (0 - бессрочно)
+USER_STATE_TTL = USER_STATE_TTL_DAYS * 86400
+
+
+@query_instrumentation.instrument
 class Database:
     def __init__(self, database_url: str = DATABASE_URL):
+        # Подключение открывается только при первом запросе, схему создаёт migrate.py
         self.database_url = database_url
-        self.init_db()
+        self._pool: Optional[ConnectionPool] = None
+        # Кэши горячих чтений; сбрасываются при записи соответствующих данных
+        self.user_cache = LRUCache('users', DB_CACHE_SIZE, DB_CACHE_TTL)
+        self.state_cache = LRUCache('user_states', DB_CACHE_SIZE if STATE_CACHE_ENABLED else 0, DB_CACHE_TTL)
 
     def get_connection(self):
-        """Получить подключение к БД PostgreSQL"""
-        conn = psycopg2.connect(self.database_url)
-        return conn
-
-    def init_db(self):
-        """Инициализация таблиц БД"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-
+        """Получить подключение к БД PostgreSQL (из пула; conn.close() возвращает его обратно)"""
+        if self._pool is None:
+            self._pool = ConnectionPool(self.database_url, DB_POOL_MIN_SIZE, DB_POOL_MAX_IDLE,
+                                        DB_POOL_CHECK_AFTER)
+        return self._pool.acquire()
+
+    def open_pool(self) -> int:
+        """Открыть пул до минимального размера и прогреть подключения; вернуть число подключений"""
+        if self._pool is None:
+            self._pool = ConnectionPool(self.database_url, DB_POOL_MIN_SIZE, DB_POOL_MAX_IDLE,
+                                        DB_POOL_CHECK_AFTER)
+        return self._pool.open(WARM_QUERIES)
+
+    def close_pool(self):
+        """Закрыть простаивающие подключения пула"""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+    def preload_recent_users(self, limit: int) -> int:
+        """Загрузить в кэш профили и состояния недавно активных пользователей; вернуть их число"""
         try:
-            # Таблица пользователей
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id TEXT PRIMARY KEY,
-                    username TEXT,
-                    name TEXT NOT NULL,
-                    age INTEGER NOT NULL,
-                    gender TEXT NOT NULL,
-                    bio TEXT,
-                    categories JSONB,
-                    created_at TIMESTAMP DEFAULT NOW(),
-                    updated_at TIMESTAMP DEFAULT NOW()
-                )
-            ''')
-
-            # Таблица лайков (взаимные нравятся)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS likes (
-                    id SERIAL PRIMARY KEY,
-                    user_from TEXT NOT NULL,
-                    user_to TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT NOW(),
-                    UNIQUE(user_from, user_to),
-                    FOREIGN KEY(user_from) REFERENCES users(user_id) ON DELETE CASCADE,
-                    FOREIGN KEY(user_to) REFERENCES users(user_id) ON DELETE CASCADE
-                )
-            ''')
-
-            # Таблица дизлайков (исключить из рекомендаций)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS dislikes (
-                    id SERIAL PRIMARY KEY,
-                    user_from TEXT NOT NULL,
-                    user_to TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT NOW(),
-                    UNIQUE(user_from, user_to),
-                    FOREIGN KEY(user_from) REFERENCES users(user_id) ON DELETE CASCADE,
-                    FOREIGN KEY(user_to) REFERENCES users(user_id) ON DELETE CASCADE
-                )
-            ''')
-
-            # Таблица сообщений (чат между пользователями)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS messages (
-                    id SERIAL PRIMARY KEY,
-                    from_user TEXT NOT NULL,
-                    to_user TEXT NOT NULL,
-                    message TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT NOW(),
-                    is_read BOOLEAN DEFAULT FALSE,
-                    FOREIGN KEY(from_user) REFERENCES users(user_id) ON DELETE CASCADE,
-                    FOREIGN KEY(to_user) REFERENCES users(user_id) ON DELETE CASCADE
-                )
-            ''')
-
-            # Таблица для сохранения состояния FSM пользователя
-            # Без FOREIGN KEY потому что состояние может быть у пользователя,
-            # который еще не создал профиль (находится в процессе заполнения анкеты)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS user_states (
-                    user_id TEXT PRIMARY KEY,
-                    state TEXT,
-                    other_id TEXT,
-                    updated_at TIMESTAMP DEFAULT NOW()
-                )
-            ''')
-
-            # Таблица уведомлений (лайки и мэтчи)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS notifications (
-                    id SERIAL PRIMARY KEY,
-                    user_id TEXT NOT NULL,
-                    from_user_id TEXT NOT NULL,
-                    from_user_name TEXT NOT NULL,
-                    from_user_username TEXT,
-                    notification_type TEXT NOT NULL,
-                    message TEXT,
-                    is_read BOOLEAN DEFAULT FALSE,
-                    created_at TIMESTAMP DEFAULT NOW(),
-                    FOREIGN KEY(user_id) REFERENCES users(user_id) ON DELETE CASCADE,
-                    FOREIGN KEY(from_user_id) REFERENCES users(user_id) ON DELETE CASCADE
-                )
-            ''')
-
-            # Таблица блокировок чатов (когда один из пользователей прервал беседу)
+            conn = self.get_connection()
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS blocked_chats (
-                    id SERIAL PRIMARY KEY,
-                    user1_id TEXT NOT NULL,
-                    user2_id TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT NOW(),
-                    UNIQUE(user1_id, user2_id),
-                    FOREIGN KEY(user1_id) REFERENCES users(user_id) ON DELETE CASCADE,
-                    FOREIGN KEY(user2_id) REFERENCES users(user_id) ON DELETE CASCADE
-                )
-            ''')
-
-            # Создание индексов для оптимизации запросов
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_likes_user_from ON likes(user_from)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_likes_user_to ON likes(user_to)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_dislikes_user_from ON dislikes(user_from)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_messages_from_to ON messages(from_user, to_user)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_notifications_user ON notifications(user_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_blocked_chats ON blocked_chats(user1_id, user2_id)')
-
-            conn.commit()
-            print("✅ База данных инициализирована успешно")
-        except Exception as e:
-            print(f"❌ Ошибка при инициализации БД: {e}")
-            conn.rollback()
-        finally:
+                SELECT u.*, s.user_id IS NOT NULL AS has_state,
+                       s.state AS fsm_state, s.other_id AS fsm_other_id,
+                       EXTRACT(EPOCH FROM NOW() - s.updated_at) AS fsm_age
+                FROM users u
+                LEFT JOIN user_states s ON s.user_id = u.user_id
+                ORDER BY GREATEST(u.updated_at, s.updated_at) DESC NULLS LAST
+                LIMIT %s
+            ''', (limit,))
+            rows = cursor.fetchall()
             cursor.close()
             conn.close()
+        except Exception as e:
+            logger.exception(f"Error preloading users: {e}")
+            return 0
+
+        for row in rows:
+            user = dict(row)
+            has_state = user.pop('has_state')
+            state, other_id = user.pop('fsm_state'), user.pop('fsm_other_id')
+            lifetime = self._state_lifetime(user.pop('fsm_age'))
+            self.user_cache.set(user['user_id'], user)
+            if has_state and lifetime > 0:
+                self.state_cache.set(user['user_id'], (state, other_id), ttl=lifetime)
+            else:
+                self.state_cache.set(user['user_id'], (None, {}))
+        return len(rows)
+
+    def init_db(self):
+        """Применить недостающие миграции схемы (то же, что `python migrate.py`)"""
+        migrate(self.database_url)
 
     # ===== Методы работы с пользователями =====
 
@@ -154,12 +124,13 @@ class Database:
             conn.close()
             return result
         except Exception as e:
-            print(f"Error checking user existence: {e}")
+            logger.exception(f"Error checking user existence: {e}")
             return False
 
     def create_user(self, user_id: str, username: str, name: str, age: int,
                    gender: str, bio: str, categories: List[str]) -> bool:
         """Создать нового пользователя"""
+        self.user_cache.invalidate(user_id)
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
@@ -183,11 +154,15 @@ class Database:
             conn.close()
             return True
         except Exception as e:
-            print(f"Error creating user: {e}")
+            logger.exception(f"Error creating user: {e}")
             return False
 
     def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Получить информацию о пользователе"""
+        cached = self.user_cache.get(user_id)
+        if cached is not MISSING:
+            # Копия, чтобы вызывающий код не испортил запись в кэше
+            return copy.deepcopy(cached)
         try:
             conn = self.get_connection()
             cursor = conn.cursor(cursor_factory=RealDictCursor)
@@ -198,14 +173,17 @@ class Database:
 
             if row:
                 user = dict(row)
-                return user
+                self.user_cache.set(user_id, user)
+                return copy.deepcopy(user)
+            self.user_cache.set(user_id, None)
             return None
         except Exception as e:
-            print(f"Error getting user: {e}")
+            logger.exception(f"Error getting user: {e}")
             return None
 
     def update_user(self, user_id: str, **kwargs) -> bool:
         """Обновить профиль пользователя"""
+        self.user_cache.invalidate(user_id)
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
@@ -214,7 +192,7 @@ class Database:
             set_clause = []
             values = []
             for key, value in kwargs.items():
-                if key == 'categories' and isinstance(value, list):
+                if key in ('categories', 'pref_genders') and isinstance(value, list):
                     set_clause.append(f'{key} = %s')
                     values.append(json.dumps(value))
                 else:
@@ -233,7 +211,7 @@ class Database:
             conn.close()
             return True
         except Exception as e:
-            print(f"Error updating user: {e}")
+            logger.exception(f"Error updating user: {e}")
             return False
 
     # ===== Методы работы с лайками и дизлайками =====
@@ -249,13 +227,16 @@ class Database:
                 VALUES (%s, %s)
                 ON CONFLICT (user_from, user_to) DO NOTHING
             ''', (user_from, user_to))
+            # Счётчик и рейтинг для ранжирования - только если лайк действительно новый
+            if cursor.rowcount:
+                cursor.execute(RATING_UPDATE_SQL, {'outcome': 1, 'target': user_to, 'rater': user_from})
 
             conn.commit()
             cursor.close()
             conn.close()
             return True
         except Exception as e:
-            print(f"Error adding like: {e}")
+            logger.exception(f"Error adding like: {e}")
             return False
 
     def add_dislike(self, user_from: str, user_to: str) -> bool:
@@ -269,13 +250,16 @@ class Database:
                 VALUES (%s, %s)
                 ON CONFLICT (user_from, user_to) DO NOTHING
             ''', (user_from, user_to))
+            if cursor.rowcount:
+                # Рейтинг - только если дизлайк действительно новый
+                cursor.execute(RATING_UPDATE_SQL, {'outcome': 0, 'target': user_to, 'rater': user_from})
 
             conn.commit()
             cursor.close()
             conn.close()
             return True
         except Exception as e:
-            print(f"Error adding dislike: {e}")
+            logger.exception(f"Error adding dislike: {e}")
             return False
 
     def has_interacted(self, user_from: str, user_to: str) -> bool:
@@ -295,7 +279,7 @@ class Database:
             conn.close()
             return result
         except Exception as e:
-            print(f"Error checking interaction: {e}")
+            logger.exception(f"Error checking interaction: {e}")
             return False
 
     def get_matches(self, user_id: str) -> List[str]:
@@ -316,7 +300,7 @@ class Database:
             conn.close()
             return matches
         except Exception as e:
-            print(f"Error getting matches: {e}")
+            logger.exception(f"Error getting matches: {e}")
             return []
 
     # ===== Методы для поиска профилей =====
@@ -324,36 +308,192 @@ class Database:
     def get_profile_for_user(self, user_id: str, category: str) -> Optional[Dict[str, Any]]:
         """Получить следующий профиль для просмотра пользователем"""
         try:
+            viewer = self.get_user(user_id) or {}
+
+            # Настройки поиска зрителя: чем уже фильтр, тем меньше строк сортируется
+            # (индексы idx_users_gender_age и idx_users_categories)
+            filters = []
+            filter_params = []
+            if viewer.get('pref_genders'):
+                filters.append('AND gender = ANY(%s)')
+                filter_params.append(list(viewer['pref_genders']))
+            if viewer.get('pref_age_min') is not None or viewer.get('pref_age_max') is not None:
+                filters.append('AND age BETWEEN %s AND %s')
+                filter_params.extend([viewer.get('pref_age_min') or MIN_AGE,
+                                      viewer.get('pref_age_max') or MAX_AGE])
+
+            if viewer.get('geohash'):
+                latitude, longitude = viewer['latitude'], viewer['longitude']
+                radius = viewer.get('pref_radius_km') or GEO_DEFAULT_RADIUS_KM
+                filters.append('''
+                    AND 2 * %s * ASIN(LEAST(1, SQRT(
+                        POWER(SIN(RADIANS(latitude - %s) / 2), 2)
+                        + COS(RADIANS(%s)) * COS(RADIANS(latitude)) * POWER(SIN(RADIANS(longitude - %s) / 2), 2)
+                    ))) <= %s
+                ''')
+                filter_params.extend([EARTH_RADIUS_KM, latitude, latitude, longitude, radius])
+
             conn = self.get_connection()
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor = conn.cursor()
 
-            # Ищем профили противоположного пола в выбранной категории
-            # которые еще не были просмотрены (нет like/dislike)
-            cursor.execute('''
-                SELECT * FROM users
+            # Сначала офлайн-рекомендации «нравится похожим людям» (collaborative.py)
+            rows = self._fetch_candidates(cursor, user_id, category, filters, filter_params, recommended=True)
+            if not rows and viewer.get('geohash'):
+                # Анкеты в радиусе: ячейки геохеша укрупняются, пока кандидатов
+                # не наберётся на пачку или блок ячеек не накроет весь радиус (geo.py)
+                for cells, complete in expanding_cells(latitude, longitude, radius):
+                    cell_filter = 'AND (' + ' OR '.join(['geohash LIKE %s'] * len(cells)) + ')'
+                    rows = self._fetch_candidates(cursor, user_id, category, filters + [cell_filter],
+                                                  filter_params + [f'{cell}%' for cell in cells])
+                    if complete or len(rows) >= RECOMMENDER_BATCH_SIZE:
+                        break
+            elif not rows and RATING_BUCKET:
+                # Срез анкет соседнего рейтинга от случайной точки между крайними
+                # рейтингами в пределах RATING_BUCKET: обход индекса idx_users_rating
+                # до первой пачки подходящих, а не сортировка всех анкет (rating.py)
+                rating = viewer.get('rating', RATING_INITIAL)
+                cursor.execute('SELECT MIN(rating), MAX(rating) FROM users WHERE rating BETWEEN %s AND %s',
+                               (rating - RATING_BUCKET, rating + RATING_BUCKET))
+                lowest, highest = cursor.fetchone()
+                pivot = random.uniform(lowest, highest) if lowest is not None else rating
+                rows = self._fetch_candidates(cursor, user_id, category, filters + ['AND rating >= %s'],
+                                              filter_params + [pivot], order='rating')
+                if len(rows) < RECOMMENDER_BATCH_SIZE:
+                    rows += self._fetch_candidates(cursor, user_id, category, filters + ['AND rating < %s'],
+                                                   filter_params + [pivot], order='rating DESC',
+                                                   limit=RECOMMENDER_BATCH_SIZE - len(rows))
+            elif not rows:
+                rows = self._fetch_candidates(cursor, user_id, category, filters, filter_params)
+
+            cursor.close()
+            conn.close()
+
+            if not rows:
+                return None
+            return self.get_user(recommender.choose(viewer, CandidateBatch(rows)))
+        except Exception as e:
+            logger.exception(f"Error getting profile: {e}")
+            return None
+
+    def _fetch_candidates(self, cursor, user_id: str, category: str, filters: List[str],
+                          filter_params: List[Any], recommended: bool = False, order: str = 'RANDOM()',
+                          limit: int = RECOMMENDER_BATCH_SIZE) -> List[tuple]:
+        """Пачка непросмотренных (нет like/dislike) профилей категории в виде признаков
+
+        recommended=True - только кандидаты из таблицы recommendations, лучшие по их
+        оценке collaborative.py (она же признак collaborative); order - порядок отбора
+        пачки (по умолчанию случайный)
+        """
+        source, source_params, cf_score = 'users', [], '0'
+        if recommended:
+            source = '''(
+                SELECT users.*, r.score AS cf_score FROM recommendations r
+                JOIN users ON users.user_id = r.candidate_id
+                WHERE r.user_id = %s
+            ) users'''
+            source_params, cf_score, order = [user_id], 'cf_score', 'cf_score DESC, user_id'
+        # Признаки для ранжирования (recommender.py) считаются только для пачки:
+        # сначала выборка, потом признаки
+        category_flags = ', '.join(['b.categories ? %s'] * len(CATEGORY_KEYS))
+        cursor.execute(f'''
+            WITH batch AS (
+                SELECT user_id, age, gender, updated_at, likes_received, rating, {cf_score} AS cf_score,
+                       categories
+                FROM {source}
                 WHERE user_id != %s
                 AND categories @> %s::jsonb
+                {' '.join(filters)}
                 AND user_id NOT IN (
                     SELECT user_to FROM likes WHERE user_from = %s
                     UNION
                     SELECT user_to FROM dislikes WHERE user_from = %s
                 )
-                ORDER BY RANDOM()
-                LIMIT 1
-            ''', (user_id, json.dumps([category]), user_id, user_id))
+                ORDER BY {order}
+                LIMIT %s
+            )
+            SELECT b.user_id, COALESCE(b.age, 0), b.gender,
+                   EXTRACT(EPOCH FROM NOW() - GREATEST(b.updated_at, s.updated_at)) / 86400,
+                   b.likes_received, b.rating, b.cf_score,
+                   {category_flags}
+            FROM batch b
+            LEFT JOIN LATERAL (
+                SELECT updated_at FROM user_states WHERE user_id = b.user_id
+            ) s ON TRUE
+        ''', (*source_params, user_id, json.dumps([category]), *filter_params, user_id, user_id,
+              limit, *CATEGORY_KEYS))
+        return cursor.fetchall()
+
+    def search_profiles(self, user_id: str, query: str,
+                        after: Optional[Tuple[float, str]] = None) -> Tuple[List[Dict[str, Any]], Optional[Tuple[float, str]]]:
+        """Поиск анкет по словам из описания: (страница результатов, курсор следующей или None)
+
+        Ранжируются не больше SEARCH_MAX_MATCHES совпадений с наибольшим рейтингом, так
+        что выдача одна и та же при каждом запросе. Результаты упорядочены по
+        (релевантность убыв., user_id); after - (релевантность, user_id) последней анкеты
+        предыдущей страницы. Страницы по курсору, а не OFFSET: лайк или дизлайк между
+        страницами не сдвигает выдачу
+        """
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
 
-            row = cursor.fetchone()
+            # Совпадения берутся из GIN индекса idx_users_bio_tsv без просмотренных
+            # (like/dislike) и заблокированных; ранжируются первые SEARCH_MAX_MATCHES
+            # по (рейтинг убыв., user_id), а фрагмент с подсветкой строится только
+            # для анкет страницы
+            after_rank, after_id = after if after else (None, None)
+            cursor.execute('''
+                WITH q AS (
+                    SELECT websearch_to_tsquery('russian', %s) || websearch_to_tsquery('english', %s) AS query
+                ),
+                matches AS (
+                    SELECT u.user_id, u.name, u.age, u.bio, u.bio_tsv
+                    FROM users u, q
+                    WHERE u.bio_tsv @@ q.query
+                    AND u.user_id != %s
+                    AND u.user_id NOT IN (
+                        SELECT user_to FROM likes WHERE user_from = %s
+                        UNION
+                        SELECT user_to FROM dislikes WHERE user_from = %s
+                    )
+                    AND NOT EXISTS (
+                        SELECT 1 FROM blocked_chats
+                        WHERE user1_id = LEAST(%s, u.user_id) AND user2_id = GREATEST(%s, u.user_id)
+                    )
+                    ORDER BY u.rating DESC, u.user_id
+                    LIMIT %s
+                ),
+                ranked AS (
+                    SELECT matches.user_id, matches.name, matches.age, matches.bio,
+                           ts_rank_cd(matches.bio_tsv, q.query) AS rank
+                    FROM matches, q
+                ),
+                page AS (
+                    SELECT * FROM ranked
+                    WHERE %s::real IS NULL OR rank < %s::real OR (rank = %s::real AND user_id > %s)
+                    ORDER BY rank DESC, user_id
+                    LIMIT %s
+                )
+                SELECT page.user_id, page.name, page.age, page.rank,
+                       ts_headline('russian', page.bio, q.query,
+                                   'StartSel=*, StopSel=*, MaxWords=15, MinWords=5') AS headline
+                FROM page, q
+                ORDER BY page.rank DESC, page.user_id
+            ''', (query, query, user_id, user_id, user_id, user_id, user_id, SEARCH_MAX_MATCHES,
+                  after_rank, after_rank, after_rank, after_id, SEARCH_PAGE_SIZE + 1))
+
+            rows = [dict(row) for row in cursor.fetchall()]
             cursor.close()
             conn.close()
-
-            if row:
-                user = dict(row)
-                # user['categories'] = json.loads(user['categories']) if user['categories'] else []
-                return user
-            return None
         except Exception as e:
-            print(f"Error getting profile: {e}")
-            return None
+            logger.exception(f"Error searching profiles: {e}")
+            return [], None
+
+        page_rows = rows[:SEARCH_PAGE_SIZE]
+        next_after = (page_rows[-1]['rank'], page_rows[-1]['user_id']) if len(rows) > SEARCH_PAGE_SIZE else None
+        for row in page_rows:
+            del row['rank']
+        return page_rows, next_after
 
     # ===== Методы работы с сообщениями =====
 
@@ -373,7 +513,7 @@ class Database:
             conn.close()
             return True
         except Exception as e:
-            print(f"Error saving message: {e}")
+            logger.exception(f"Error saving message: {e}")
             return False
 
     def get_messages(self, user1: str, user2: str, limit: int = 10) -> List[Dict[str, Any]]:
@@ -395,13 +535,14 @@ class Database:
             conn.close()
             return messages[::-1]  # Разворачиваем для хронологического порядка
         except Exception as e:
-            print(f"Error getting messages: {e}")
+            logger.exception(f"Error getting messages: {e}")
             return []
 
     # ===== Методы работы с состоянием FSM =====
 
     def set_user_state(self, user_id: str, state: str, data: Optional[Dict] = None):
         """Установить состояние FSM пользователя"""
+        self.state_cache.invalidate(user_id)
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
@@ -431,7 +572,7 @@ class Database:
             conn.close()
             return True
         except Exception as e:
-            print(f"Error setting user state: {e}")
+            logger.exception(f"Error setting user state: {e}")
             return False
 
     # def get_user_state(self, user_id: str) -> tuple:
@@ -450,28 +591,80 @@ class Database:
     #             return row['state'], data
     #         return None, {}
     #     except Exception as e:
-    #         print(f"Error getting user state: {e}")
+    #         logger.exception(f"Error getting user state: {e}")
     #         return None, {}
     def get_user_state(self, user_id: str) -> tuple:
         """Получить состояние FSM пользователя (state, data)"""
+        cached = self.state_cache.get(user_id)
+        if cached is not MISSING:
+            return cached
         try:
             conn = self.get_connection()
             cursor = conn.cursor(cursor_factory=RealDictCursor)
 
-            cursor.execute('SELECT state, other_id FROM user_states WHERE user_id = %s', (user_id,))
+            cursor.execute('''
+                SELECT state, other_id, EXTRACT(EPOCH FROM NOW() - updated_at) AS age
+                FROM user_states WHERE user_id = %s
+            ''', (user_id,))
             row = cursor.fetchone()
             cursor.close()
             conn.close()
 
-            if row:
-                return row['state'], row['other_id']
-            return None, {}
+            # Истёкшее состояние - как отсутствующее (строку удалит фоновая задача),
+            # а закэшированное живёт не дольше самого состояния
+            lifetime = self._state_lifetime(row['age']) if row else float('inf')
+            result = (row['state'], row['other_id']) if row and lifetime > 0 else (None, {})
+            self.state_cache.set(user_id, result, ttl=lifetime)
+            return result
         except Exception as e:
-            print(f"Error getting user state: {e}")
+            logger.exception(f"Error getting user state: {e}")
             return None, {}
 
+    @staticmethod
+    def _state_lifetime(age) -> float:
+        """Сколько секунд осталось жить состоянию FSM возраста age (<= 0 - истекло)"""
+        if not USER_STATE_TTL or age is None:
+            return float('inf')
+        return USER_STATE_TTL - float(age)
+
+    def delete_expired_user_states(self, after_user_id: str, limit: int) -> Tuple[int, Optional[str]]:
+        """Удалить истёкшие состояния среди limit следующих за after_user_id пользователей
+
+        Возвращает (сколько удалено, последний просмотренный user_id); None - таблица пройдена.
+        Пачки идут по первичному ключу: индекса по updated_at нет, чтобы обновления
+        в set_user_state оставались HOT и не писали в индексы.
+        """
+        if not USER_STATE_TTL:
+            return 0, None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+
+            # DELETE перепроверяет updated_at у строк, изменённых параллельно,
+            # поэтому только что обновлённое состояние не удалится
+            cursor.execute('''
+                WITH batch AS (
+                    SELECT user_id FROM user_states WHERE user_id > %s ORDER BY user_id LIMIT %s
+                ), deleted AS (
+                    DELETE FROM user_states s USING batch b
+                    WHERE s.user_id = b.user_id AND s.updated_at < NOW() - %s * INTERVAL '1 second'
+                    RETURNING 1
+                )
+                SELECT (SELECT MAX(user_id) FROM batch), (SELECT COUNT(*) FROM deleted)
+            ''', (after_user_id, limit, USER_STATE_TTL))
+            last_user_id, deleted = cursor.fetchone()
+
+            conn.commit()
+            cursor.close()
+            conn.close()
+            return deleted, last_user_id
+        except Exception as e:
+            logger.exception(f"Error deleting expired user states: {e}")
+            return 0, None
+
     def clear_user_state(self, user_id: str):
         """Очистить состояние пользователя"""
+        self.state_cache.invalidate(user_id)
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
@@ -480,7 +673,7 @@ class Database:
             cursor.close()
             conn.close()
         except Exception as e:
-            print(f"Error clearing user state: {e}")
+            logger.exception(f"Error clearing user state: {e}")
 
     # ===== Методы работы с уведомлениями =====
 
@@ -502,7 +695,7 @@ class Database:
             conn.close()
             return True
         except Exception as e:
-            print(f"Error adding notification: {e}")
+            logger.exception(f"Error adding notification: {e}")
             return False
 
     def get_notifications(self, user_id: str, unread_only: bool = False) -> List[Dict[str, Any]]:
@@ -529,7 +722,7 @@ class Database:
             conn.close()
             return notifications
         except Exception as e:
-            print(f"Error getting notifications: {e}")
+            logger.exception(f"Error getting notifications: {e}")
             return []
 
     def get_unread_notifications_count(self, user_id: str) -> int:
@@ -548,7 +741,7 @@ class Database:
             conn.close()
             return result[0] if result else 0
         except Exception as e:
-            print(f"Error getting unread count: {e}")
+            logger.exception(f"Error getting unread count: {e}")
             return 0
 
     def mark_notification_as_read(self, notification_id: int) -> bool:
@@ -566,7 +759,7 @@ class Database:
             conn.close()
             return True
         except Exception as e:
-            print(f"Error marking notification as read: {e}")
+            logger.exception(f"Error marking notification as read: {e}")
             return False
 
     def mark_all_notifications_as_read(self, user_id: str) -> bool:
@@ -584,9 +777,35 @@ class Database:
             conn.close()
             return True
         except Exception as e:
-            print(f"Error marking all notifications as read: {e}")
+            logger.exception(f"Error marking all notifications as read: {e}")
             return False
 
+    def delete_old_notifications(self, older_than_days: int, limit: int) -> int:
+        """Удалить до limit прочитанных уведомлений старше older_than_days дней; вернуть их число"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+
+            # Старые уведомления - с меньшими id: обход первичного ключа
+            # останавливается на первых limit подходящих
+            cursor.execute('''
+                DELETE FROM notifications WHERE id IN (
+                    SELECT id FROM notifications
+                    WHERE is_read AND created_at < NOW() - make_interval(days => %s)
+                    ORDER BY id
+                    LIMIT %s
+                )
+            ''', (older_than_days, limit))
+            deleted = cursor.rowcount
+
+            conn.commit()
+            cursor.close()
+            conn.close()
+            return deleted
+        except Exception as e:
+            logger.exception(f"Error deleting old notifications: {e}")
+            return 0
+
     # ===== Методы работы с блокировками чатов =====
 
     def block_chat(self, user1_id: str, user2_id: str) -> bool:
@@ -610,7 +829,7 @@ class Database:
             conn.close()
             return True
         except Exception as e:
-            print(f"Error blocking chat: {e}")
+            logger.exception(f"Error blocking chat: {e}")
             return False
 
     def is_chat_blocked(self, user1_id: str, user2_id: str) -> bool:
@@ -633,7 +852,7 @@ class Database:
             conn.close()
             return result
         except Exception as e:
-            print(f"Error checking blocked chat: {e}")
+            logger.exception(f"Error checking blocked chat: {e}")
             return False
 
     def unblock_chat(self, user1_id: str, user2_id: str) -> bool:
@@ -656,7 +875,7 @@ class Database:
             conn.close()
             return True
         except Exception as e:
-            print(f"Error unblocking chat: {e}")
+            logger.exception(f"Error unblocking chat: {e}")
             return False
 
 
@@ -0,0 +1,59 @@
+"""
+Вызовы Database из обработчиков без блокировки цикла событий
+
+Методы Database - синхронный psycopg2. Вызванные прямо из обработчика, они держат
+цикл событий на всё время запроса, и воркеры планировщика обновлений на деле
+обрабатывают обновления по одному. AsyncDatabase выполняет каждый вызов в своём
+пуле из DB_THREADS потоков: пока обработчик ждёт базу, цикл событий обрабатывает
+обновления других пользователей. Контекст вызова (трасса, учёт запросов
+обновления) переносится в поток, как в asyncio.to_thread.
+
+Каждый поток держит подключение только на время вызова, поэтому пул подключений
+должен хранить не меньше DB_THREADS простаивающих (DB_POOL_MAX_IDLE), иначе под
+нагрузкой подключения будут открываться заново.
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from config import DB_THREADS, DB_POOL_MAX_IDLE
+from database import Database, db
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDatabase:
+    """Те же методы, что у Database, но корутины: await adb.get_user(user_id)"""
+
+    def __init__(self, database: Database, threads: int = 16):
+        self.database = database
+        self.threads = threads
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='db')
+
+    def __getattr__(self, name: str):
+        # Метод берётся при каждом обращении: бенчмарки подменяют методы экземпляра db
+        method = getattr(self.database, name)
+
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(
+                self._executor, functools.partial(context.run, method, *args, **kwargs))
+
+        call.__name__ = name
+        return call
+
+    def close(self):
+        """Дождаться начатых вызовов и остановить потоки"""
+        self._executor.shutdown(wait=True)
+
+
+if DB_POOL_MAX_IDLE < DB_THREADS:
+    logger.warning(f"⚠️ DB_POOL_MAX_IDLE={DB_POOL_MAX_IDLE} меньше DB_THREADS={DB_THREADS}: "
+                   f"часть подключений будет открываться на каждый вызов")
+
+# Глобальный экземпляр для обработчиков
+adb = AsyncDatabase(db, DB_THREADS)
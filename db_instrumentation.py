@@ -0,0 +1,292 @@
+"""
+Инструментирование запросов к PostgreSQL
+
+Каждый публичный метод Database оборачивается таймером: для метода копятся
+гистограмма задержек, число вызовов, ошибок и возвращённых строк. Курсоры
+создаются через InstrumentedConnection, поэтому каждый execute() знает свой SQL,
+время и rowcount. Если вызов метода дольше порога, в лог database.slow пишутся
+SQL, «форма» параметров (только типы, без значений) и, по желанию, план
+EXPLAIN ANALYZE (не чаще раза в интервал для метода, только для SELECT).
+
+Накладные расходы — пара вызовов perf_counter и обновление счётчиков на вызов,
+так что инструментирование можно держать включённым в продакшене.
+"""
+
+import contextvars
+import functools
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+import psycopg2
+import psycopg2.extensions
+
+from config import SLOW_QUERY_MS, SLOW_QUERY_EXPLAIN, SLOW_QUERY_EXPLAIN_INTERVAL
+from tracing import tracer
+
+slow_logger = logging.getLogger('database.slow')
+
+# Верхние границы корзин гистограммы задержек, мс
+LATENCY_BUCKETS_MS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Счётчики открытых и закрытых подключений
+connection_stats = {'opened': 0, 'closed': 0}
+
+# Запись текущего вызова метода Database (свой у каждого потока/задачи)
+_current_call: contextvars.ContextVar[Optional['CallRecord']] = contextvars.ContextVar(
+    'db_current_call', default=None)
+
+
+class LatencyHistogram:
+    """Гистограмма задержек с фиксированными корзинами"""
+
+    __slots__ = ('bounds', 'counts', 'count', 'sum_ms', 'max_ms')
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # последняя корзина — +Inf
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, value_ms: float):
+        self.counts[bisect_left(self.bounds, value_ms)] += 1
+        self.count += 1
+        self.sum_ms += value_ms
+        if value_ms > self.max_ms:
+            self.max_ms = value_ms
+
+    def percentile(self, pct: float) -> float:
+        """Оценка перцентиля — верхняя граница корзины, в которую он попал"""
+        if not self.count:
+            return 0.0
+        threshold = pct / 100 * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= threshold:
+                return self.bounds[i] if i < len(self.bounds) else self.max_ms
+        return self.max_ms
+
+
+class MethodStats:
+    """Накопленная статистика одного метода Database"""
+
+    __slots__ = ('calls', 'errors', 'rows', 'slow', 'histogram')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.slow = 0
+        self.histogram = LatencyHistogram()
+
+
+class CallRecord:
+    """Запросы и ошибки одного вызова метода"""
+
+    __slots__ = ('queries', 'errors', 'rows')
+
+    def __init__(self):
+        self.queries: List[Tuple[str, object, float]] = []
+        self.errors = 0
+        self.rows = 0
+
+
+def params_shape(params) -> str:
+    """Описание параметров запроса без значений: только типы"""
+    if params is None:
+        return '()'
+    if isinstance(params, dict):
+        return '{' + ', '.join(f'{key}: {type(value).__name__}' for key, value in params.items()) + '}'
+    return '(' + ', '.join(type(value).__name__ for value in params) + ')'
+
+
+def _normalize_sql(query) -> str:
+    if isinstance(query, bytes):
+        query = query.decode(errors='replace')
+    elif not isinstance(query, str):
+        query = str(query)
+    return ' '.join(query.split())
+
+
+class _InstrumentedCursorMixin:
+    """Засекает каждый execute() и записывает его в текущий вызов метода"""
+
+    def execute(self, query, vars=None):
+        record = _current_call.get()
+        if record is None:
+            return super().execute(query, vars)
+
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        except Exception:
+            record.errors += 1
+            raise
+        finally:
+            record.queries.append((query, vars, (time.perf_counter() - started) * 1000))
+            if self.rowcount > 0:
+                record.rows += self.rowcount
+
+
+_cursor_classes: Dict[type, type] = {}
+
+
+def _instrumented_cursor_class(base: type) -> type:
+    cls = _cursor_classes.get(base)
+    if cls is None:
+        cls = type(f'Instrumented{base.__name__}', (_InstrumentedCursorMixin, base), {})
+        _cursor_classes[base] = cls
+    return cls
+
+
+class InstrumentedConnection(psycopg2.extensions.connection):
+    """Подключение, все курсоры которого инструментированы (connection_factory для psycopg2.connect)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        connection_stats['opened'] += 1
+
+    def close(self):
+        if not self.closed:
+            connection_stats['closed'] += 1
+        super().close()
+
+    def cursor(self, *args, **kwargs):
+        base = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = _instrumented_cursor_class(base)
+        return super().cursor(*args, **kwargs)
+
+
+class QueryInstrumentation:
+    """Реестр статистики по методам Database и slow-query лог"""
+
+    def __init__(self, slow_query_ms: float = SLOW_QUERY_MS, explain: bool = SLOW_QUERY_EXPLAIN,
+                 explain_interval: float = SLOW_QUERY_EXPLAIN_INTERVAL):
+        self.slow_query_ms = slow_query_ms
+        self.explain = explain
+        self.explain_interval = explain_interval
+        self.methods: Dict[str, MethodStats] = {}
+        self._lock = threading.Lock()
+        self._last_explain: Dict[str, float] = {}
+
+    def instrument(self, cls):
+        """Декоратор класса: обернуть все публичные методы таймером"""
+        for name, attr in list(vars(cls).items()):
+            if not name.startswith('_') and callable(attr):
+                setattr(cls, name, self._wrap(name, attr))
+        return cls
+
+    def _wrap(self, name: str, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            parent = _current_call.get()
+            record = CallRecord()
+            token = _current_call.set(record)
+            span = tracer.start_span('db.' + name)
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            except Exception:
+                if not record.errors:  # ошибка execute() уже посчитана курсором
+                    record.errors += 1
+                raise
+            finally:
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                if span is not None:
+                    tracer.finish_span(*span, error='error' if record.errors else None, rows=record.rows)
+                _current_call.reset(token)
+                if parent is not None:
+                    parent.queries.extend(record.queries)
+                    parent.errors += record.errors
+                    parent.rows += record.rows
+                self._observe(name, elapsed_ms, record, args[0] if args else None)
+        return wrapper
+
+    def _observe(self, name: str, elapsed_ms: float, record: CallRecord, database):
+        with self._lock:
+            stats = self.methods.get(name)
+            if stats is None:
+                stats = self.methods[name] = MethodStats()
+            stats.calls += 1
+            stats.errors += record.errors
+            stats.rows += record.rows
+            stats.histogram.observe(elapsed_ms)
+            is_slow = elapsed_ms >= self.slow_query_ms and bool(record.queries)
+            if is_slow:
+                stats.slow += 1
+
+        if is_slow:
+            self._log_slow(name, elapsed_ms, record, database)
+
+    def _log_slow(self, name: str, elapsed_ms: float, record: CallRecord, database):
+        """Записать медленный вызов в slow-query лог"""
+        query, params, query_ms = max(record.queries, key=lambda q: q[2])
+        slow_logger.warning(
+            f"🐢 {name}: {elapsed_ms:.1f} мс ({len(record.queries)} запр., строк: {record.rows}); "
+            f"самый долгий {query_ms:.1f} мс: {_normalize_sql(query)} | параметры: {params_shape(params)}"
+        )
+
+        if not self.explain or database is None:
+            return
+        sql = _normalize_sql(query)
+        if not sql.upper().startswith('SELECT'):
+            return  # EXPLAIN ANALYZE выполняет запрос, поэтому только чтение
+        now = time.monotonic()
+        if now - self._last_explain.get(name, -self.explain_interval) < self.explain_interval:
+            return
+        self._last_explain[name] = now
+
+        try:
+            conn = psycopg2.connect(database.database_url)
+            try:
+                cursor = conn.cursor()
+                cursor.execute('EXPLAIN ANALYZE ' + sql, params)
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+                cursor.close()
+                conn.rollback()
+            finally:
+                conn.close()
+            slow_logger.warning(f"📋 EXPLAIN ANALYZE для {name}:\n{plan}")
+        except Exception as e:
+            slow_logger.warning(f"⚠️ Не удалось получить EXPLAIN для {name}: {e}")
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Текущая статистика по методам"""
+        with self._lock:
+            return {
+                name: {
+                    'calls': stats.calls,
+                    'errors': stats.errors,
+                    'rows': stats.rows,
+                    'slow': stats.slow,
+                    'mean_ms': round(stats.histogram.sum_ms / stats.calls, 3) if stats.calls else 0.0,
+                    'p50_ms': stats.histogram.percentile(50),
+                    'p95_ms': stats.histogram.percentile(95),
+                    'p99_ms': stats.histogram.percentile(99),
+                    'max_ms': round(stats.histogram.max_ms, 3),
+                    'buckets': list(zip(stats.histogram.bounds + (float('inf'),), stats.histogram.counts)),
+                }
+                for name, stats in self.methods.items()
+            }
+
+    def format_report(self) -> str:
+        """Текстовая сводка по методам, самые нагруженные сверху"""
+        snapshot = self.snapshot()
+        lines = [f"{'метод':<34}{'вызовы':>9}{'ошибки':>8}{'строки':>9}{'медл.':>7}"
+                 f"{'p50':>8}{'p95':>8}{'p99':>8}"]
+        for name, s in sorted(snapshot.items(), key=lambda item: -item[1]['mean_ms'] * item[1]['calls']):
+            lines.append(f"{name:<34}{s['calls']:>9}{s['errors']:>8}{s['rows']:>9}{s['slow']:>7}"
+                         f"{s['p50_ms']:>8g}{s['p95_ms']:>8g}{s['p99_ms']:>8g}")
+        return '\n'.join(lines)
+
+    def reset(self):
+        with self._lock:
+            self.methods.clear()
+
+
+# Глобальный реестр статистики запросов
+query_instrumentation = QueryInstrumentation()
@@ -0,0 +1,138 @@
+"""
+Пул подключений к PostgreSQL
+
+Методы Database по-прежнему берут подключение через get_connection() и закрывают
+его conn.close(), но для PooledConnection close() возвращает подключение в пул
+(с откатом незавершённой транзакции), а не рвёт его. Пул держит только простаивающие
+подключения: занятые он не отслеживает, поэтому подключение, «потерянное» в ветке
+с исключением, просто закроется сборщиком мусора, и пул не может исчерпаться.
+
+Подключение, простоявшее в пуле дольше check_after секунд, перед выдачей
+проверяется запросом SELECT 1: сервер или балансировщик мог его разорвать, и без
+проверки ошибку получил бы вызов пользователя (например, get_user сказал бы
+зарегистрированному пользователю нажать /start). Мёртвое подключение
+закрывается, и берётся следующее.
+"""
+
+import logging
+import threading
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import psycopg2
+import psycopg2.extensions
+
+from db_instrumentation import InstrumentedConnection
+
+logger = logging.getLogger(__name__)
+
+
+class PooledConnection(InstrumentedConnection):
+    """Подключение, которое при close() возвращается в свой пул"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool: Optional['ConnectionPool'] = None
+        self.idle_since = time.monotonic()
+
+    def ping(self) -> bool:
+        """Жив ли сервер на этом подключении (запрос мимо инструментирования)"""
+        try:
+            with psycopg2.extensions.connection.cursor(self) as cursor:
+                cursor.execute('SELECT 1')
+            self.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def close(self):
+        pool = self.pool
+        if pool is not None and pool.release(self):
+            return
+        super().close()
+
+
+class ConnectionPool:
+    """Стек простаивающих подключений: не больше max_idle, при открытии — min_size"""
+
+    def __init__(self, database_url: str, min_size: int = 2, max_idle: int = 10,
+                 check_after: float = 30.0):
+        self.database_url = database_url
+        self.min_size = min_size
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self.closed = False
+        self._idle: List[PooledConnection] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> PooledConnection:
+        conn = psycopg2.connect(self.database_url, connection_factory=PooledConnection)
+        conn.pool = self
+        return conn
+
+    def open(self, warm_queries: Sequence[Tuple[str, tuple]] = ()) -> int:
+        """Открыть подключения до min_size и прогнать на каждом warm_queries; вернуть размер пула"""
+        opened = []
+        while len(self._idle) + len(opened) < self.min_size:
+            opened.append(self._connect())
+
+        for conn in opened + self._idle:
+            if not warm_queries:
+                break
+            with conn.cursor() as cursor:
+                for query, params in warm_queries:
+                    cursor.execute(query, params)
+                    cursor.fetchall()
+            conn.rollback()
+
+        with self._lock:
+            self._idle.extend(opened)
+            return len(self._idle)
+
+    def acquire(self) -> PooledConnection:
+        """Взять подключение из пула (или открыть новое, если свободных нет)"""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn = self._idle.pop()
+            if conn.closed:
+                continue
+            if time.monotonic() - conn.idle_since < self.check_after or conn.ping():
+                return conn
+            logger.warning("⚠️ Подключение из пула не отвечает, открываю новое")
+            conn.pool = None
+            conn.close()
+        return self._connect()
+
+    def release(self, conn: PooledConnection) -> bool:
+        """Вернуть подключение в пул; False — подключение нужно закрыть"""
+        if self.closed or conn.closed:
+            return False
+        status = conn.info.transaction_status
+        if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                return False
+        with self._lock:
+            if len(self._idle) >= self.max_idle:
+                return False
+            conn.idle_since = time.monotonic()
+            self._idle.append(conn)
+        return True
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    def close(self):
+        """Закрыть все простаивающие подключения; занятые закроются при возврате"""
+        with self._lock:
+            self.closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.pool = None
+            conn.close()
@@ -0,0 +1,163 @@
+"""
+Поддельные объекты MAX для прогона DatingBotHandlers без живого сервиса
+
+FakeBot записывает все исходящие вызовы, FakeDispatcher хранит обработчики,
+зарегистрированные через декораторы, и выбирает первый подходящий по тем же
+magic-фильтрам (F.message.body.text == ...), что и настоящий Dispatcher.
+"""
+
+import itertools
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+MESSAGE_CREATED = 'message_created'
+MESSAGE_CALLBACK = 'message_callback'
+
+_message_ids = itertools.count(1)
+
+
+class FakeBot:
+    """Бот, который вместо отправки в MAX записывает вызовы"""
+
+    def __init__(self, user_id: int = 1):
+        self.user_id = user_id
+        self.calls: List[Dict[str, Any]] = []
+        # Необязательный колбэк, вызываемый на каждый исходящий вызов
+        self.on_call: Optional[Callable[[Dict[str, Any]], None]] = None
+
+    def record(self, method: str, **kwargs) -> Dict[str, Any]:
+        """Записать исходящий вызов API"""
+        call = {'method': method, 'ts': time.time(), **kwargs}
+        self.calls.append(call)
+        if self.on_call:
+            self.on_call(call)
+        return call
+
+    async def send_message(self, chat_id: Optional[int] = None, user_id: Optional[int] = None,
+                           text: Optional[str] = None, attachments: Optional[list] = None, **kwargs):
+        return self.record('send_message', chat_id=chat_id, user_id=user_id,
+                           text=text, attachments=attachments)
+
+    async def send_callback(self, callback_id: Optional[str] = None, message=None,
+                            notification: Optional[str] = None, **kwargs):
+        return self.record('send_callback', callback_id=callback_id, text=notification)
+
+    def reset(self):
+        """Очистить записанные вызовы"""
+        self.calls.clear()
+
+
+class FakeMessage:
+    """Сообщение в диалоге пользователя с ботом"""
+
+    def __init__(self, bot: FakeBot, user_id: int, text: Optional[str] = None,
+                 username: Optional[str] = None, first_name: Optional[str] = None):
+        user = SimpleNamespace(user_id=user_id, username=username or f'user{user_id}',
+                               first_name=first_name or f'User {user_id}')
+        self.bot = bot
+        # Обработчики местами берут id из sender, местами из recipient,
+        # поэтому в диалоге с ботом оба указывают на пользователя
+        self.sender = user
+        self.recipient = user
+        self.body = SimpleNamespace(mid=f'mid.{next(_message_ids)}', text=text, attachments=[])
+
+    async def answer(self, text: Optional[str] = None, attachments: Optional[list] = None, **kwargs):
+        # Как и в maxapi, ответ идёт через bot.send_message
+        return await self.bot.send_message(user_id=self.sender.user_id, text=text,
+                                           attachments=attachments)
+
+
+class FakeMessageCreated:
+    """Событие MessageCreated (пользователь написал текст)"""
+
+    update_type = MESSAGE_CREATED
+
+    def __init__(self, bot: FakeBot, user_id: int, text: str, timestamp: Optional[int] = None):
+        self.message = FakeMessage(bot, user_id, text)
+        self.timestamp = timestamp or int(time.time() * 1000)
+
+
+class FakeMessageCallback:
+    """Событие MessageCallback (пользователь нажал inline-кнопку)"""
+
+    update_type = MESSAGE_CALLBACK
+
+    def __init__(self, bot: FakeBot, user_id: int, payload: str, timestamp: Optional[int] = None):
+        self.bot = bot
+        self.message = FakeMessage(bot, user_id)
+        self.callback = SimpleNamespace(callback_id=f'cb.{next(_message_ids)}', payload=payload,
+                                        user=self.message.sender)
+        self.timestamp = timestamp or int(time.time() * 1000)
+
+    async def answer(self, notification: Optional[str] = None, **kwargs):
+        return await self.bot.send_callback(callback_id=self.callback.callback_id,
+                                            notification=notification)
+
+
+class FakeDispatcher:
+    """Минимальный Dispatcher: регистрация через декораторы и выбор первого подходящего обработчика"""
+
+    def __init__(self):
+        self.handlers: Dict[str, List[tuple]] = {MESSAGE_CREATED: [], MESSAGE_CALLBACK: []}
+
+    def _register(self, update_type: str, filters: tuple):
+        def decorator(func):
+            self.handlers[update_type].append((filters, func))
+            return func
+        return decorator
+
+    def message_created(self, *filters):
+        return self._register(MESSAGE_CREATED, filters)
+
+    def message_callback(self, *filters):
+        return self._register(MESSAGE_CALLBACK, filters)
+
+    async def feed(self, event) -> bool:
+        """Передать событие первому обработчику, чьи фильтры совпали"""
+        for filters, func in self.handlers.get(event.update_type, []):
+            if all(f.resolve(event) for f in filters):
+                await func(event)
+                return True
+        return False
+
+
+def make_event(bot: FakeBot, update_type: str, user_id: int, text: str,
+               timestamp: Optional[int] = None):
+    """Создать поддельное событие по типу обновления"""
+    if update_type == MESSAGE_CALLBACK:
+        return FakeMessageCallback(bot, user_id, text, timestamp)
+    return FakeMessageCreated(bot, user_id, text, timestamp)
+
+
+def make_update_payload(update_type: str, user_id: int, text: str, bot_user_id: int = 1,
+                        timestamp: Optional[int] = None) -> Dict[str, Any]:
+    """JSON обновления в том виде, в каком MAX присылает его на вебхук"""
+    timestamp = timestamp or int(time.time() * 1000)
+    user = {'user_id': user_id, 'first_name': f'User {user_id}', 'name': f'User {user_id}',
+            'username': f'user{user_id}', 'is_bot': False, 'last_activity_time': timestamp}
+    message_id = next(_message_ids)
+    message = {
+        'sender': user,
+        'recipient': {'chat_id': user_id, 'chat_type': 'dialog', 'user_id': bot_user_id},
+        'timestamp': timestamp,
+        'body': {'mid': f'mid.{message_id}', 'seq': message_id, 'text': None},
+    }
+    if update_type == MESSAGE_CALLBACK:
+        return {'update_type': MESSAGE_CALLBACK, 'timestamp': timestamp, 'message': message,
+                'callback': {'timestamp': timestamp, 'callback_id': f'cb.{message_id}',
+                             'payload': text, 'user': user}}
+    message['body']['text'] = text
+    return {'update_type': MESSAGE_CREATED, 'timestamp': timestamp, 'message': message}
+
+
+def event_from_payload(bot: FakeBot, payload: Dict[str, Any]):
+    """Поддельное событие из JSON обновления (обратное make_update_payload)"""
+    update_type = payload['update_type']
+    if update_type == MESSAGE_CALLBACK:
+        callback = payload['callback']
+        return make_event(bot, update_type, callback['user']['user_id'], callback['payload'],
+                          payload.get('timestamp'))
+    message = payload['message']
+    return make_event(bot, update_type, message['sender']['user_id'], message['body']['text'],
+                      payload.get('timestamp'))
@@ -0,0 +1,103 @@
+"""
+Геохеш и поиск соседних ячеек для анкет поблизости
+
+Координаты пользователя хранятся вместе с геохешем (GEOHASH_PRECISION символов,
+ячейка около 150 м). У точек рядом общий префикс геохеша, поэтому «анкеты рядом»
+- это выборка по префиксам из B-tree индекса users(geohash), а не расчёт
+расстояния до каждой анкеты в таблице.
+
+Точка может лежать у самой границы ячейки, поэтому берётся не одна ячейка, а
+блок 3x3: ячейка точки и восемь соседних. Поиск начинается с мелких ячеек
+(GEO_START_PRECISION) и укрупняет их, пока кандидатов не хватит или блок не
+накроет весь радиус поиска. Точное расстояние считается только для строк,
+отобранных по префиксам.
+"""
+
+import math
+from typing import Iterator, List, Tuple
+
+# Алфавит геохеша (base32 без a, i, l, o)
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Точность хранимого геохеша и первого шага поиска
+GEOHASH_PRECISION = 7
+GEO_START_PRECISION = 5
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+
+def encode(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Геохеш точки заданной длины"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        # Чётные биты делят долготу, нечётные - широту
+        target, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (target[0] + target[1]) / 2
+        if coordinate >= middle:
+            value = value * 2 + 1
+            target[0] = middle
+        else:
+            value = value * 2
+            target[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """Размер ячейки в градусах: (широта, долгота)"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def neighbour_cells(latitude: float, longitude: float, precision: int) -> List[str]:
+    """Ячейка точки и соседние с ней (блок 3x3, без повторов у полюсов)"""
+    lat_step, lon_step = cell_size(precision)
+    cells = []
+    for dlat in (0, -1, 1):
+        lat = latitude + dlat * lat_step
+        if lat > 90.0 or lat < -90.0:
+            continue
+        for dlon in (0, -1, 1):
+            # Сдвиг ровно на ячейку попадает в соседнюю; долгота заворачивается через 180°
+            lon = (longitude + dlon * lon_step + 180.0) % 360.0 - 180.0
+            cell = encode(lat, lon, precision)
+            if cell not in cells:
+                cells.append(cell)
+    return cells
+
+
+def covered_radius_km(latitude: float, precision: int) -> float:
+    """Расстояние от точки, которое блок 3x3 накрывает гарантированно"""
+    lat_step, lon_step = cell_size(precision)
+    return min(lat_step, lon_step * math.cos(math.radians(latitude))) * KM_PER_DEGREE
+
+
+def expanding_cells(latitude: float, longitude: float,
+                    radius_km: float) -> Iterator[Tuple[List[str], bool]]:
+    """Блоки ячеек от мелких к крупным: (ячейки, накрыт ли весь радиус)"""
+    for precision in range(GEO_START_PRECISION, 0, -1):
+        complete = precision == 1 or covered_radius_km(latitude, precision) >= radius_km
+        yield neighbour_cells(latitude, longitude, precision), complete
+        if complete:
+            return
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Расстояние между точками по большому кругу (формула гаверсинусов)"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
@@ -4,28 +4,40 @@
 
 import asyncio
 import logging
-from typing import Optional
+from typing import Optional, Tuple
 from maxapi import Dispatcher, F, Bot
 from maxapi.types import MessageCreated, Command, CallbackButton
+from maxapi.types.attachments.location import Location
 from maxapi.filters.callback_payload import CallbackPayload
 
-from config import MESSAGES, BOT_TOKEN, CATEGORIES
-from database import db
+from config import MESSAGES, BOT_TOKEN, CATEGORIES, ADMIN_IDS, PROFILE_DEFAULT_SECONDS, GEO_DEFAULT_RADIUS_KM
+from db_async import adb
 from states import UserState
 from keyboards import (
     get_main_menu_keyboard, get_gender_keyboard, get_categories_keyboard,
-    get_profile_view_keyboard, format_profile_card, get_edit_profile_keyboard,
+    get_profile_view_keyboard, get_edit_profile_keyboard,
     get_browse_category_keyboard, format_matches_list, get_chat_keyboard,
-    get_main_menu_buttons, get_gender_buttons, get_categories_buttons,
-    get_profile_view_buttons, get_edit_profile_buttons, get_chat_buttons,
-    get_profile_action_buttons, get_back_to_menu_button, get_invalid_action_message,
-    get_browse_category_buttons
+    get_main_menu_attachment, get_gender_attachment, get_categories_attachment,
+    get_profile_view_attachment, get_edit_profile_attachment, get_chat_buttons,
+    get_profile_action_attachment, get_back_to_menu_attachment, get_invalid_action_message,
+    get_browse_category_attachment, get_search_preferences_attachment, get_location_attachment,
+    get_search_results_attachment
 )
 from utils import (
-    validate_name, validate_age, validate_bio, validate_gender,
-    ValidationError, extract_user_from_command, extract_match_from_command,
-    format_user_profile, get_gender_text
+    validate_name, validate_age, validate_bio, validate_gender, validate_age_range, validate_radius,
+    validate_search_query, ValidationError, extract_user_from_command, extract_match_from_command,
+    format_search_preferences, format_search_results, get_gender_text,
+    extract_command_arg, parse_search_page_arg
 )
+from metrics import track_update
+from tracing import tracer, format_trace
+from profiler import profiler, format_profile_summary
+from outbox import outbox, LANE_CHAT, LANE_REPLY, LANE_MENU
+from scheduler import get_update_user_id
+from responses import ResponseBuilder, current_response
+from router import Router, Route
+from geo import encode as geohash_encode
+from cards import render_profile_card, render_user_profile
 
 logger = logging.getLogger(__name__)
 
@@ -33,205 +45,148 @@ class DatingBotHandlers:
     def __init__(self, dp: Dispatcher, bot: Bot):
         self.dp = dp
         self.bot = bot
+        # Фоновые задачи (например, ожидание результата /profile)
+        self._background_tasks = set()
+        self.router = self.build_router()
         self.register_handlers()
 
+    async def answer(self, event: MessageCreated, text: Optional[str] = None,
+                     attachments: Optional[list] = None, lane: int = LANE_REPLY):
+        """Ответить пользователю: в сборку ответа обновления или сразу в очередь отправки"""
+        response = current_response.get()
+        if response is not None and not response.closed:
+            response.add(text, attachments, lane)
+            return
+        await self._send(event, text, attachments, lane)
+
+    async def _send(self, event: MessageCreated, text: Optional[str], attachments: Optional[list], lane: int):
+        """Поставить сообщение в очередь отправки (не дожидаясь MAX API)"""
+        await outbox.send(get_update_user_id(event),
+                          lambda: event.message.answer(text, attachments=attachments), lane)
+
+    @staticmethod
+    def command_text(event: MessageCreated) -> str:
+        """Команда обновления: payload кнопки или текст сообщения"""
+        callback = getattr(event, 'callback', None)
+        if callback is not None:
+            return callback.payload or ''
+        return event.message.body.text or ''
+
     async def send_main_menu(self, event: MessageCreated):
         """Отправить главное меню с inline кнопками"""
         user_id = str(event.message.sender.user_id)
-        unread_count = db.get_unread_notifications_count(user_id)
-        buttons = get_main_menu_buttons(unread_count)
-        await event.message.answer(
+        unread_count = await adb.get_unread_notifications_count(user_id)
+        keyboard = get_main_menu_attachment(unread_count)
+        await self.answer(
+            event,
             "📋 *Главное меню*\n\nВыбери действие:",
-            attachments=[buttons.pack()]
+            attachments=[keyboard],
+            lane=LANE_MENU
         )
 
-    def register_handlers(self):
-        """Регистрация всех обработчиков"""
-
-        # Стартовая команда
-        @self.dp.message_created(F.message.body.text.startswith('/start'))
-        async def handle_start(event: MessageCreated):
-            await self.cmd_start(event)
-
-        # Главное меню
-        @self.dp.message_created(F.message.body.text == '/menu')
-        async def handle_menu(event: MessageCreated):
-            await self.cmd_menu(event)
+    async def process_update(self, event: MessageCreated, route: Route):
+        """Обработать одно обновление обработчиком маршрута с учётом метрик и трассировки"""
+        command = route.name
+        handler = route.handler
+        # Все ответы обработчика уходят после него, склеенные в минимум сообщений
+        response = ResponseBuilder()
+        token = current_response.set(response)
+        try:
+            with track_update(command), tracer.trace(f'update {command}', handler=handler.__name__):
+                try:
+                    await handler(event)
+                finally:
+                    for text, attachments, lane in response.close():
+                        await self._send(event, text, attachments, lane)
+        finally:
+            current_response.reset(token)
+
+    def build_router(self) -> Router:
+        """Таблица команд, общая для текстовых сообщений и inline кнопок"""
+        router = Router()
+        commands = {
+            # --- Основное меню ---
+            '/start': self.cmd_start,
+            '/menu': self.cmd_menu,
+            # --- Просмотр профиля и анкет ---
+            '/view_profile': self.cmd_view_profile,
+            '/browse': self.cmd_browse_start,
+            # --- Действия с анкетами ---
+            '/like': self.cmd_like,
+            '/dislike': self.cmd_dislike,
+            '/skip': self.cmd_skip,
+            # --- Лайки и сообщения ---
+            '/likes': self.cmd_likes,
+            '/messages': self.cmd_matches,
+            '/notifications': self.cmd_notifications,
+            # --- Редактирование профиля ---
+            '/edit': self.cmd_edit_menu,
+            '/edit_name': self.cmd_edit_name,
+            '/edit_age': self.cmd_edit_age,
+            '/edit_gender': self.cmd_edit_gender,
+            '/edit_bio': self.cmd_edit_bio,
+            '/edit_categories': self.cmd_edit_categories,
+            '/gender_male': self.cmd_gender_select,
+            '/gender_female': self.cmd_gender_select,
+            '/done_categories': self.cmd_done_categories,
+            # --- Настройки поиска ---
+            '/prefs': self.cmd_search_preferences,
+            '/prefs_age': self.cmd_edit_search_age,
+            '/prefs_age_any': self.cmd_search_age_any,
+            '/prefs_gender_male': self.cmd_search_gender,
+            '/prefs_gender_female': self.cmd_search_gender,
+            '/prefs_gender_any': self.cmd_search_gender,
+            '/location': self.cmd_location,
+            '/location_off': self.cmd_location_off,
+            '/radius': self.cmd_radius,
+            # --- Поиск по описанию ---
+            '/search': self.cmd_search,
+            '/search_page': self.cmd_search_page,
+            # --- Чат ---
+            '/stop_chat': self.cmd_stop_chat,
+            # --- Служебные (только для администраторов) ---
+            '/traces': self.cmd_traces,
+            '/profile': self.cmd_profile,
+        }
+        # Выбор категории для просмотра
+        for cat in CATEGORIES.keys():
+            commands[f'/{cat}'] = self.cmd_browse_category
 
-        # Просмотр профиля
-        @self.dp.message_created(F.message.body.text == '/view_profile')
-        async def handle_view_profile(event: MessageCreated):
-            await self.cmd_view_profile(event)
+        for command, handler in commands.items():
+            router.add(command, handler)
+        # Вход в чат с пользователем: /chat_<user_id>
+        router.add_prefix('/chat_', self.cmd_start_chat)
+        # Анкета из результатов поиска: /show_<user_id>
+        router.add_prefix('/show_', self.cmd_show_profile)
+        return router
 
-        # Просмотр анкет
-        @self.dp.message_created(F.message.body.text == '/browse')
-        async def handle_browse(event: MessageCreated):
-            await self.cmd_browse_start(event)
+    def register_handlers(self):
+        """Регистрация обработчиков: все обновления разрешаются таблицей маршрутов"""
 
-        # Выбор категории для просмотра
-        @self.dp.message_created(F.message.body.text.in_(
-            [f'/{cat}' for cat in CATEGORIES.keys()]
-        ))
-        async def handle_category_select(event: MessageCreated):
-            await self.cmd_browse_category(event)
-
-        # Лайк
-        @self.dp.message_created(F.message.body.text == '/like')
-        async def handle_like(event: MessageCreated):
-            await self.cmd_like(event)
-
-        # Дизлайк
-        @self.dp.message_created(F.message.body.text == '/dislike')
-        async def handle_dislike(event: MessageCreated):
-            await self.cmd_dislike(event)
-
-        # Пропустить
-        @self.dp.message_created(F.message.body.text == '/skip')
-        async def handle_skip(event: MessageCreated):
-            await self.cmd_skip(event)
-
-        # Лайки и мэтчи
-        @self.dp.message_created(F.message.body.text == '/likes')
-        async def handle_likes(event: MessageCreated):
-            await self.cmd_likes(event)
-
-        # Сообщения
-        @self.dp.message_created(F.message.body.text == '/messages')
-        async def handle_messages(event: MessageCreated):
-            await self.cmd_matches(event)
-
-        # Уведомления
-        @self.dp.message_created(F.message.body.text == '/notifications')
-        async def handle_notifications(event: MessageCreated):
-            await self.cmd_notifications(event)
-
-        # Редактирование профиля
-        @self.dp.message_created(F.message.body.text == '/edit')
-        async def handle_edit(event: MessageCreated):
-            await self.cmd_edit_menu(event)
-
-        # Редактирование имени
-        @self.dp.message_created(F.message.body.text == '/edit_name')
-        async def handle_edit_name(event: MessageCreated):
-            await self.cmd_edit_name(event)
-
-        # Редактирование возраста
-        @self.dp.message_created(F.message.body.text == '/edit_age')
-        async def handle_edit_age(event: MessageCreated):
-            await self.cmd_edit_age(event)
-
-        # Редактирование пола
-        @self.dp.message_created(F.message.body.text == '/edit_gender')
-        async def handle_edit_gender(event: MessageCreated):
-            await self.cmd_edit_gender(event)
-
-        # Редактирование описания
-        @self.dp.message_created(F.message.body.text == '/edit_bio')
-        async def handle_edit_bio(event: MessageCreated):
-            await self.cmd_edit_bio(event)
-
-        # Редактирование категорий
-        @self.dp.message_created(F.message.body.text == '/edit_categories')
-        async def handle_edit_categories(event: MessageCreated):
-            await self.cmd_edit_categories(event)
-
-        # Выбор пола
-        @self.dp.message_created(F.message.body.text.in_(['/gender_male', '/gender_female']))
-        async def handle_gender_select(event: MessageCreated):
-            await self.cmd_gender_select(event)
-
-        # Завершение выбора категорий
-        @self.dp.message_created(F.message.body.text == '/done_categories')
-        async def handle_done_categories(event: MessageCreated):
-            await self.cmd_done_categories(event)
-
-        # Вход в чат с пользователем
-        @self.dp.message_created(F.message.body.text.startswith('/chat_'))
-        async def handle_chat_start(event: MessageCreated):
-            await self.cmd_start_chat(event)
-
-        # Прерывание чата
-        @self.dp.message_created(F.message.body.text == '/stop_chat')
-        async def handle_stop_chat(event: MessageCreated):
-            await self.cmd_stop_chat(event)
-
-        # Обработка текстовых сообщений (всё остальное)
+        # Текстовые сообщения: команда из таблицы, иначе ввод по состоянию FSM
         @self.dp.message_created(F.message.body.text)
         async def handle_text_message(event: MessageCreated):
-            await self.handle_text_input(event)
+            route = self.router.route(event.message.body.text, 'message', self.handle_text_input)
+            await self.process_update(event, route)
+
+        # Геолокация (кнопка «Отправить геолокацию») приходит сообщением без текста
+        @self.dp.message_created(F.message.body.attachments)
+        async def handle_attachment_message(event: MessageCreated):
+            if any(isinstance(attachment, Location) for attachment in event.message.body.attachments):
+                await self.process_update(event, Route('location', self.handle_location_input))
 
         # ===== CALLBACK ОБРАБОТЧИКИ (для inline кнопок) =====
 
         @self.dp.message_callback()
         async def handle_command_callback(event: MessageCreated):
-            await self.cmd_command(event)
-
+            route = self.router.route(event.callback.payload, 'callback', self.cmd_unknown_callback)
+            await self.process_update(event, route)
 
     # ===== ОСНОВНЫЕ КОМАНДЫ =====
 
-    async def cmd_command(self, event: MessageCreated):
-        command = event.callback.payload
-        match command:
-            # --- Основное меню ---
-            case '/start':
-                await self.cmd_start(event)
-            case '/menu':
-                await self.cmd_menu(event)
-
-            # --- Просмотр профиля ---
-            case '/view_profile':
-                await self.cmd_view_profile(event)
-
-            # --- Просмотр анкет ---
-            case '/browse':
-                await self.cmd_browse_start(event)
-
-            case cmd if cmd in [f"/{cat}" for cat in CATEGORIES.keys()]:
-                await self.cmd_browse_category(event)
-
-            # --- Действия с анкетами ---
-            case '/like':
-                await self.cmd_like(event)
-            case '/dislike':
-                await self.cmd_dislike(event)
-            case '/skip':
-                await self.cmd_skip(event)
-
-            # --- Лайки и сообщения ---
-            case '/likes':
-                await self.cmd_likes(event)
-            case '/messages':
-                await self.cmd_matches(event)
-            case '/notifications':
-                await self.cmd_notifications(event)
-
-            # --- Редактирование профиля ---
-            case '/edit':
-                await self.cmd_edit_menu(event)
-            case '/edit_name':
-                await self.cmd_edit_name(event)
-            case '/edit_age':
-                await self.cmd_edit_age(event)
-            case '/edit_gender':
-                await self.cmd_edit_gender(event)
-            case '/edit_bio':
-                await self.cmd_edit_bio(event)
-            case '/edit_categories':
-                await self.cmd_edit_categories(event)
-            case '/done_categories':
-                await self.cmd_done_categories(event)
-            case cmd if cmd in ['/gender_male', '/gender_female']:
-                await self.cmd_gender_select(event)
-
-            # --- Чат ---
-            case cmd if cmd.startswith('/chat_'):
-                await self.cmd_start_chat(event)
-            case '/stop_chat':
-                await self.cmd_stop_chat(event)
-
-            # --- Команда не найдена ---
-            case _:
-                await event.answer("⚠️ Неизвестная команда, попробуйте /menu")
+    async def cmd_unknown_callback(self, event: MessageCreated):
+        """Кнопка с неизвестной командой"""
+        await event.answer("⚠️ Неизвестная команда, попробуйте /menu")
 
     async def cmd_start(self, event: MessageCreated):
         """Команда /start - автоматическая регистрация и в меню"""
@@ -240,25 +195,27 @@ class DatingBotHandlers:
         first_name = event.message.sender.first_name or "Друг"
 
         # Проверяем, есть ли уже профиль
-        if db.user_exists(user_id):
+        if await adb.user_exists(user_id):
             # Пользователь уже зарегистрирован
-            unread_count = db.get_unread_notifications_count(user_id)
-            user = db.get_user(user_id)
+            unread_count = await adb.get_unread_notifications_count(user_id)
+            user = await adb.get_user(user_id)
 
             if user:
                 welcome_msg = f"👋 Добро пожаловать, {user['name']}!"
-                await event.message.answer(welcome_msg)
+                await self.answer(event, welcome_msg)
 
             # Отправляем меню с inline кнопками
-            buttons = get_main_menu_buttons(unread_count)
-            await event.message.answer(
+            keyboard = get_main_menu_attachment(unread_count)
+            await self.answer(
+                event,
                 "📋 *Главное меню*\n\nВыбери действие:",
-                attachments=[buttons.pack()]
+                attachments=[keyboard],
+                lane=LANE_MENU
             )
-            db.set_user_state(user_id, UserState.MAIN_MENU.value)
+            await adb.set_user_state(user_id, UserState.MAIN_MENU.value)
         else:
             # Автоматическая регистрация новых пользователей
-            success = db.create_user(
+            success = await adb.create_user(
                 user_id=user_id,
                 username=username,
                 name=first_name,
@@ -269,73 +226,80 @@ class DatingBotHandlers:
             )
 
             if success:
-                await event.message.answer(
+                await self.answer(
+                    event,
                     f"🎉 Привет, {first_name}!\n\n"
                     f"Ты успешно зарегистрирован! 🎊\n\n"
                     f"Не забудь отредактировать свой профиль, чтобы другие могли тебя найти."
                 )
 
                 # Отправляем меню
-                buttons = get_main_menu_buttons(0)
-                await event.message.answer(
+                keyboard = get_main_menu_attachment(0)
+                await self.answer(
+                    event,
                     "📋 *Главное меню*\n\nВыбери действие:",
-                    attachments=[buttons.pack()]
+                    attachments=[keyboard],
+                    lane=LANE_MENU
                 )
-                db.set_user_state(user_id, UserState.MAIN_MENU.value)
+                await adb.set_user_state(user_id, UserState.MAIN_MENU.value)
                 logger.info(f"✅ Новый пользователь зарегистрирован: {user_id} - {first_name}")
             else:
-                await event.message.answer("❌ Ошибка регистрации. Попробуй позже.")
+                await self.answer(event, "❌ Ошибка регистрации. Попробуй позже.")
 
     async def cmd_menu(self, event: MessageCreated):
         """Возврат в главное меню"""
         user_id = str(event.message.sender.user_id)
-        db.clear_user_state(user_id)
-        db.set_user_state(user_id, UserState.MAIN_MENU.value)
-        unread_count = db.get_unread_notifications_count(user_id)
+        await adb.clear_user_state(user_id)
+        await adb.set_user_state(user_id, UserState.MAIN_MENU.value)
+        unread_count = await adb.get_unread_notifications_count(user_id)
 
         # Отправляем меню с inline кнопками
-        buttons = get_main_menu_buttons(unread_count)
-        await event.message.answer(
+        keyboard = get_main_menu_attachment(unread_count)
+        await self.answer(
+            event,
             "📋 *Главное меню*\n\nВыбери действие:",
-            attachments=[buttons.pack()]
+            attachments=[keyboard],
+            lane=LANE_MENU
         )
 
     async def cmd_view_profile(self, event: MessageCreated):
         """Показать свой профиль"""
         user_id = str(event.message.recipient.user_id)
-        user = db.get_user(user_id)
+        user = await adb.get_user(user_id)
 
         if not user:
-            await event.message.answer("❌ Профиль не найден!\n\nПопробуй /start")
+            await self.answer(event, "❌ Профиль не найден!\n\nПопробуй /start")
             return
 
-        profile_text = format_user_profile(user)
-        await event.message.answer(profile_text)
+        profile_text = render_user_profile(user)
+        await self.answer(event, profile_text)
 
-        db.set_user_state(user_id, UserState.MAIN_MENU.value)
+        await adb.set_user_state(user_id, UserState.MAIN_MENU.value)
 
-        buttons = get_profile_action_buttons()
-        await event.message.answer(
+        keyboard = get_profile_action_attachment()
+        await self.answer(
+            event,
             "Что ты хочешь сделать?",
-            attachments=[buttons.pack()]
+            attachments=[keyboard]
         )
 
     async def cmd_browse_start(self, event: MessageCreated):
         """Начало просмотра анкет"""
         user_id = str(event.message.recipient.user_id)
-        user = db.get_user(user_id)
+        user = await adb.get_user(user_id)
 
-        if not db.user_exists(user_id):
-            await event.message.answer("❌ Профиль не найден!\n\nПопробуй /start")
+        if not await adb.user_exists(user_id):
+            await self.answer(event, "❌ Профиль не найден!\n\nПопробуй /start")
             return
 
-        db.set_user_state(user_id, UserState.CHOOSE_CATEGORY.value)
+        await adb.set_user_state(user_id, UserState.CHOOSE_CATEGORY.value)
 
-        buttons = get_browse_category_buttons(user) # поставить условие на кнопки
+        keyboard = get_browse_category_attachment(user) # поставить условие на кнопки
 
-        await event.message.answer(
+        await self.answer(
+            event,
             "👀 Выбери категорию анкет:",
-            attachments=[buttons.pack()]
+            attachments=[keyboard]
         )
 
     async def cmd_browse_category(self, event: MessageCreated):
@@ -344,57 +308,110 @@ class DatingBotHandlers:
         category = event.callback.payload[1:]  # Убираем '/'
 
         if category not in CATEGORIES:
-            await event.message.answer("❌ Неизвестная категория")
+            await self.answer(event, "❌ Неизвестная категория")
             return
 
         # Получаем следующий профиль
-        profile = db.get_profile_for_user(user_id, category)
+        profile = await adb.get_profile_for_user(user_id, category)
 
         if not profile:
-            await event.message.answer(MESSAGES['no_profiles'])
-            buttons = get_browse_category_buttons()
-            await event.message.answer(
+            await self.answer(event, MESSAGES['no_profiles'])
+            keyboard = get_browse_category_attachment()
+            await self.answer(
+                event,
                 "Выбери другую категорию или вернись в меню:",
-                attachments=[buttons.pack()]
+                attachments=[keyboard]
             )
             return
 
         # Сохраняем текущий профиль и категорию в состояние
-        db.set_user_state(user_id, UserState.VIEWING_PROFILE.value, {
+        await adb.set_user_state(user_id, UserState.VIEWING_PROFILE.value, {
             'current_profile': profile,
             'category': category
         })
 
         # Показываем карточку профиля
-        card = format_profile_card(profile)
-        await event.message.answer(card)
+        card = render_profile_card(profile)
+        await self.answer(event, card)
 
-        buttons = get_profile_view_buttons()
-        await event.message.answer(
+        keyboard = get_profile_view_attachment()
+        await self.answer(
+            event,
             "Выбери действие:",
-            attachments=[buttons.pack()]
+            attachments=[keyboard]
+        )
+
+    async def cmd_search(self, event: MessageCreated):
+        """Поиск анкет по словам из описания: /search <слова>"""
+        query = extract_command_arg(self.command_text(event))
+        await self.send_search_results(event, query, 1)
+
+    async def cmd_search_page(self, event: MessageCreated):
+        """Следующая страница поиска: /search_page <страница> <релевантность>:<user_id> <слова>"""
+        page, after, query = parse_search_page_arg(extract_command_arg(self.command_text(event)))
+        await self.send_search_results(event, query, page, after)
+
+    async def send_search_results(self, event: MessageCreated, query: Optional[str], page: int,
+                                  after: Optional[Tuple[float, str]] = None):
+        """Отправить страницу результатов поиска (after - курсор из кнопки «Дальше»)"""
+        user_id = get_update_user_id(event)
+
+        if not await adb.user_exists(user_id):
+            await self.answer(event, "❌ Сначала создай свой профиль!\n\n/start")
+            return
+
+        try:
+            query = validate_search_query(query)
+        except ValidationError as e:
+            await self.answer(event, f"❌ {str(e)}")
+            return
+
+        results, next_after = await adb.search_profiles(user_id, query, after)
+        keyboard = get_search_results_attachment(query, page + 1 if next_after else None, next_after)
+        await self.answer(event, format_search_results(query, page, results), attachments=[keyboard])
+
+    async def cmd_show_profile(self, event: MessageCreated):
+        """Открыть анкету из результатов поиска"""
+        user_id = get_update_user_id(event)
+        profile_id = extract_user_from_command(self.command_text(event).split(maxsplit=1)[0])
+        profile = await adb.get_user(profile_id) if profile_id and profile_id != user_id else None
+
+        if not profile or await adb.is_chat_blocked(user_id, profile_id):
+            await self.answer(event, "❌ Анкета не найдена")
+            return
+
+        # Дальше как при просмотре: лайк/дизлайк относятся к этой анкете
+        await adb.set_user_state(user_id, UserState.VIEWING_PROFILE.value, {'current_profile': profile})
+        card = render_profile_card(profile)
+        await self.answer(event, card)
+
+        keyboard = get_profile_view_attachment()
+        await self.answer(
+            event,
+            "Выбери действие:",
+            attachments=[keyboard]
         )
 
     async def cmd_like(self, event: MessageCreated):
         """Лайк профилю"""
         user_id = str(event.message.recipient.user_id)
-        state, other_id = db.get_user_state(user_id)
+        state, other_id = await adb.get_user_state(user_id)
 
         if state != UserState.VIEWING_PROFILE.value or not other_id:
-            await event.message.answer("⚠️ Сначала выбери анкету для просмотра")
+            await self.answer(event, "⚠️ Сначала выбери анкету для просмотра")
             return
 
         if not other_id:
             return
 
-        current_user = db.get_user(user_id)
-        other_user = db.get_user(other_id)
+        current_user = await adb.get_user(user_id)
+        other_user = await adb.get_user(other_id)
 
         # Добавляем лайк
-        db.add_like(user_id, other_id)
+        await adb.add_like(user_id, other_id)
 
         # Отправляем уведомление о лайке
-        db.add_notification(
+        await adb.add_notification(
             user_id=other_id,
             from_user_id=user_id,
             from_user_name=current_user['name'],
@@ -404,9 +421,9 @@ class DatingBotHandlers:
         )
 
         # Проверяем, есть ли обратный лайк (матч!)
-        if db.get_matches(other_id) and user_id in db.get_matches(other_id):
+        if await adb.get_matches(other_id) and user_id in await adb.get_matches(other_id):
             # Создаём уведомления о взаимной симпатии для обоих
-            db.add_notification(
+            await adb.add_notification(
                 user_id=user_id,
                 from_user_id=other_id,
                 from_user_name=other_user['name'],
@@ -415,7 +432,7 @@ class DatingBotHandlers:
                 message=f"💕 Взаимная симпатия с {other_user['name']}! @{other_user['username']}"
             )
 
-            db.add_notification(
+            await adb.add_notification(
                 user_id=other_id,
                 from_user_id=user_id,
                 from_user_name=current_user['name'],
@@ -424,14 +441,16 @@ class DatingBotHandlers:
                 message=f"💕 Взаимная симпатия с {current_user['name']}! @{current_user['username']}"
             )
 
-            await event.message.answer(
+            await self.answer(
+                event,
                 f"💕 МЭТЧ! Вы понравились друг другу!\n\n"
                 f"Напиши {'ей' if other_user['gender'] == 'female' else 'ему'}: /chat_{other_id}\n"
                 f"или в /messages"
             )
         else:
             # Сообщение об успешном лайке
-            await event.message.answer(
+            await self.answer(
+                event,
                 f"❤️ Вы лайкнули {other_user['name']}!\n\n"
                 f"Если {'ей' if other_user['gender'] == 'female' else 'ему'} вы понравитесь, "
                 f"вы получите уведомление!"
@@ -443,17 +462,17 @@ class DatingBotHandlers:
     async def cmd_dislike(self, event: MessageCreated):
         """Дизлайк профилю"""
         user_id = str(event.message.sender.user_id)
-        state, data = db.get_user_state(user_id)
+        state, data = await adb.get_user_state(user_id)
 
         if state != UserState.VIEWING_PROFILE.value or not data:
-            await event.message.answer("⚠️ Сначала выбери анкету для просмотра")
+            await self.answer(event, "⚠️ Сначала выбери анкету для просмотра")
             return
 
         profile = data.get('current_profile')
         if not profile:
             return
 
-        db.add_dislike(user_id, profile['user_id'])
+        await adb.add_dislike(user_id, profile['user_id'])
 
         # Показываем следующий профиль
         await self._show_next_profile(event, data.get('category'))
@@ -461,10 +480,10 @@ class DatingBotHandlers:
     async def cmd_skip(self, event: MessageCreated):
         """Пропустить профиль"""
         user_id = str(event.message.sender.user_id)
-        state, data = db.get_user_state(user_id)
+        state, data = await adb.get_user_state(user_id)
 
         if state != UserState.VIEWING_PROFILE.value or not data:
-            await event.message.answer("⚠️ Сначала выбери анкету для просмотра")
+            await self.answer(event, "⚠️ Сначала выбери анкету для просмотра")
             return
 
         await self._show_next_profile(event, data.get('category'))
@@ -475,22 +494,23 @@ class DatingBotHandlers:
         matches = []
 
         # Получаем ID мэтчей
-        match_ids = db.get_matches(user_id)
+        match_ids = await adb.get_matches(user_id)
 
         # Преобразуем в объекты пользователей
         for match_id in match_ids:
-            user = db.get_user(match_id)
+            user = await adb.get_user(match_id)
             if user:
                 matches.append(user)
 
-        db.set_user_state(user_id, UserState.CHOOSE_MATCH.value)
-        await event.message.answer(format_matches_list(matches))
+        await adb.set_user_state(user_id, UserState.CHOOSE_MATCH.value)
+        await self.answer(event, format_matches_list(matches))
 
         # Показываем кнопку возврата
-        buttons = get_back_to_menu_button()
-        await event.message.answer(
+        keyboard = get_back_to_menu_attachment()
+        await self.answer(
+            event,
             "Вернись в меню:",
-            attachments=[buttons.pack()]
+            attachments=[keyboard]
         )
 
     async def cmd_matches(self, event: MessageCreated):
@@ -498,36 +518,38 @@ class DatingBotHandlers:
         user_id = str(event.message.sender.user_id)
         matches = []
 
-        match_ids = db.get_matches(user_id)
+        match_ids = await adb.get_matches(user_id)
         for match_id in match_ids:
-            user = db.get_user(match_id)
+            user = await adb.get_user(match_id)
             if user:
                 matches.append(user)
 
-        db.set_user_state(user_id, UserState.CHOOSE_MATCH.value)
-        await event.message.answer(format_matches_list(matches))
+        await adb.set_user_state(user_id, UserState.CHOOSE_MATCH.value)
+        await self.answer(event, format_matches_list(matches))
 
         # Если есть мэтчи, показываем кнопку возврата
         if matches:
-            buttons = get_back_to_menu_button()
-            await event.message.answer(
+            keyboard = get_back_to_menu_attachment()
+            await self.answer(
+                event,
                 "Выбери из списка выше или вернись в меню:",
-                attachments=[buttons.pack()]
+                attachments=[keyboard]
             )
         else:
-            buttons = get_back_to_menu_button()
-            await event.message.answer(
+            keyboard = get_back_to_menu_attachment()
+            await self.answer(
+                event,
                 "Вернись в меню:",
-                attachments=[buttons.pack()]
+                attachments=[keyboard]
             )
 
     async def cmd_notifications(self, event: MessageCreated):
         """Показать уведомления"""
         user_id = str(event.message.sender.user_id)
-        notifications = db.get_notifications(user_id)
+        notifications = await adb.get_notifications(user_id)
 
         if not notifications:
-            await event.message.answer("📭 У тебя пока нет уведомлений")
+            await self.answer(event, "📭 У тебя пока нет уведомлений")
         else:
             # Форматируем и отправляем уведомления
             notification_text = "🔔 *Твои уведомления:*\n\n"
@@ -541,12 +563,12 @@ class DatingBotHandlers:
                     notification_text += f"💕 *МЭТЧ!*\n"
                     notification_text += f"   {notif['message']}\n\n"
 
-            await event.message.answer(notification_text)
+            await self.answer(event, notification_text)
 
             # Отмечаем все уведомления как прочитанные
-            db.mark_all_notifications_as_read(user_id)
+            await adb.mark_all_notifications_as_read(user_id)
 
-        db.set_user_state(user_id, UserState.MAIN_MENU.value)
+        await adb.set_user_state(user_id, UserState.MAIN_MENU.value)
 
         # Возвращаемся в меню
         await self.send_main_menu(event)
@@ -562,206 +584,424 @@ class DatingBotHandlers:
         try:
             match_id = text.split('_', 1)[1]
         except (IndexError, ValueError):
-            await event.message.answer("⚠️ Неверный формат команды")
-            buttons = get_back_to_menu_button()
-            await event.message.answer(
+            await self.answer(event, "⚠️ Неверный формат команды")
+            keyboard = get_back_to_menu_attachment()
+            await self.answer(
+                event,
                 "Вернись в меню:",
-                attachments=[buttons.pack()]
+                attachments=[keyboard]
             )
             return
 
         # Проверяем, что пользователь существует
-        match_user = db.get_user(match_id)
+        match_user = await adb.get_user(match_id)
         if not match_user:
-            await event.message.answer("⚠️ Пользователь не найден")
-            buttons = get_back_to_menu_button()
-            await event.message.answer(
+            await self.answer(event, "⚠️ Пользователь не найден")
+            keyboard = get_back_to_menu_attachment()
+            await self.answer(
+                event,
                 "Вернись в меню:",
-                attachments=[buttons.pack()]
+                attachments=[keyboard]
             )
             return
 
         # Проверяем, что это мэтч (взаимная симпатия)
-        if match_id not in db.get_matches(user_id):
-            await event.message.answer(
+        if match_id not in await adb.get_matches(user_id):
+            await self.answer(
+                event,
                 "⚠️ Это не ваш мэтч.\n\n"
                 "Сначала нужна взаимная симпатия!"
             )
-            buttons = get_back_to_menu_button()
-            await event.message.answer(
+            keyboard = get_back_to_menu_attachment()
+            await self.answer(
+                event,
                 "Вернись в меню:",
-                attachments=[buttons.pack()]
+                attachments=[keyboard]
             )
             return
 
         # Проверяем, что чат не заблокирован
-        if db.is_chat_blocked(user_id, match_id):
-            await event.message.answer(
+        if await adb.is_chat_blocked(user_id, match_id):
+            await self.answer(
+                event,
                 "⛔ Чат с этим пользователем был прерван и больше невозможен."
             )
-            buttons = get_back_to_menu_button()
-            await event.message.answer(
+            keyboard = get_back_to_menu_attachment()
+            await self.answer(
+                event,
                 "Вернись в меню:",
-                attachments=[buttons.pack()]
+                attachments=[keyboard]
             )
             return
 
         # Устанавливаем состояние IN_CHAT
-        db.set_user_state(user_id, UserState.IN_CHAT.value, {
+        await adb.set_user_state(user_id, UserState.IN_CHAT.value, {
             'match_id': match_id
         })
 
-        await event.message.answer(
+        await self.answer(
+            event,
             f"💬 Вы вошли в чат с {match_user['name']}\n\n"
-            f"Напиши своё сообщение (введи текст или команду /stop_chat для выхода)"
+            f"Напиши своё сообщение (введи текст или команду /stop_chat для выхода)",
+            lane=LANE_CHAT
         )
 
     async def cmd_stop_chat(self, event: MessageCreated):
         """Прервать чат и заблокировать переписку с пользователем"""
         user_id = str(event.message.sender.user_id)
-        state, data = db.get_user_state(user_id)
+        state, data = await adb.get_user_state(user_id)
 
         if state != UserState.IN_CHAT.value or not data:
-            await event.message.answer("⚠️ Ты не находишься в чате")
+            await self.answer(event, "⚠️ Ты не находишься в чате")
             return
 
         match_id = data.get('match_id')
         if not match_id:
-            await event.message.answer("⚠️ Ошибка чата")
+            await self.answer(event, "⚠️ Ошибка чата")
             return
 
         # Блокируем чат (обоюдно)
-        db.block_chat(user_id, match_id)
+        await adb.block_chat(user_id, match_id)
 
         # Очищаем состояние
-        db.clear_user_state(user_id)
+        await adb.clear_user_state(user_id)
 
-        match_user = db.get_user(match_id)
-        await event.message.answer(
+        match_user = await adb.get_user(match_id)
+        await self.answer(
+            event,
             f"❌ Чат с {match_user['name'] if match_user else 'пользователем'} прерван.\n"
-            f"Вы больше не сможете переписываться."
+            f"Вы больше не сможете переписываться.",
+            lane=LANE_CHAT
         )
 
         # Возвращаемся в меню
         await self.send_main_menu(event)
 
+    # ===== СЛУЖЕБНЫЕ КОМАНДЫ =====
+
+    async def cmd_traces(self, event: MessageCreated):
+        """Показать последние трассы обновлений: /traces [N|slow]"""
+        user_id = str(event.message.sender.user_id)
+        if user_id not in ADMIN_IDS:
+            await self.answer(event, "⛔ Команда доступна только администраторам")
+            return
+
+        arg = extract_command_arg(event.message.body.text) or ''
+        slowest = arg == 'slow'
+        limit = int(arg) if arg.isdigit() else 5
+        traces = tracer.recent(limit, slowest=slowest)
+
+        if not traces:
+            await self.answer(event, "📭 Трасс пока нет")
+            return
+
+        text = f"🧵 *{'Самые медленные' if slowest else 'Последние'} трассы:*\n\n"
+        for record in traces:
+            text += f"`{record['trace_id']}` {record['duration_ms']:.1f} мс\n{format_trace(record)}\n\n"
+        await self.answer(event, text[:3900])
+
+    async def cmd_profile(self, event: MessageCreated):
+        """Снять профиль процесса на N секунд: /profile [секунды]"""
+        user_id = str(event.message.sender.user_id)
+        if user_id not in ADMIN_IDS:
+            await self.answer(event, "⛔ Команда доступна только администраторам")
+            return
+
+        arg = extract_command_arg(event.message.body.text) or ''
+        seconds = int(arg) if arg.isdigit() else PROFILE_DEFAULT_SECONDS
+        future = profiler.start(seconds)
+        if future is None:
+            await self.answer(event, "⏳ Профилирование уже идёт, дождись результата")
+            return
+
+        await self.answer(event, f"🔬 Профилирование запущено, пришлю результат через ~{seconds:.0f} с")
+        # Не держим обработку обновления: сводку отправит отдельная задача
+        task = asyncio.create_task(self._send_profile_result(event, future))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _send_profile_result(self, event: MessageCreated, future: asyncio.Future):
+        result = await future
+        if result is None:
+            await self.answer(event, "❌ Не удалось снять профиль, подробности в логе")
+            return
+        await self.answer(event, format_profile_summary(result)[:3900])
+
     # ===== СОЗДАНИЕ И РЕДАКТИРОВАНИЕ ПРОФИЛЯ =====
 
     async def cmd_edit_menu(self, event: MessageCreated):
         """Меню редактирования профиля"""
         user_id = str(event.message.recipient.user_id)
 
-        if not db.user_exists(user_id):
-            await event.message.answer("❌ Сначала создай свой профиль!\n\n/start")
+        if not await adb.user_exists(user_id):
+            await self.answer(event, "❌ Сначала создай свой профиль!\n\n/start")
             return
 
-        buttons = get_edit_profile_buttons()
-        await event.message.answer(
+        keyboard = get_edit_profile_attachment()
+        await self.answer(
+            event,
             "Что ты хочешь изменить?",
-            attachments=[buttons.pack()]
+            attachments=[keyboard]
         )
 
     async def cmd_edit_name(self, event: MessageCreated):
         """Редактировать имя"""
         user_id = str(event.message.sender.user_id)
-        db.set_user_state(user_id, UserState.ENTER_NAME.value, {'editing': True})
-        await event.message.answer(MESSAGES['enter_name'])
+        await adb.set_user_state(user_id, UserState.ENTER_NAME.value, {'editing': True})
+        await self.answer(event, MESSAGES['enter_name'])
 
     async def cmd_edit_age(self, event: MessageCreated):
         """Редактировать возраст"""
         user_id = str(event.message.sender.user_id)
-        db.set_user_state(user_id, UserState.ENTER_AGE.value, {'editing': True})
-        await event.message.answer(MESSAGES['enter_age'])
+        await adb.set_user_state(user_id, UserState.ENTER_AGE.value, {'editing': True})
+        await self.answer(event, MESSAGES['enter_age'])
 
     async def cmd_edit_gender(self, event: MessageCreated):
         """Редактировать пол"""
         user_id = str(event.message.sender.user_id)
-        db.set_user_state(user_id, UserState.ENTER_GENDER.value, {'editing': True})
-        buttons = get_gender_buttons()
-        await event.message.answer(
+        await adb.set_user_state(user_id, UserState.ENTER_GENDER.value, {'editing': True})
+        keyboard = get_gender_attachment()
+        await self.answer(
+            event,
             "Выбери свой пол:",
-            attachments=[buttons.pack()]
+            attachments=[keyboard]
         )
 
     async def cmd_edit_bio(self, event: MessageCreated):
         """Редактировать описание"""
         user_id = str(event.message.sender.user_id)
-        db.set_user_state(user_id, UserState.ENTER_BIO.value, {'editing': True})
-        await event.message.answer(MESSAGES['enter_bio'])
+        await adb.set_user_state(user_id, UserState.ENTER_BIO.value, {'editing': True})
+        await self.answer(event, MESSAGES['enter_bio'])
 
     async def cmd_edit_categories(self, event: MessageCreated):
         """Редактировать категории"""
         user_id = str(event.message.recipient.user_id)
-        db.set_user_state(user_id, UserState.CHOOSE_CATEGORIES.value, {'editing': True})
-        buttons = get_categories_buttons()
-        await event.message.answer(
+        await adb.set_user_state(user_id, UserState.CHOOSE_CATEGORIES.value, {'editing': True})
+        keyboard = get_categories_attachment()
+        await self.answer(
+            event,
             "Выбери категории (можешь несколько):",
-            attachments=[buttons.pack()]
+            attachments=[keyboard]
+        )
+
+    # ===== НАСТРОЙКИ ПОИСКА =====
+
+    async def send_search_preferences(self, event: MessageCreated, user_id: str):
+        """Отправить текущие настройки поиска с кнопками"""
+        user = await adb.get_user(user_id)
+        if not user:
+            await self.answer(event, "❌ Сначала создай свой профиль!\n\n/start")
+            return
+
+        keyboard = get_search_preferences_attachment()
+        await self.answer(
+            event,
+            format_search_preferences(user) + "\nАнкеты вне этих рамок не показываются.",
+            attachments=[keyboard]
         )
 
+    async def cmd_search_preferences(self, event: MessageCreated):
+        """Меню настроек поиска"""
+        user_id = get_update_user_id(event)
+
+        if not await adb.user_exists(user_id):
+            await self.answer(event, "❌ Сначала создай свой профиль!\n\n/start")
+            return
+
+        await self.send_search_preferences(event, user_id)
+
+    async def cmd_edit_search_age(self, event: MessageCreated):
+        """Редактировать диапазон возраста для поиска"""
+        user_id = get_update_user_id(event)
+
+        if not await adb.user_exists(user_id):
+            await self.answer(event, "❌ Сначала создай свой профиль!\n\n/start")
+            return
+
+        await adb.set_user_state(user_id, UserState.ENTER_SEARCH_AGE.value)
+        await self.answer(event, "Напиши диапазон возраста через дефис, например 20-30:")
+
+    async def cmd_search_age_any(self, event: MessageCreated):
+        """Снять ограничение по возрасту"""
+        user_id = get_update_user_id(event)
+
+        if not await adb.user_exists(user_id):
+            await self.answer(event, "❌ Сначала создай свой профиль!\n\n/start")
+            return
+
+        await adb.update_user(user_id, pref_age_min=None, pref_age_max=None)
+        await self.answer(event, "✅ Возраст больше не ограничен")
+        await self.send_search_preferences(event, user_id)
+
+    async def cmd_search_gender(self, event: MessageCreated):
+        """Выбор пола для поиска"""
+        user_id = get_update_user_id(event)
+        gender = self.command_text(event).rsplit('_', 1)[1]
+
+        if not await adb.user_exists(user_id):
+            await self.answer(event, "❌ Сначала создай свой профиль!\n\n/start")
+            return
+
+        await adb.update_user(user_id, pref_genders=None if gender == 'any' else [gender])
+        await self.answer(event, "✅ Настройки поиска обновлены!")
+        await self.send_search_preferences(event, user_id)
+
+    async def handle_search_age_input(self, event: MessageCreated):
+        """Обработка ввода диапазона возраста"""
+        user_id = str(event.message.sender.user_id)
+
+        try:
+            age_min, age_max = validate_age_range(event.message.body.text)
+        except ValidationError as e:
+            await self.answer(event, f"❌ {str(e)}")
+            return
+
+        await adb.update_user(user_id, pref_age_min=age_min, pref_age_max=age_max)
+        await adb.clear_user_state(user_id)
+        await self.answer(event, "✅ Возраст для поиска обновлён!")
+        await self.send_search_preferences(event, user_id)
+
+    async def cmd_location(self, event: MessageCreated):
+        """Геолокация для поиска анкет поблизости"""
+        user_id = get_update_user_id(event)
+        user = await adb.get_user(user_id)
+
+        if not user:
+            await self.answer(event, "❌ Сначала создай свой профиль!\n\n/start")
+            return
+
+        if user.get('geohash'):
+            radius = user.get('pref_radius_km') or GEO_DEFAULT_RADIUS_KM
+            text = (f"📍 Геолокация указана: показываю анкеты в радиусе {radius} км.\n\n"
+                    "Изменить радиус: `/radius 30`")
+        else:
+            text = "📍 Отправь геолокацию, чтобы видеть анкеты поблизости."
+        keyboard = get_location_attachment()
+        await self.answer(event, text, attachments=[keyboard])
+
+    async def cmd_location_off(self, event: MessageCreated):
+        """Удалить геолокацию"""
+        user_id = get_update_user_id(event)
+
+        if not await adb.user_exists(user_id):
+            await self.answer(event, "❌ Сначала создай свой профиль!\n\n/start")
+            return
+
+        await adb.update_user(user_id, latitude=None, longitude=None, geohash=None)
+        await self.answer(event, "✅ Геолокация удалена, расстояние больше не учитывается")
+        await self.send_search_preferences(event, user_id)
+
+    async def cmd_radius(self, event: MessageCreated):
+        """Радиус поиска: /radius <км>"""
+        user_id = get_update_user_id(event)
+        arg = extract_command_arg(self.command_text(event))
+        user = await adb.get_user(user_id)
+
+        if not user:
+            await self.answer(event, "❌ Сначала создай свой профиль!\n\n/start")
+            return
+
+        if not arg:
+            radius = user.get('pref_radius_km') or GEO_DEFAULT_RADIUS_KM
+            await self.answer(event, f"📍 Радиус поиска: {radius} км\n\nИзменить: `/radius 30`")
+            return
+
+        try:
+            radius = validate_radius(arg)
+        except ValidationError as e:
+            await self.answer(event, f"❌ {str(e)}")
+            return
+
+        await adb.update_user(user_id, pref_radius_km=radius)
+        await self.answer(event, f"✅ Радиус поиска: {radius} км")
+        await self.send_search_preferences(event, user_id)
+
+    async def handle_location_input(self, event: MessageCreated):
+        """Сохранение присланной геолокации"""
+        user_id = str(event.message.sender.user_id)
+        location = next(attachment for attachment in event.message.body.attachments
+                        if isinstance(attachment, Location))
+
+        if location.latitude is None or location.longitude is None:
+            await self.answer(event, "❌ Не удалось прочитать геолокацию, попробуй ещё раз")
+            return
+
+        if not await adb.user_exists(user_id):
+            await self.answer(event, "👤 Сначала зарегистрируйся командой /start")
+            return
+
+        await adb.update_user(user_id, latitude=location.latitude, longitude=location.longitude,
+                       geohash=geohash_encode(location.latitude, location.longitude))
+        await self.answer(event, "✅ Геолокация сохранена! Теперь показываю анкеты поблизости.")
+        await self.send_search_preferences(event, user_id)
+
     async def cmd_gender_select(self, event: MessageCreated):
         """Выбор пола"""
         user_id = str(event.message.recipient.user_id)
         gender = 'male' if event.message.body.text == '/gender_male' else 'female'
 
-        state, data = db.get_user_state(user_id)
+        state, data = await adb.get_user_state(user_id)
 
         # Если редактируем
         if data.get('editing'):
-            db.update_user(user_id, gender=gender)
-            await event.message.answer("✅ Пол обновлён!")
-            unread_count = db.get_unread_notifications_count(user_id)
+            await adb.update_user(user_id, gender=gender)
+            await self.answer(event, "✅ Пол обновлён!")
+            unread_count = await adb.get_unread_notifications_count(user_id)
 
             # Отправляем меню с inline кнопками
-            buttons = get_main_menu_buttons(unread_count)
-            await event.message.answer(
+            keyboard = get_main_menu_attachment(unread_count)
+            await self.answer(
+                event,
                 "📋 *Главное меню*\n\nВыбери действие:",
-                attachments=[buttons.pack()]
+                attachments=[keyboard],
+                lane=LANE_MENU
             )
-            db.clear_user_state(user_id)
+            await adb.clear_user_state(user_id)
             return
 
         # Если создаём профиль
-        db.set_user_state(user_id, UserState.ENTER_BIO.value, {
+        await adb.set_user_state(user_id, UserState.ENTER_BIO.value, {
             'name': data.get('name'),
             'age': data.get('age'),
             'gender': gender
         })
-        await event.message.answer("Спасибо! Теперь расскажи о себе:")
-        await event.message.answer(MESSAGES['enter_bio'])
+        await self.answer(event, "Спасибо! Теперь расскажи о себе:")
+        await self.answer(event, MESSAGES['enter_bio'])
 
     async def cmd_done_categories(self, event: MessageCreated):
         """Завершение выбора категорий"""
         user_id = str(event.message.sender.user_id)
-        state, data = db.get_user_state(user_id)
+        state, data = await adb.get_user_state(user_id)
 
         categories = data.get('categories', [])
 
         if not categories:
-            await event.message.answer("⚠️ Выбери хотя бы одну категорию")
+            await self.answer(event, "⚠️ Выбери хотя бы одну категорию")
             return
 
         # Если редактируем
         if data.get('editing'):
-            db.update_user(user_id, categories=categories)
-            await event.message.answer("✅ Категории обновлены!")
-            unread_count = db.get_unread_notifications_count(user_id)
+            await adb.update_user(user_id, categories=categories)
+            await self.answer(event, "✅ Категории обновлены!")
+            unread_count = await adb.get_unread_notifications_count(user_id)
 
             # Отправляем меню с inline кнопками
-            buttons = get_main_menu_buttons(unread_count)
-            await event.message.answer(
+            keyboard = get_main_menu_attachment(unread_count)
+            await self.answer(
+                event,
                 "📋 *Главное меню*\n\nВыбери действие:",
-                attachments=[buttons.pack()]
+                attachments=[keyboard],
+                lane=LANE_MENU
             )
-            db.clear_user_state(user_id)
+            await adb.clear_user_state(user_id)
             return
 
         # Если создаём профиль
-        user = db.get_user(user_id)
+        user = await adb.get_user(user_id)
         if not user:
             # Создаём профиль
             username = event.message.sender.username or event.message.sender.first_name
-            success = db.create_user(
+            success = await adb.create_user(
                 user_id=user_id,
                 username=username,
                 name=data['name'],
@@ -772,21 +1012,23 @@ class DatingBotHandlers:
             )
 
             if not success:
-                await event.message.answer("❌ Ошибка при сохранении профиля. Попробуй заново.")
+                await self.answer(event, "❌ Ошибка при сохранении профиля. Попробуй заново.")
                 return
 
             print(f"✅ Профиль создан: {user_id} - {data['name']}")
 
-        await event.message.answer(MESSAGES['profile_created'])
-        unread_count = db.get_unread_notifications_count(user_id)
+        await self.answer(event, MESSAGES['profile_created'])
+        unread_count = await adb.get_unread_notifications_count(user_id)
 
         # Отправляем меню с inline кнопками
-        buttons = get_main_menu_buttons(unread_count)
-        await event.message.answer(
+        keyboard = get_main_menu_attachment(unread_count)
+        await self.answer(
+            event,
             "📋 *Главное меню*\n\nВыбери действие:",
-            attachments=[buttons.pack()]
+            attachments=[keyboard],
+            lane=LANE_MENU
         )
-        db.clear_user_state(user_id)
+        await adb.clear_user_state(user_id)
 
     # ===== ОБРАБОТКА ТЕКСТОВЫХ СООБЩЕНИЙ =====
 
@@ -794,7 +1036,7 @@ class DatingBotHandlers:
         """Обработка текстовых входов в зависимости от состояния"""
         user_id = str(event.message.sender.user_id)
         text = event.message.body.text
-        state, data = db.get_user_state(user_id)
+        state, data = await adb.get_user_state(user_id)
 
         # Имя
         if state == UserState.ENTER_NAME.value:
@@ -812,6 +1054,10 @@ class DatingBotHandlers:
         elif state == UserState.CHOOSE_CATEGORIES.value:
             await self.handle_category_choice(event, data)
 
+        # Диапазон возраста для поиска
+        elif state == UserState.ENTER_SEARCH_AGE.value:
+            await self.handle_search_age_input(event)
+
         # Чат
         elif state == UserState.IN_CHAT.value:
             await self.handle_chat_message(event, data)
@@ -819,25 +1065,29 @@ class DatingBotHandlers:
         # По умолчанию - показываем меню с предупреждением
         else:
             # Если пользователь вообще не зарегистрирован
-            if not db.user_exists(user_id):
-                await event.message.answer(
+            if not await adb.user_exists(user_id):
+                await self.answer(
+                    event,
                     "👤 Сначала зарегистрируйся командой /start"
                 )
                 return
 
             # Некорректное действие - предлагаем меню
-            await event.message.answer(
+            await self.answer(
+                event,
                 "⚠️ Команда не распознана.\n\n"
                 "Используй кнопки в меню или вернись в главное меню:"
             )
 
-            unread_count = db.get_unread_notifications_count(user_id)
-            buttons = get_main_menu_buttons(unread_count)
-            await event.message.answer(
+            unread_count = await adb.get_unread_notifications_count(user_id)
+            keyboard = get_main_menu_attachment(unread_count)
+            await self.answer(
+                event,
                 "📋 *Главное меню*\n\nВыбери действие:",
-                attachments=[buttons.pack()]
+                attachments=[keyboard],
+                lane=LANE_MENU
             )
-            db.set_user_state(user_id, UserState.MAIN_MENU.value)
+            await adb.set_user_state(user_id, UserState.MAIN_MENU.value)
 
     async def handle_name_input(self, event: MessageCreated, data: dict):
         """Обработка ввода имени"""
@@ -847,22 +1097,22 @@ class DatingBotHandlers:
         try:
             validate_name(name)
         except ValidationError as e:
-            await event.message.answer(f"❌ {str(e)}")
+            await self.answer(event, f"❌ {str(e)}")
             return
 
         # Если редактируем
         if data.get('editing'):
-            db.update_user(user_id, name=name)
-            await event.message.answer("✅ Имя обновлено!")
+            await adb.update_user(user_id, name=name)
+            await self.answer(event, "✅ Имя обновлено!")
             await self.send_main_menu(event)
-            db.clear_user_state(user_id)
+            await adb.clear_user_state(user_id)
             return
 
         # Если создаём
-        db.set_user_state(user_id, UserState.ENTER_AGE.value, {
+        await adb.set_user_state(user_id, UserState.ENTER_AGE.value, {
             'name': name
         })
-        await event.message.answer(MESSAGES['enter_age'])
+        await self.answer(event, MESSAGES['enter_age'])
 
     async def handle_age_input(self, event: MessageCreated, data: dict):
         """Обработка ввода возраста"""
@@ -872,26 +1122,27 @@ class DatingBotHandlers:
         try:
             age = validate_age(age_str)
         except ValidationError as e:
-            await event.message.answer(f"❌ {str(e)}")
+            await self.answer(event, f"❌ {str(e)}")
             return
 
         # Если редактируем
         if data.get('editing'):
-            db.update_user(user_id, age=age)
-            await event.message.answer("✅ Возраст обновлён!")
+            await adb.update_user(user_id, age=age)
+            await self.answer(event, "✅ Возраст обновлён!")
             await self.send_main_menu(event)
-            db.clear_user_state(user_id)
+            await adb.clear_user_state(user_id)
             return
 
         # Если создаём
-        db.set_user_state(user_id, UserState.ENTER_GENDER.value, {
+        await adb.set_user_state(user_id, UserState.ENTER_GENDER.value, {
             'name': data.get('name'),
             'age': age
         })
-        buttons = get_gender_buttons()
-        await event.message.answer(
+        keyboard = get_gender_attachment()
+        await self.answer(
+            event,
             "Выбери свой пол:",
-            attachments=[buttons.pack()]
+            attachments=[keyboard]
         )
 
     async def handle_bio_input(self, event: MessageCreated, data: dict):
@@ -902,29 +1153,30 @@ class DatingBotHandlers:
         try:
             validate_bio(bio)
         except ValidationError as e:
-            await event.message.answer(f"❌ {str(e)}")
+            await self.answer(event, f"❌ {str(e)}")
             return
 
         # Если редактируем
         if data.get('editing'):
-            db.update_user(user_id, bio=bio)
-            await event.message.answer("✅ Описание обновлено!")
+            await adb.update_user(user_id, bio=bio)
+            await self.answer(event, "✅ Описание обновлено!")
             await self.send_main_menu(event)
-            db.clear_user_state(user_id)
+            await adb.clear_user_state(user_id)
             return
 
         # Если создаём
-        db.set_user_state(user_id, UserState.CHOOSE_CATEGORIES.value, {
+        await adb.set_user_state(user_id, UserState.CHOOSE_CATEGORIES.value, {
             'name': data.get('name'),
             'age': data.get('age'),
             'gender': data.get('gender'),
             'bio': bio,
             'categories': []
         })
-        buttons = get_categories_buttons()
-        await event.message.answer(
+        keyboard = get_categories_attachment()
+        await self.answer(
+            event,
             "Выбери категории (можешь несколько):",
-            attachments=[buttons.pack()]
+            attachments=[keyboard]
         )
 
     async def handle_category_choice(self, event: MessageCreated, data: dict):
@@ -941,32 +1193,37 @@ class DatingBotHandlers:
                 categories.append(category)
                 data['categories'] = categories
 
-                db.set_user_state(user_id, UserState.CHOOSE_CATEGORIES.value, data)
-                await event.message.answer(f"✅ {CATEGORIES[category]} выбрана!")
+                await adb.set_user_state(user_id, UserState.CHOOSE_CATEGORIES.value, data)
+                await self.answer(event, f"✅ {CATEGORIES[category]} выбрана!")
 
-                buttons = get_categories_buttons()
-                await event.message.answer(
+                keyboard = get_categories_attachment()
+                await self.answer(
+                    event,
                     "Выбери ещё категории или заверши выбор:",
-                    attachments=[buttons.pack()]
+                    attachments=[keyboard]
                 )
             else:
-                await event.message.answer(
+                await self.answer(
+                    event,
                     f"⚠️ {CATEGORIES[category]} уже выбрана!\n\n"
                     f"Выбери другую или завершись выбор:"
                 )
-                buttons = get_categories_buttons()
-                await event.message.answer(
+                keyboard = get_categories_attachment()
+                await self.answer(
+                    event,
                     "Выбери действие:",
-                    attachments=[buttons.pack()]
+                    attachments=[keyboard]
                 )
         else:
-            await event.message.answer(
+            await self.answer(
+                event,
                 "⚠️ Пожалуйста, выбери категорию из списка кнопок ниже!"
             )
-            buttons = get_categories_buttons()
-            await event.message.answer(
+            keyboard = get_categories_attachment()
+            await self.answer(
+                event,
                 "Выбери категории:",
-                attachments=[buttons.pack()]
+                attachments=[keyboard]
             )
 
     async def handle_chat_message(self, event: MessageCreated, data: dict):
@@ -976,25 +1233,28 @@ class DatingBotHandlers:
         text = event.message.body.text
 
         if not match_id:
-            await event.message.answer("⚠️ Ошибка чата")
+            await self.answer(event, "⚠️ Ошибка чата")
             return
 
         # Проверяем, что чат не заблокирован
-        if db.is_chat_blocked(user_id, match_id):
-            await event.message.answer(
+        if await adb.is_chat_blocked(user_id, match_id):
+            await self.answer(
+                event,
                 "⛔ Чат с этим пользователем был прерван и больше невозможен."
             )
-            db.clear_user_state(user_id)
+            await adb.clear_user_state(user_id)
             await self.send_main_menu(event)
             return
 
         # Сохраняем сообщение
-        db.save_message(user_id, match_id, text)
+        await adb.save_message(user_id, match_id, text)
 
-        match_user = db.get_user(match_id)
-        await event.message.answer(
+        match_user = await adb.get_user(match_id)
+        await self.answer(
+            event,
             f"💬 Сообщение отправлено для {match_user['name']}!\n\n" +
-            get_chat_keyboard(match_id)
+            get_chat_keyboard(match_id),
+            lane=LANE_CHAT
         )
 
     # ===== ВСПОМОГАТЕЛЬНЫЕ МЕТОДЫ =====
@@ -1004,35 +1264,38 @@ class DatingBotHandlers:
         user_id = str(event.message.recipient.user_id)
 
         if not category or category not in CATEGORIES:
-            buttons = get_browse_category_buttons()
-            await event.message.answer(
+            keyboard = get_browse_category_attachment()
+            await self.answer(
+                event,
                 "Выбери категорию:",
-                attachments=[buttons.pack()]
+                attachments=[keyboard]
             )
             return
 
-        profile = db.get_profile_for_user(user_id, category)
+        profile = await adb.get_profile_for_user(user_id, category)
 
         if not profile:
-            await event.message.answer(MESSAGES['no_profiles'])
-            buttons = get_browse_category_buttons()
-            await event.message.answer(
+            await self.answer(event, MESSAGES['no_profiles'])
+            keyboard = get_browse_category_attachment()
+            await self.answer(
+                event,
                 "Выбери другую категорию:",
-                attachments=[buttons.pack()]
+                attachments=[keyboard]
             )
-            db.set_user_state(user_id, UserState.CHOOSE_CATEGORY.value)
+            await adb.set_user_state(user_id, UserState.CHOOSE_CATEGORY.value)
             return
 
-        db.set_user_state(user_id, UserState.VIEWING_PROFILE.value, {
+        await adb.set_user_state(user_id, UserState.VIEWING_PROFILE.value, {
             'current_profile': profile,
             'category': category
         })
 
-        card = format_profile_card(profile)
-        await event.message.answer(card)
+        card = render_profile_card(profile)
+        await self.answer(event, card)
 
-        buttons = get_profile_view_buttons()
-        await event.message.answer(
+        keyboard = get_profile_view_attachment()
+        await self.answer(
+            event,
             "Выбери действие:",
-            attachments=[buttons.pack()]
+            attachments=[keyboard]
         )
@@ -0,0 +1,297 @@
+"""
+Фоновые задачи обслуживания в процессе бота (очистка, распад рейтинга, кэши)
+
+JobScheduler запускает задачи по интервалу ("каждые N секунд") или по расписанию
+в формате cron ("30 4 * * *": минута, час, день месяца, месяц, день недели). К
+каждому запуску добавляется случайная задержка до jitter секунд, чтобы задачи
+разных процессов не били в базу одновременно. Сама задача - обычная функция,
+она выполняется в потоке (asyncio.to_thread) и не держит цикл событий.
+
+В многопроцессном режиме планировщик есть в каждом воркере, поэтому задачи над
+общей базой (exclusive=True) берут advisory lock PostgreSQL на время запуска:
+если блокировку уже держит другой процесс, запуск пропускается. Блокировка
+защищает только от одновременных запусков, поэтому у каждого запуска есть слот
+расписания (время срабатывания cron или номер интервала от начала эпохи, общий
+для всех процессов). Выполненный слот записывается в job_state, и процесс,
+получивший блокировку позже, видит, что слот уже отработан, и пропускает его.
+Работа с базой идёт небольшими пачками, каждая в своей транзакции, чтобы не мешать
+обработке обновлений.
+
+Метрики: dating_bot_job_runs_total{job,result} (ok, error, skipped),
+dating_bot_job_duration_seconds{job}, dating_bot_job_items_total{job} (сколько
+строк или записей обработала задача) и dating_bot_job_last_success_timestamp_seconds{job}.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Set, Tuple
+
+import psycopg2
+
+from config import (
+    DATABASE_URL, JOBS_ENABLED, JOB_JITTER, DB_CACHE_TTL, MAINTENANCE_BATCH,
+    NOTIFICATIONS_TTL_DAYS, NOTIFICATIONS_CLEANUP_INTERVAL, RATING_DECAY_CRON,
+    USER_STATE_TTL_DAYS, USER_STATES_CLEANUP_INTERVAL,
+)
+from database import db
+from metrics import REGISTRY, Counter, Gauge, Histogram
+from rating import decay_ratings
+
+logger = logging.getLogger(__name__)
+
+JOB_RUNS = REGISTRY.register(Counter(
+    'dating_bot_job_runs_total', 'Запуски фоновых задач по результату', ('job', 'result')))
+JOB_DURATION = REGISTRY.register(Histogram(
+    'dating_bot_job_duration_seconds', 'Длительность фоновых задач', ('job',),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)))
+JOB_ITEMS = REGISTRY.register(Counter(
+    'dating_bot_job_items_total', 'Строки и записи, обработанные фоновыми задачами', ('job',)))
+JOB_LAST_SUCCESS = REGISTRY.register(Gauge(
+    'dating_bot_job_last_success_timestamp_seconds', 'Время последнего успешного запуска задачи', ('job',)))
+
+# Первый ключ advisory lock задач (второй - crc32 имени задачи)
+JOB_LOCK_CLASS = 0x6a6f62
+
+# Префикс ключа задачи в job_state (там же водяной знак cf_job.py)
+JOB_STATE_PREFIX = 'jobs.'
+
+
+class CronSchedule:
+    """Расписание cron из пяти полей: минута, час, день месяца, месяц, день недели"""
+
+    # Допустимые значения полей
+    RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Расписание cron должно состоять из 5 полей: {expression!r}")
+        self.expression = expression
+        minutes, hours, days, months, weekdays = (
+            self._parse(field, low, high) for field, (low, high) in zip(fields, self.RANGES))
+        self.minutes, self.hours, self.days, self.months = minutes, hours, days, months
+        # 0 и 7 - воскресенье; в datetime.weekday() понедельник - 0
+        self.weekdays = {(day - 1) % 7 for day in weekdays}
+        # Как в cron: если заданы и день месяца, и день недели, подходит любой из них
+        self.either_day = not fields[2].startswith('*') and not fields[4].startswith('*')
+
+    @staticmethod
+    def _parse(field: str, low: int, high: int) -> Set[int]:
+        values = set()
+        for part in field.split(','):
+            value_range, _, step = part.partition('/')
+            if value_range == '*':
+                start, end = low, high
+            elif '-' in value_range:
+                start, end = (int(value) for value in value_range.split('-', 1))
+            else:
+                start = end = int(value_range)
+            step = int(step) if step else 1
+            if not low <= start <= end <= high or step < 1:
+                raise ValueError(f"Недопустимое поле cron: {field!r}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day = moment.day in self.days
+        weekday = moment.weekday() in self.weekdays
+        return (day or weekday) if self.either_day else (day and weekday)
+
+    def next_after(self, moment: datetime) -> datetime:
+        """Ближайшее время запуска строго после moment"""
+        current = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Расписание вроде "0 0 29 2 *" срабатывает раз в четыре года
+        limit = current + timedelta(days=366 * 4 + 1)
+        while current < limit:
+            if current.month not in self.months:
+                current = (current.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(current):
+                current = current.replace(hour=0, minute=0) + timedelta(days=1)
+            elif current.hour not in self.hours:
+                current = current.replace(minute=0) + timedelta(hours=1)
+            elif current.minute not in self.minutes:
+                current += timedelta(minutes=1)
+            else:
+                return current
+        raise ValueError(f"Расписание cron никогда не срабатывает: {self.expression!r}")
+
+
+class Job:
+    """Фоновая задача: функция, расписание и нужна ли блокировка между процессами"""
+
+    def __init__(self, name: str, func: Callable[[], Optional[int]], interval: float = 0.0,
+                 cron: Optional[str] = None, jitter: float = JOB_JITTER, exclusive: bool = True):
+        if not interval and not cron:
+            raise ValueError(f"У задачи {name} нет ни интервала, ни расписания")
+        self.name = name
+        # Возвращает число обработанных строк/записей (или None)
+        self.func = func
+        self.interval = interval
+        self.cron = CronSchedule(cron) if cron else None
+        self.jitter = jitter
+        self.exclusive = exclusive
+        crc = zlib.crc32(name.encode())
+        # Ключи pg_try_advisory_lock(int4, int4) знаковые
+        self.lock_key = crc - 2 ** 32 if crc >= 2 ** 31 else crc
+
+    def next_slot(self, now: float) -> Tuple[str, float]:
+        """Следующий слот расписания после now: (ключ слота, время срабатывания)
+
+        Слоты одинаковы во всех процессах: у cron - время срабатывания, у интервальной
+        задачи - номер интервала от начала эпохи.
+        """
+        if self.cron:
+            moment = self.cron.next_after(datetime.fromtimestamp(now))
+            return moment.isoformat(timespec='minutes'), moment.timestamp()
+        number = math.floor(now / self.interval) + 1
+        return str(number), number * self.interval
+
+
+class JobScheduler:
+    """Запуск фоновых задач по расписанию в цикле событий процесса"""
+
+    def __init__(self, database_url: str = DATABASE_URL):
+        self.database_url = database_url
+        self.jobs: List[Job] = []
+        self._tasks: List[asyncio.Task] = []
+
+    def add_interval(self, name: str, func: Callable[[], Optional[int]], seconds: float, **kwargs) -> Job:
+        """Запускать func каждые seconds секунд"""
+        return self.add(Job(name, func, interval=seconds, **kwargs))
+
+    def add_cron(self, name: str, func: Callable[[], Optional[int]], expression: str, **kwargs) -> Job:
+        """Запускать func по расписанию cron (время локальное)"""
+        return self.add(Job(name, func, cron=expression, **kwargs))
+
+    def add(self, job: Job) -> Job:
+        self.jobs.append(job)
+        return job
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._loop(job), name=f'job-{job.name}') for job in self.jobs]
+        names = ', '.join(job.name for job in self.jobs)
+        logger.info(f"🗓️ Фоновые задачи: {names or 'нет'}")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _loop(self, job: Job):
+        while True:
+            slot, run_at = job.next_slot(time.time())
+            await asyncio.sleep(max(run_at - time.time(), 0) + random.uniform(0, job.jitter))
+            await self.run(job, slot)
+
+    async def run(self, job: Job, slot: Optional[str] = None) -> str:
+        """Выполнить задачу один раз; вернуть результат: ok, error или skipped
+
+        slot - слот расписания: если его уже выполнил другой процесс, запуск пропускается
+        (None - запуск вне расписания, без проверки)
+        """
+        started = time.perf_counter()
+        try:
+            ran, items = await asyncio.to_thread(self._run_sync, job, slot)
+        except Exception as e:
+            logger.error(f"❌ Ошибка фоновой задачи {job.name}: {e}", exc_info=True)
+            result = 'error'
+        else:
+            result = 'ok' if ran else 'skipped'
+            if ran:
+                JOB_LAST_SUCCESS.set(time.time(), job.name)
+                if items:
+                    JOB_ITEMS.inc(job.name, amount=items)
+                    logger.info(f"🧹 {job.name}: обработано {items} за {time.perf_counter() - started:.2f} с")
+        JOB_RUNS.inc(job.name, result)
+        if result != 'skipped':
+            JOB_DURATION.observe(time.perf_counter() - started, job.name)
+        return result
+
+    def _run_sync(self, job: Job, slot: Optional[str]):
+        """(выполнена ли задача, сколько обработано); без блокировки или в уже
+        выполненном слоте - не выполнена"""
+        if not job.exclusive:
+            return True, job.func()
+
+        # Блокировка сессионная: держится, пока открыто подключение, и снимается
+        # сама, если процесс упадёт посреди задачи
+        conn = psycopg2.connect(self.database_url)
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT pg_try_advisory_lock(%s, %s)', (JOB_LOCK_CLASS, job.lock_key))
+                if not cursor.fetchone()[0]:
+                    return False, None
+                if slot is not None:
+                    cursor.execute("SELECT state->>'slot' FROM job_state WHERE job = %s",
+                                   (JOB_STATE_PREFIX + job.name,))
+                    row = cursor.fetchone()
+                    if row and row[0] == slot:
+                        return False, None
+
+            items = job.func()
+
+            # Слот отмечается выполненным только после успеха: упавший запуск
+            # повторит процесс, который возьмёт блокировку следующим
+            if slot is not None:
+                with conn.cursor() as cursor:
+                    cursor.execute('''
+                        INSERT INTO job_state (job, state) VALUES (%s, %s)
+                        ON CONFLICT (job) DO UPDATE SET state = EXCLUDED.state, updated_at = NOW()
+                    ''', (JOB_STATE_PREFIX + job.name, json.dumps({'slot': slot})))
+            return True, items
+        finally:
+            conn.close()
+
+
+def run_batches(step: Callable[[int], int], batch_size: int = MAINTENANCE_BATCH) -> int:
+    """Вызывать step(batch_size), пока он обрабатывает полную пачку; вернуть сумму"""
+    total = 0
+    while True:
+        done = step(batch_size)
+        total += done
+        if done < batch_size:
+            return total
+
+
+def cleanup_notifications() -> int:
+    """Удалить прочитанные уведомления старше NOTIFICATIONS_TTL_DAYS"""
+    return run_batches(lambda limit: db.delete_old_notifications(NOTIFICATIONS_TTL_DAYS, limit))
+
+
+def cleanup_user_states() -> int:
+    """Удалить состояния FSM старше USER_STATE_TTL_DAYS, пачками по первичному ключу"""
+    total = 0
+    last_user_id = ''
+    while last_user_id is not None:
+        deleted, last_user_id = db.delete_expired_user_states(last_user_id, MAINTENANCE_BATCH)
+        total += deleted
+    return total
+
+
+def purge_caches() -> int:
+    """Выбросить из кэшей процесса записи с истёкшим сроком"""
+    return db.user_cache.purge_expired() + db.state_cache.purge_expired()
+
+
+def build_scheduler(database_url: str = DATABASE_URL) -> Optional[JobScheduler]:
+    """Планировщик со стандартными задачами обслуживания (None, если выключен)"""
+    if not JOBS_ENABLED:
+        return None
+    scheduler = JobScheduler(database_url)
+    if NOTIFICATIONS_CLEANUP_INTERVAL:
+        scheduler.add_interval('cleanup_notifications', cleanup_notifications, NOTIFICATIONS_CLEANUP_INTERVAL)
+    if USER_STATE_TTL_DAYS and USER_STATES_CLEANUP_INTERVAL:
+        scheduler.add_interval('cleanup_user_states', cleanup_user_states, USER_STATES_CLEANUP_INTERVAL)
+    if RATING_DECAY_CRON:
+        scheduler.add_cron('rating_decay', lambda: decay_ratings(database_url), RATING_DECAY_CRON)
+    # Кэши свои у каждого процесса, блокировка не нужна
+    scheduler.add_interval('purge_caches', purge_caches, DB_CACHE_TTL, exclusive=False)
+    return scheduler
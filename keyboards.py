@@ -2,10 +2,12 @@
 Клавиатуры (кнопки) для бота
 """
 
+from functools import lru_cache
 from config import CATEGORIES, INLINE_BUTTONS
-from typing import List
+from typing import List, Optional, Tuple
 from maxapi.types import ButtonsPayload
-from maxapi.types.attachments.buttons import CallbackButton
+from maxapi.types.attachments.attachment import Attachment
+from maxapi.types.attachments.buttons import CallbackButton, RequestGeoLocationButton
 
 def get_main_menu_keyboard(unread_count: int = 0) -> str:
     """Главное меню"""
@@ -85,7 +87,8 @@ def get_edit_profile_keyboard() -> str:
 3️⃣ `/edit_gender` - Пол
 4️⃣ `/edit_bio` - Описание
 5️⃣ `/edit_categories` - Категории
-6️⃣ `/menu` - Вернуться в меню
+6️⃣ `/prefs` - Кого ищу
+7️⃣ `/menu` - Вернуться в меню
 """
 
 def get_profile_info_keyboard(user_id: str) -> str:
@@ -119,7 +122,10 @@ def get_chat_keyboard(match_id: str) -> str:
 
 
 # ===== INLINE КНОПКИ =====
+# Клавиатуры без параметров (и главное меню по числу непрочитанных) собираются
+# один раз и переиспользуются: pack() не меняет ButtonsPayload.
 
+@lru_cache(maxsize=128)
 def get_main_menu_buttons(unread_count: int = 0) -> ButtonsPayload:
     """Inline кнопки главного меню"""
     notification_badge = f" ({unread_count})" if unread_count > 0 else ""
@@ -139,6 +145,7 @@ def get_main_menu_buttons(unread_count: int = 0) -> ButtonsPayload:
     ])
 
 
+@lru_cache(maxsize=None)
 def get_gender_buttons() -> ButtonsPayload:
     """Inline кнопки выбора пола"""
     return ButtonsPayload(buttons=[
@@ -149,6 +156,7 @@ def get_gender_buttons() -> ButtonsPayload:
     ])
 
 
+@lru_cache(maxsize=None)
 def get_categories_buttons() -> ButtonsPayload:
     """Inline кнопки выбора категорий"""
     buttons = []
@@ -170,6 +178,7 @@ def get_categories_buttons() -> ButtonsPayload:
     return ButtonsPayload(buttons=buttons)
 
 
+@lru_cache(maxsize=None)
 def get_profile_view_buttons() -> ButtonsPayload:
     """Inline кнопки для просмотра профиля"""
     return ButtonsPayload(buttons=[
@@ -186,9 +195,21 @@ def get_profile_view_buttons() -> ButtonsPayload:
 
 def get_browse_category_buttons(user=None) -> ButtonsPayload:
     """Inline кнопки выбора категории для просмотра"""
+    return _browse_category_buttons(_user_categories_key(user))
+
+
+def _user_categories_key(user) -> Optional[Tuple[str, ...]]:
+    """Ключ кэша клавиатуры категорий: набор категорий пользователя (None - все)"""
+    if user is None:
+        return None
+    return tuple(sorted(user.get('categories') or []))
+
+
+@lru_cache(maxsize=256)
+def _browse_category_buttons(categories: Optional[Tuple[str, ...]]) -> ButtonsPayload:
     buttons = []
     current_row = []
-    if user is None:
+    if categories is None:
         for i, (key, value) in enumerate(CATEGORIES.items(), 1):
             current_row.append(CallbackButton(text=f"{value}", payload=f"/{key}"))
             if i % 2 == 0:
@@ -202,7 +223,6 @@ def get_browse_category_buttons(user=None) -> ButtonsPayload:
 
         return ButtonsPayload(buttons=buttons)
     else:
-        categories = user.get('categories', [])
         categories_names = [CATEGORIES.get(cat, cat) for cat in categories]
 
         for i, (key, value) in enumerate(CATEGORIES.items(), 1):
@@ -220,6 +240,7 @@ def get_browse_category_buttons(user=None) -> ButtonsPayload:
         return ButtonsPayload(buttons=buttons)
 
 
+@lru_cache(maxsize=None)
 def get_edit_profile_buttons() -> ButtonsPayload:
     """Inline кнопки меню редактирования профиля"""
     return ButtonsPayload(buttons=[
@@ -233,11 +254,57 @@ def get_edit_profile_buttons() -> ButtonsPayload:
         ],
         [
             CallbackButton(text="🎯 Категории", payload="/edit_categories"),
+            CallbackButton(text="🔍 Кого ищу", payload="/prefs")
+        ],
+        [
             CallbackButton(text="🏠 В меню", payload="/menu")
         ]
     ])
 
 
+def get_search_preferences_buttons() -> ButtonsPayload:
+    """Кнопки настроек поиска"""
+    return ButtonsPayload(buttons=[
+        [
+            CallbackButton(text="🎂 Возраст", payload="/prefs_age"),
+            CallbackButton(text="♾️ Любой возраст", payload="/prefs_age_any")
+        ],
+        [
+            CallbackButton(text="👨 Мужчин", payload="/prefs_gender_male"),
+            CallbackButton(text="👩 Женщин", payload="/prefs_gender_female"),
+            CallbackButton(text="👥 Всех", payload="/prefs_gender_any")
+        ],
+        [
+            CallbackButton(text="📍 Геолокация", payload="/location"),
+            CallbackButton(text="🏠 В меню", payload="/menu")
+        ]
+    ])
+
+
+def get_location_buttons() -> ButtonsPayload:
+    """Кнопки геолокации"""
+    return ButtonsPayload(buttons=[
+        [
+            RequestGeoLocationButton(text="📍 Отправить геолокацию")
+        ],
+        [
+            CallbackButton(text="🗑 Удалить геолокацию", payload="/location_off"),
+            CallbackButton(text="🏠 В меню", payload="/menu")
+        ]
+    ])
+
+
+def get_search_results_buttons(query: str, next_page: Optional[int],
+                               after: Optional[Tuple[float, str]] = None) -> ButtonsPayload:
+    """Кнопки под результатами поиска (after - курсор следующей страницы)"""
+    row = []
+    if next_page is not None and after is not None:
+        rank, after_id = after
+        row.append(CallbackButton(text="➡️ Дальше", payload=f"/search_page {next_page} {rank!r}:{after_id} {query}"))
+    row.append(CallbackButton(text="🏠 В меню", payload="/menu"))
+    return ButtonsPayload(buttons=[row])
+
+
 def get_chat_buttons(match_id: str) -> ButtonsPayload:
     """Inline кнопки в чате"""
     return ButtonsPayload(buttons=[
@@ -248,6 +315,7 @@ def get_chat_buttons(match_id: str) -> ButtonsPayload:
     ])
 
 
+@lru_cache(maxsize=None)
 def get_profile_action_buttons() -> ButtonsPayload:
     """Inline кнопки для действий с профилем"""
     return ButtonsPayload(buttons=[
@@ -258,6 +326,7 @@ def get_profile_action_buttons() -> ButtonsPayload:
     ])
 
 
+@lru_cache(maxsize=None)
 def get_back_to_menu_button() -> ButtonsPayload:
     """Inline кнопка для возврата в меню"""
     return ButtonsPayload(buttons=[
@@ -267,6 +336,93 @@ def get_back_to_menu_button() -> ButtonsPayload:
     ])
 
 
+# ===== ГОТОВЫЕ ВЛОЖЕНИЯ =====
+# То, что уходит в attachments: клавиатура, уже упакованная pack(). Ключ кэша -
+# всё, от чего клавиатура зависит, поэтому при отрисовке меню объекты не создаются.
+
+@lru_cache(maxsize=128)
+def get_main_menu_attachment(unread_count: int = 0) -> Attachment:
+    """Вложение с кнопками главного меню"""
+    return get_main_menu_buttons(unread_count).pack()
+
+
+@lru_cache(maxsize=None)
+def get_gender_attachment() -> Attachment:
+    """Вложение с кнопками выбора пола"""
+    return get_gender_buttons().pack()
+
+
+@lru_cache(maxsize=None)
+def get_categories_attachment() -> Attachment:
+    """Вложение с кнопками выбора категорий"""
+    return get_categories_buttons().pack()
+
+
+@lru_cache(maxsize=None)
+def get_profile_view_attachment() -> Attachment:
+    """Вложение с кнопками просмотра анкеты"""
+    return get_profile_view_buttons().pack()
+
+
+@lru_cache(maxsize=None)
+def get_edit_profile_attachment() -> Attachment:
+    """Вложение с кнопками меню редактирования"""
+    return get_edit_profile_buttons().pack()
+
+
+@lru_cache(maxsize=None)
+def get_search_preferences_attachment() -> Attachment:
+    """Вложение с кнопками настроек поиска"""
+    return get_search_preferences_buttons().pack()
+
+
+@lru_cache(maxsize=None)
+def get_location_attachment() -> Attachment:
+    """Вложение с кнопками геолокации"""
+    return get_location_buttons().pack()
+
+
+@lru_cache(maxsize=None)
+def get_profile_action_attachment() -> Attachment:
+    """Вложение с кнопками действий с профилем"""
+    return get_profile_action_buttons().pack()
+
+
+@lru_cache(maxsize=None)
+def get_back_to_menu_attachment() -> Attachment:
+    """Вложение с кнопкой возврата в меню"""
+    return get_back_to_menu_button().pack()
+
+
+def get_search_results_attachment(query: str, next_page: Optional[int],
+                                  after: Optional[Tuple[float, str]] = None) -> Attachment:
+    """Вложение с кнопками под результатами поиска (зависит от запроса, не кэшируется)"""
+    return get_search_results_buttons(query, next_page, after).pack()
+
+
+def get_browse_category_attachment(user=None) -> Attachment:
+    """Вложение с кнопками выбора категории (только категории пользователя, если он передан)"""
+    return _browse_category_attachment(_user_categories_key(user))
+
+
+@lru_cache(maxsize=256)
+def _browse_category_attachment(categories: Optional[Tuple[str, ...]]) -> Attachment:
+    return _browse_category_buttons(categories).pack()
+
+
+def preload_keyboards() -> int:
+    """Собрать статические клавиатуры и вложения заранее (прогрев перед стартом)"""
+    builders = [get_gender_attachment, get_categories_attachment, get_profile_view_attachment,
+                get_edit_profile_attachment, get_search_preferences_attachment, get_location_attachment,
+                get_profile_action_attachment, get_back_to_menu_attachment]
+    for builder in builders:
+        builder()
+    get_browse_category_attachment()
+    for unread_count in range(10):
+        get_main_menu_attachment(unread_count)
+    return len(builders) + 11
+
+
 def get_invalid_action_message() -> str:
     """Сообщение при неверном действии"""
     return """
@@ -6,13 +6,22 @@ import asyncio
 import logging
 import sys
 from pathlib import Path
+from typing import Awaitable, Callable
 
 # Добавляем текущую директорию в path
 sys.path.insert(0, str(Path(__file__).parent))
 
-from maxapi import Bot, Dispatcher
-from config import BOT_TOKEN
-from handlers import DatingBotHandlers
+from maxapi import Bot
+from config import (
+    BOT_TOKEN, DATABASE_URL, RECORD_UPDATES_PATH, RECORD_UPDATES_SALT, METRICS_HOST, METRICS_PORT,
+    UPDATES_MODE, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_URL, WEBHOOK_SECRET, WEBHOOK_QUEUE_SIZE,
+    WEBHOOK_WORKERS, BOT_WORKERS, WORKER_QUEUE_SIZE, WORKER_HEARTBEAT_TIMEOUT,
+)
+from bot_app import BotApp
+from migrations import check_schema
+from metrics import set_ready, start_metrics_server
+from supervisor import Supervisor
+from webhook_server import WebhookServer
 
 # Настройка логирования
 logging.basicConfig(
@@ -22,6 +31,78 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+async def run_webhook(bot: Bot, handle_update: Callable[[dict], Awaitable[None]]):
+    """Принимать обновления через вебхук вместо long polling"""
+    server = WebhookServer(handle_update, WEBHOOK_SECRET, WEBHOOK_PATH, WEBHOOK_QUEUE_SIZE, WEBHOOK_WORKERS)
+    await server.start(WEBHOOK_HOST, WEBHOOK_PORT)
+    if WEBHOOK_URL:
+        await bot.subscribe_webhook(WEBHOOK_URL, secret=WEBHOOK_SECRET or None)
+        logger.info(f"🪝 Бот подписан на вебхук {WEBHOOK_URL}")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+async def poll_raw_updates(bot: Bot, handle_update: Callable[[dict], Awaitable[None]]):
+    """Long polling без разбора обновлений: сырой JSON уходит в handle_update"""
+    while True:
+        try:
+            events = await bot.get_updates(marker=bot.marker_updates)
+        except asyncio.TimeoutError:
+            continue
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка получения обновлений: {e!r}, повтор через 5 с")
+            await asyncio.sleep(5)
+            continue
+        for update in events.get('updates') or []:
+            await handle_update(update)
+        bot.marker_updates = events.get('marker')
+
+
+async def run_supervisor():
+    """Многопроцессный режим: обновления раскладываются по BOT_WORKERS воркерам"""
+    if RECORD_UPDATES_PATH:
+        logger.warning("⚠️ Запись обновлений в многопроцессном режиме не поддерживается, RECORD_UPDATES_PATH игнорируется")
+
+    bot = Bot(BOT_TOKEN)
+    supervisor = Supervisor(BOT_WORKERS, WORKER_QUEUE_SIZE, WORKER_HEARTBEAT_TIMEOUT)
+    supervisor.start()
+
+    metrics_server = None
+    if METRICS_PORT:
+        metrics_server = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+
+    logger.info(f"👂 Супервизор слушает входящие сообщения ({BOT_WORKERS} воркеров)...")
+    try:
+        if UPDATES_MODE == 'webhook':
+            await run_webhook(bot, supervisor.route)
+        else:
+            await poll_raw_updates(bot, supervisor.route)
+    finally:
+        set_ready(False)
+        await supervisor.stop()
+        if metrics_server:
+            metrics_server.close()
+
+
+async def run_single_process():
+    """Один процесс: long polling через Dispatcher или вебхук"""
+    app = BotApp(metrics_port=METRICS_PORT, record_path=RECORD_UPDATES_PATH)
+    try:
+        await app.start(polling=UPDATES_MODE != 'webhook')
+
+        # Запускаем long polling или вебхук
+        logger.info("👂 Бот слушает входящие сообщения...")
+        if UPDATES_MODE == 'webhook':
+            await run_webhook(app.bot, app.handle_payload)
+        else:
+            await app.dp.start_polling(app.bot)
+    finally:
+        await app.stop()
+
+
 async def main():
     """Главная функция для запуска бота"""
 
@@ -32,20 +113,36 @@ async def main():
         print("2. Или установи переменную окружения: export BOT_TOKEN='твой_токен'")
         return
 
-    logger.info("🚀 Запуск бота для знакомств...")
+    # Без секрета кто угодно, кто достучится до порта, присылал бы обновления от
+    # имени любого пользователя, в том числе администратора
+    if UPDATES_MODE == 'webhook' and not WEBHOOK_SECRET:
+        logger.error("❌ Режим вебхука требует WEBHOOK_SECRET - задай секрет и укажи его при подписке")
+        return
 
-    # Инициализируем бота
-    bot = Bot(BOT_TOKEN)
-    dp = Dispatcher()
+    # Псевдонимы в записи - HMAC от user_id: с пустой или общеизвестной солью
+    # числовые id восстанавливаются перебором, и запись перестаёт быть анонимной
+    if RECORD_UPDATES_PATH and RECORD_UPDATES_SALT in ('', 'change-me'):
+        logger.error("❌ Запись обновлений требует RECORD_UPDATES_SALT - задай длинную случайную соль")
+        return
+
+    logger.info("🚀 Запуск бота для знакомств...")
 
-    # Регистрируем обработчики
-    handlers = DatingBotHandlers(dp, bot)
-    logger.info("✅ Обработчики зарегистрированы")
+    # Схему бот не трогает: только сверяем версию (миграции - python migrate.py)
+    try:
+        pending = check_schema(DATABASE_URL)
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось проверить версию схемы БД: {e}")
+    else:
+        if pending:
+            versions = ', '.join(str(migration.version) for migration in pending)
+            logger.error(f"❌ Схема БД устарела, не применены миграции: {versions}. Запусти python migrate.py")
+            return
 
-    # Запускаем long polling
-    logger.info("👂 Бот слушает входящие сообщения...")
     try:
-        await dp.start_polling(bot)
+        if BOT_WORKERS > 1:
+            await run_supervisor()
+        else:
+            await run_single_process()
     except KeyboardInterrupt:
         logger.info("❌ Бот остановлен пользователем")
     except Exception as e:
@@ -0,0 +1,317 @@
+"""
+Метрики процесса бота в формате Prometheus
+
+Минимальная реализация счётчиков, gauge и гистограмм без внешних зависимостей
+и HTTP-эндпоинт /metrics на asyncio. Статистика запросов к БД берётся из
+db_instrumentation, исходящие вызовы MAX API считаются обёрткой над Bot.
+"""
+
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from db_instrumentation import connection_stats, query_instrumentation
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм задержек, секунды
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    """Монотонный счётчик с метками"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def get(self, *labels) -> float:
+        return self.values.get(labels, 0)
+
+    def collect(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        # Снимок: метки добавляются и из потоков вызовов Database (db_async.py)
+        for labels, value in list(self.values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+
+class Gauge(Counter):
+    """Значение, которое может расти и уменьшаться"""
+
+    kind = 'gauge'
+
+    def set(self, value: float, *labels):
+        self.values[labels] = value
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram:
+    """Гистограмма с кумулятивными корзинами (как в Prometheus)"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # метки -> [счётчики корзин (+Inf последней), сумма, количество]
+        self.values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def collect(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total, count) in list(self.values.items()):
+            lines.extend(histogram_lines(self.name, self.labelnames, labels, self.buckets, counts, total, count))
+        return lines
+
+
+def histogram_lines(name: str, labelnames: Tuple[str, ...], labels: Tuple, bounds: Iterable[float],
+                    counts: List[int], total: float, count: int) -> List[str]:
+    """Строки одной серии гистограммы из некумулятивных счётчиков корзин"""
+    lines = []
+    cumulative = 0
+    for bound, bucket_count in zip(list(bounds) + [float('inf')], counts):
+        cumulative += bucket_count
+        le = f'le="{_format_value(bound)}"'
+        lines.append(f'{name}_bucket{_format_labels(labelnames, labels, le)} {cumulative}')
+    lines.append(f'{name}_sum{_format_labels(labelnames, labels)} {total!r}')
+    lines.append(f'{name}_count{_format_labels(labelnames, labels)} {count}')
+    return lines
+
+
+class Registry:
+    """Набор метрик и функций-коллекторов, отдаваемых на /metrics"""
+
+    def __init__(self):
+        self.metrics: List = []
+        self.collectors: List[Callable[[], List[str]]] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], List[str]]):
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.collect())
+        for collector in self.collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                logger.warning(f"⚠️ Ошибка коллектора метрик: {e}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# ===== Обновления и обработчики =====
+
+UPDATES_TOTAL = REGISTRY.register(Counter(
+    'dating_bot_updates_total', 'Обработанные обновления по командам', ('command',)))
+UPDATE_ERRORS_TOTAL = REGISTRY.register(Counter(
+    'dating_bot_update_errors_total', 'Обновления, завершившиеся исключением', ('command',)))
+HANDLER_DURATION = REGISTRY.register(Histogram(
+    'dating_bot_handler_duration_seconds', 'Время обработки обновления', ('command',)))
+UPDATES_IN_FLIGHT = REGISTRY.register(Gauge(
+    'dating_bot_updates_in_flight', 'Обновления, обрабатываемые прямо сейчас'))
+READY = REGISTRY.register(Gauge(
+    'dating_bot_ready', 'Процесс прогрет и принимает обновления (1/0)'))
+READY.set(0)
+
+# ===== Кэши =====
+
+CACHE_REQUESTS_TOTAL = REGISTRY.register(Counter(
+    'dating_bot_cache_requests_total', 'Обращения к кэшам (result: hit/miss)', ('cache', 'result')))
+
+# ===== Исходящие вызовы MAX API =====
+
+API_CALLS_TOTAL = REGISTRY.register(Counter(
+    'dating_bot_api_calls_total', 'Исходящие вызовы MAX API', ('method',)))
+API_ERRORS_TOTAL = REGISTRY.register(Counter(
+    'dating_bot_api_errors_total', 'Исходящие вызовы MAX API, завершившиеся ошибкой', ('method',)))
+API_CALL_DURATION = REGISTRY.register(Histogram(
+    'dating_bot_api_call_duration_seconds', 'Время исходящего вызова MAX API', ('method',)))
+
+PROCESS_START_TIME = time.time()
+
+
+@contextmanager
+def track_update(command: str):
+    """Учесть обработку одного обновления: счётчик, in-flight, задержка, ошибки"""
+    UPDATES_TOTAL.inc(command)
+    UPDATES_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        UPDATE_ERRORS_TOTAL.inc(command)
+        raise
+    finally:
+        HANDLER_DURATION.observe(time.perf_counter() - started, command)
+        UPDATES_IN_FLIGHT.dec()
+
+
+def set_ready(ready: bool):
+    """Отметить готовность процесса (GET /ready отвечает 200 только после прогрева)"""
+    READY.set(1 if ready else 0)
+
+
+def observe_cache(cache: str, hit: bool):
+    """Учесть попадание или промах кэша"""
+    CACHE_REQUESTS_TOTAL.inc(cache, 'hit' if hit else 'miss')
+
+
+def instrument_bot(bot, methods: Tuple[str, ...] = ('send_message', 'send_callback', 'edit_message')):
+    """Обернуть исходящие методы бота подсчётом вызовов, задержки, ошибок и span трассировки"""
+
+    def wrap(name: str, method):
+        async def wrapper(*args, **kwargs):
+            API_CALLS_TOTAL.inc(name)
+            started = time.perf_counter()
+            with tracer.span('max.' + name):
+                try:
+                    return await method(*args, **kwargs)
+                except Exception:
+                    API_ERRORS_TOTAL.inc(name)
+                    raise
+                finally:
+                    API_CALL_DURATION.observe(time.perf_counter() - started, name)
+        return wrapper
+
+    for name in methods:
+        method = getattr(bot, name, None)
+        if method is not None:
+            setattr(bot, name, wrap(name, method))
+    return bot
+
+
+# ===== Коллекторы =====
+
+def collect_database() -> List[str]:
+    """Статистика методов Database из db_instrumentation"""
+    lines = [
+        '# HELP dating_bot_db_calls_total Вызовы методов Database',
+        '# TYPE dating_bot_db_calls_total counter',
+    ]
+    methods = query_instrumentation.methods
+    for name, stats in methods.items():
+        lines.append(f'dating_bot_db_calls_total{{method="{name}"}} {stats.calls}')
+    lines += ['# HELP dating_bot_db_errors_total Ошибки в методах Database',
+              '# TYPE dating_bot_db_errors_total counter']
+    for name, stats in methods.items():
+        lines.append(f'dating_bot_db_errors_total{{method="{name}"}} {stats.errors}')
+    lines += ['# HELP dating_bot_db_rows_total Строки, возвращённые или изменённые методами Database',
+              '# TYPE dating_bot_db_rows_total counter']
+    for name, stats in methods.items():
+        lines.append(f'dating_bot_db_rows_total{{method="{name}"}} {stats.rows}')
+    lines += ['# HELP dating_bot_db_call_duration_seconds Время вызова метода Database',
+              '# TYPE dating_bot_db_call_duration_seconds histogram']
+    for name, stats in methods.items():
+        histogram = stats.histogram
+        lines.extend(histogram_lines(
+            'dating_bot_db_call_duration_seconds', ('method',), (name,),
+            [bound / 1000 for bound in histogram.bounds], histogram.counts,
+            histogram.sum_ms / 1000, histogram.count))
+
+    lines += [
+        '# HELP dating_bot_db_connections_opened_total Открытые подключения к PostgreSQL',
+        '# TYPE dating_bot_db_connections_opened_total counter',
+        f"dating_bot_db_connections_opened_total {connection_stats['opened']}",
+        '# HELP dating_bot_db_connections_open Подключения к PostgreSQL, открытые сейчас',
+        '# TYPE dating_bot_db_connections_open gauge',
+        f"dating_bot_db_connections_open {connection_stats['opened'] - connection_stats['closed']}",
+    ]
+    return lines
+
+
+def collect_process() -> List[str]:
+    return [
+        '# HELP process_start_time_seconds Время запуска процесса (unix)',
+        '# TYPE process_start_time_seconds gauge',
+        f'process_start_time_seconds {PROCESS_START_TIME!r}',
+    ]
+
+
+REGISTRY.add_collector(collect_database)
+REGISTRY.add_collector(collect_process)
+
+
+# ===== HTTP-эндпоинт =====
+
+async def _handle_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        # Заголовки нам не нужны, но их надо дочитать
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b'\r\n', b'\n', b''):
+            pass
+
+        parts = request_line.decode(errors='replace').split()
+        path = parts[1].split('?')[0] if len(parts) >= 2 and parts[0] == 'GET' else None
+        if path == '/metrics':
+            status, content_type = '200 OK', 'text/plain; version=0.0.4; charset=utf-8'
+            body = REGISTRY.render().encode()
+        elif path == '/ready':
+            # Проба готовности для балансировщика/оркестратора
+            ready = READY.get() == 1
+            status = '200 OK' if ready else '503 Service Unavailable'
+            content_type, body = 'text/plain; charset=utf-8', b'ready\n' if ready else b'warming up\n'
+        else:
+            status, content_type, body = '404 Not Found', 'text/plain; charset=utf-8', b'not found\n'
+
+        writer.write(
+            f'HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n'
+            f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(host: str, port: int) -> asyncio.AbstractServer:
+    """Запустить HTTP-сервер с эндпоинтами /metrics и /ready"""
+    server = await asyncio.start_server(_handle_request, host, port)
+    logger.info(f"📈 Метрики доступны на http://{host}:{port}/metrics")
+    return server
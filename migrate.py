@@ -0,0 +1,54 @@
+"""
+Применение миграций схемы БД
+
+Запускается один раз на выкатку, до старта воркеров бота:
+    python migrate.py              # применить все недостающие миграции
+    python migrate.py --status     # показать текущую версию и неприменённые миграции
+    python migrate.py --target 3   # применить миграции до версии 3 включительно
+"""
+
+import argparse
+import logging
+import sys
+from typing import List, Optional
+
+from config import DATABASE_URL
+from migrations import LATEST_VERSION, check_schema, migrate
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Миграции схемы PostgreSQL')
+    parser.add_argument('--database-url', default=DATABASE_URL, help='строка подключения к БД')
+    parser.add_argument('--status', action='store_true', help='только показать состояние')
+    parser.add_argument('--target', type=int, default=None, help='применить миграции до этой версии')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    try:
+        if args.status:
+            pending = check_schema(args.database_url)
+            print(f"📦 Последняя версия схемы: {LATEST_VERSION}")
+            if not pending:
+                print("✅ Все миграции применены")
+            for migration in pending:
+                print(f"⏳ Не применена: {migration.version} ({migration.name})")
+            return 0
+
+        applied = migrate(args.database_url, args.target)
+    except Exception as e:
+        print(f"❌ Ошибка миграции: {e}")
+        return 1
+
+    if applied:
+        print(f"✅ Применены миграции: {', '.join(map(str, applied))}")
+    else:
+        print("✅ Схема уже актуальна")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
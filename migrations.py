@@ -0,0 +1,391 @@
+"""
+Версионированные миграции схемы PostgreSQL
+
+Схема больше не создаётся при импорте database.py: её применяет отдельная команда
+`python migrate.py` (один раз на выкатку), а воркеры бота при старте только
+сверяют версию. Применённые версии хранятся в таблице schema_version, на время
+миграции берётся advisory lock, так что параллельные запуски не гоняются за DDL.
+
+Новая миграция — новый элемент MIGRATIONS со следующим номером; применённые
+миграции не редактируются. Миграция 1 написана через IF NOT EXISTS, поэтому
+на базе, созданной старым init_db, она просто фиксирует версию.
+"""
+
+import logging
+import re
+import time
+from typing import List, Optional, Set
+
+import psycopg2
+from psycopg2 import sql
+
+logger = logging.getLogger(__name__)
+
+# Ключ pg_advisory_lock, общий для всех запусков миграций
+MIGRATIONS_LOCK_ID = 728_361_001
+
+# Имя индекса в CREATE INDEX CONCURRENTLY IF NOT EXISTS
+CONCURRENT_INDEX_RE = re.compile(
+    r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)', re.IGNORECASE)
+
+
+class Migration:
+    """Одна миграция: номер версии, название и SQL-операторы"""
+
+    __slots__ = ('version', 'name', 'statements', 'transactional')
+
+    def __init__(self, version: int, name: str, statements: List[str], transactional: bool = True):
+        self.version = version
+        self.name = name
+        self.statements = statements
+        # False — для операторов, которые нельзя выполнять в транзакции
+        # (например, CREATE INDEX CONCURRENTLY)
+        self.transactional = transactional
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, 'initial schema', [
+        # Таблица пользователей
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id TEXT PRIMARY KEY,
+            username TEXT,
+            name TEXT NOT NULL,
+            age INTEGER NOT NULL,
+            gender TEXT NOT NULL,
+            bio TEXT,
+            categories JSONB,
+            created_at TIMESTAMP DEFAULT NOW(),
+            updated_at TIMESTAMP DEFAULT NOW()
+        )
+        ''',
+        # Таблица лайков (взаимные нравятся)
+        '''
+        CREATE TABLE IF NOT EXISTS likes (
+            id SERIAL PRIMARY KEY,
+            user_from TEXT NOT NULL,
+            user_to TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT NOW(),
+            UNIQUE(user_from, user_to),
+            FOREIGN KEY(user_from) REFERENCES users(user_id) ON DELETE CASCADE,
+            FOREIGN KEY(user_to) REFERENCES users(user_id) ON DELETE CASCADE
+        )
+        ''',
+        # Таблица дизлайков (исключить из рекомендаций)
+        '''
+        CREATE TABLE IF NOT EXISTS dislikes (
+            id SERIAL PRIMARY KEY,
+            user_from TEXT NOT NULL,
+            user_to TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT NOW(),
+            UNIQUE(user_from, user_to),
+            FOREIGN KEY(user_from) REFERENCES users(user_id) ON DELETE CASCADE,
+            FOREIGN KEY(user_to) REFERENCES users(user_id) ON DELETE CASCADE
+        )
+        ''',
+        # Таблица сообщений (чат между пользователями)
+        '''
+        CREATE TABLE IF NOT EXISTS messages (
+            id SERIAL PRIMARY KEY,
+            from_user TEXT NOT NULL,
+            to_user TEXT NOT NULL,
+            message TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT NOW(),
+            is_read BOOLEAN DEFAULT FALSE,
+            FOREIGN KEY(from_user) REFERENCES users(user_id) ON DELETE CASCADE,
+            FOREIGN KEY(to_user) REFERENCES users(user_id) ON DELETE CASCADE
+        )
+        ''',
+        # Состояние FSM пользователя. Без FOREIGN KEY, потому что состояние может быть
+        # у пользователя, который ещё не создал профиль (заполняет анкету)
+        '''
+        CREATE TABLE IF NOT EXISTS user_states (
+            user_id TEXT PRIMARY KEY,
+            state TEXT,
+            other_id TEXT,
+            updated_at TIMESTAMP DEFAULT NOW()
+        )
+        ''',
+        # Таблица уведомлений (лайки и мэтчи)
+        '''
+        CREATE TABLE IF NOT EXISTS notifications (
+            id SERIAL PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            from_user_id TEXT NOT NULL,
+            from_user_name TEXT NOT NULL,
+            from_user_username TEXT,
+            notification_type TEXT NOT NULL,
+            message TEXT,
+            is_read BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT NOW(),
+            FOREIGN KEY(user_id) REFERENCES users(user_id) ON DELETE CASCADE,
+            FOREIGN KEY(from_user_id) REFERENCES users(user_id) ON DELETE CASCADE
+        )
+        ''',
+        # Таблица блокировок чатов (когда один из пользователей прервал беседу)
+        '''
+        CREATE TABLE IF NOT EXISTS blocked_chats (
+            id SERIAL PRIMARY KEY,
+            user1_id TEXT NOT NULL,
+            user2_id TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT NOW(),
+            UNIQUE(user1_id, user2_id),
+            FOREIGN KEY(user1_id) REFERENCES users(user_id) ON DELETE CASCADE,
+            FOREIGN KEY(user2_id) REFERENCES users(user_id) ON DELETE CASCADE
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_likes_user_from ON likes(user_from)',
+        'CREATE INDEX IF NOT EXISTS idx_likes_user_to ON likes(user_to)',
+        'CREATE INDEX IF NOT EXISTS idx_dislikes_user_from ON dislikes(user_from)',
+        'CREATE INDEX IF NOT EXISTS idx_messages_from_to ON messages(from_user, to_user)',
+        'CREATE INDEX IF NOT EXISTS idx_notifications_user ON notifications(user_id)',
+        'CREATE INDEX IF NOT EXISTS idx_blocked_chats ON blocked_chats(user1_id, user2_id)',
+    ]),
+    # Счётчик полученных лайков для ранжирования (recommender.py): считать COUNT(*)
+    # по likes для каждого кандидата слишком дорого. Дальше его ведёт add_like
+    Migration(2, 'users.likes_received counter', [
+        'ALTER TABLE users ADD COLUMN IF NOT EXISTS likes_received INTEGER NOT NULL DEFAULT 0',
+        '''
+        UPDATE users u SET likes_received = c.likes
+        FROM (SELECT user_to, COUNT(*) AS likes FROM likes GROUP BY user_to) c
+        WHERE u.user_id = c.user_to
+        ''',
+    ]),
+    # Настройки поиска: диапазон возраста и пол (NULL - без ограничения)
+    Migration(3, 'users search preferences', [
+        'ALTER TABLE users ADD COLUMN IF NOT EXISTS pref_age_min INTEGER',
+        'ALTER TABLE users ADD COLUMN IF NOT EXISTS pref_age_max INTEGER',
+        'ALTER TABLE users ADD COLUMN IF NOT EXISTS pref_genders JSONB',
+    ]),
+    # Индексы под фильтры просмотра анкет: (пол, возраст) и категории (@>).
+    # CONCURRENTLY не блокирует запись в users на время построения
+    Migration(4, 'users browse filter indexes', [
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_gender_age ON users(gender, age)',
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_categories ON users USING GIN (categories jsonb_path_ops)',
+    ], transactional=False),
+    # Геолокация (geo.py): координаты, геохеш для поиска по префиксу и радиус поиска.
+    # COLLATE "C" - чтобы B-tree индекс работал для geohash LIKE 'префикс%'
+    Migration(5, 'users location', [
+        'ALTER TABLE users ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION',
+        'ALTER TABLE users ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION',
+        'ALTER TABLE users ADD COLUMN IF NOT EXISTS geohash TEXT COLLATE "C"',
+        'ALTER TABLE users ADD COLUMN IF NOT EXISTS pref_radius_km INTEGER',
+    ]),
+    Migration(6, 'users geohash index', [
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_geohash ON users(geohash)',
+    ], transactional=False),
+    # Полнотекстовый поиск по описанию (/search): русская и английская морфология.
+    # Сгенерированный STORED столбец переписал бы всю users под ACCESS EXCLUSIVE,
+    # поэтому bio_tsv - обычный столбец: при вставке и изменении bio его считает
+    # триггер, существующие анкеты заполняются пачками по первичному ключу, каждая
+    # в своей транзакции (повторный запуск досчитывает оставшиеся NULL)
+    Migration(7, 'users bio tsvector', [
+        'ALTER TABLE users ADD COLUMN IF NOT EXISTS bio_tsv tsvector',
+        '''
+        CREATE OR REPLACE FUNCTION users_bio_tsv() RETURNS trigger AS $$
+        BEGIN
+            NEW.bio_tsv := to_tsvector('russian', COALESCE(NEW.bio, ''))
+                        || to_tsvector('english', COALESCE(NEW.bio, ''));
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        ''',
+        'DROP TRIGGER IF EXISTS trg_users_bio_tsv ON users',
+        'CREATE TRIGGER trg_users_bio_tsv BEFORE INSERT OR UPDATE OF bio ON users '
+        'FOR EACH ROW EXECUTE FUNCTION users_bio_tsv()',
+        '''
+        DO $$
+        DECLARE
+            last_id TEXT := '';
+            upper_id TEXT;
+        BEGIN
+            LOOP
+                SELECT MAX(user_id) INTO upper_id FROM (
+                    SELECT user_id FROM users WHERE user_id > last_id ORDER BY user_id LIMIT 10000
+                ) batch;
+                EXIT WHEN upper_id IS NULL;
+                UPDATE users SET bio_tsv = to_tsvector('russian', COALESCE(bio, ''))
+                                        || to_tsvector('english', COALESCE(bio, ''))
+                WHERE user_id > last_id AND user_id <= upper_id AND bio_tsv IS NULL;
+                COMMIT;
+                last_id := upper_id;
+            END LOOP;
+        END
+        $$
+        ''',
+    ], transactional=False),
+    Migration(8, 'users bio tsvector index', [
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_bio_tsv ON users USING GIN (bio_tsv)',
+    ], transactional=False),
+    # Офлайн-рекомендации (collaborative.py): top-K кандидатов на пользователя и
+    # состояние фоновых задач (водяной знак обработанных лайков и т.п.)
+    Migration(9, 'recommendations and job state', [
+        '''
+        CREATE TABLE IF NOT EXISTS recommendations (
+            user_id TEXT NOT NULL,
+            candidate_id TEXT NOT NULL,
+            score REAL NOT NULL,
+            created_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (user_id, candidate_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS job_state (
+            job TEXT PRIMARY KEY,
+            state JSONB NOT NULL,
+            updated_at TIMESTAMP DEFAULT NOW()
+        )
+        ''',
+    ]),
+    # Рейтинг привлекательности (rating.py). История лайков не пересчитывается,
+    # рейтинг набирается с новыми оценками. Начальный - 1000 плюс доля балла
+    # случайно, чтобы у анкет не было одинаковых рейтингов: подбор кандидатов
+    # обходит индекс по рейтингу от случайной точки, и равные значения всегда
+    # шли бы в одном порядке.
+    # Столбец с изменчивым DEFAULT переписал бы всю users под ACCESS EXCLUSIVE,
+    # поэтому: столбец с постоянным DEFAULT (без перезаписи), затем DEFAULT для
+    # новых анкет, затем случайная доля существующим - пачками по первичному ключу,
+    # каждая в своей транзакции (повторный запуск досчитывает оставшиеся 1000)
+    Migration(10, 'users rating', [
+        'ALTER TABLE users ADD COLUMN IF NOT EXISTS rating DOUBLE PRECISION NOT NULL DEFAULT 1000',
+        'ALTER TABLE users ALTER COLUMN rating SET DEFAULT (1000 + random())',
+        '''
+        DO $$
+        DECLARE
+            last_id TEXT := '';
+            upper_id TEXT;
+        BEGIN
+            LOOP
+                SELECT MAX(user_id) INTO upper_id FROM (
+                    SELECT user_id FROM users WHERE user_id > last_id ORDER BY user_id LIMIT 10000
+                ) batch;
+                EXIT WHEN upper_id IS NULL;
+                UPDATE users SET rating = rating + random()
+                WHERE user_id > last_id AND user_id <= upper_id AND rating = 1000;
+                COMMIT;
+                last_id := upper_id;
+            END LOOP;
+        END
+        $$
+        ''',
+    ], transactional=False),
+    Migration(11, 'users rating index', [
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_rating ON users(rating)',
+        # Статистика по новому столбцу, иначе планировщик считает корзину рейтинга узкой
+        'ANALYZE users',
+    ], transactional=False),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def _ensure_version_table(conn):
+    with conn.cursor() as cursor:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT NOW()
+            )
+        ''')
+    conn.commit()
+
+
+def applied_versions(conn) -> Set[int]:
+    """Номера уже применённых миграций (пусто, если таблицы версий ещё нет)"""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT to_regclass('schema_version')")
+        if cursor.fetchone()[0] is None:
+            conn.rollback()
+            return set()
+        cursor.execute('SELECT version FROM schema_version')
+        versions = {row[0] for row in cursor.fetchall()}
+    conn.rollback()
+    return versions
+
+
+def pending_migrations(conn) -> List[Migration]:
+    """Миграции, которые ещё не применены, по возрастанию версии"""
+    applied = applied_versions(conn)
+    return [migration for migration in MIGRATIONS if migration.version not in applied]
+
+
+def _drop_invalid_index(cursor, statement: str):
+    """Удалить недостроенный индекс, который создаёт statement
+
+    Упавший или отменённый CREATE INDEX CONCURRENTLY оставляет индекс в состоянии
+    INVALID: повторный запуск с IF NOT EXISTS его пропустил бы, и индекс так и
+    остался бы неиспользуемым.
+    """
+    match = CONCURRENT_INDEX_RE.search(statement)
+    if not match:
+        return
+    name = match.group(1)
+    cursor.execute('SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)', (name,))
+    row = cursor.fetchone()
+    if row and row[0]:
+        logger.warning(f"⚠️ Индекс {name} недостроен (INVALID), строим заново")
+        cursor.execute(sql.SQL('DROP INDEX CONCURRENTLY IF EXISTS {}').format(sql.Identifier(name)))
+
+
+def _apply(conn, migration: Migration):
+    started = time.perf_counter()
+    if migration.transactional:
+        with conn.cursor() as cursor:
+            for statement in migration.statements:
+                cursor.execute(statement)
+            cursor.execute('INSERT INTO schema_version (version, name) VALUES (%s, %s)',
+                           (migration.version, migration.name))
+        conn.commit()
+    else:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                for statement in migration.statements:
+                    _drop_invalid_index(cursor, statement)
+                    cursor.execute(statement)
+                cursor.execute('INSERT INTO schema_version (version, name) VALUES (%s, %s)',
+                               (migration.version, migration.name))
+        finally:
+            conn.autocommit = False
+    logger.info(f"✅ Миграция {migration.version} ({migration.name}) применена "
+                f"за {(time.perf_counter() - started) * 1000:.0f} мс")
+
+
+def migrate(database_url: str, target: Optional[int] = None) -> List[int]:
+    """Применить недостающие миграции (до target включительно); вернуть применённые версии"""
+    conn = psycopg2.connect(database_url)
+    try:
+        with conn.cursor() as cursor:
+            # Второй запуск (например, соседний под при выкатке) подождёт первого
+            cursor.execute('SELECT pg_advisory_lock(%s)', (MIGRATIONS_LOCK_ID,))
+        conn.commit()
+        try:
+            _ensure_version_table(conn)
+            applied = []
+            for migration in pending_migrations(conn):
+                if target is not None and migration.version > target:
+                    break
+                try:
+                    _apply(conn, migration)
+                except Exception:
+                    conn.rollback()
+                    logger.error(f"❌ Миграция {migration.version} ({migration.name}) не применена")
+                    raise
+                applied.append(migration.version)
+            return applied
+        finally:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', (MIGRATIONS_LOCK_ID,))
+            conn.commit()
+    finally:
+        conn.close()
+
+
+def check_schema(database_url: str) -> List[Migration]:
+    """Проверить версию схемы без DDL; вернуть неприменённые миграции"""
+    conn = psycopg2.connect(database_url)
+    try:
+        return pending_migrations(conn)
+    finally:
+        conn.close()
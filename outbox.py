@@ -0,0 +1,264 @@
+"""
+Очередь исходящих сообщений: ограничение частоты, повторы и приоритеты
+
+Обработчики не ждут ответа MAX API: send() ставит отправку в очередь чата и сразу
+возвращается. Отправляют воркеры, соблюдая два token bucket - общий на процесс и
+отдельный на каждый чат. Сообщения одного чата уходят строго по порядку: пока
+сообщение чата ждёт лимита или повтора, следующие за ним стоят.
+
+Ответы 429 и 5xx, а также сетевые ошибки повторяются с экспоненциальной паузой и
+случайным разбросом (full jitter). После 429 общий bucket обнуляется, чтобы
+притормозить весь процесс. Остальные ошибки и исчерпанные повторы логируются,
+и сообщение отбрасывается, а обработчик об этом уже не узнаёт.
+
+Между чатами очередь выбирает по приоритету (lane): переписка в чате важнее
+обычных ответов, а ответы важнее меню. Пока очередь не запущена (скрипты,
+бенчмарки), send() отправляет сразу, без лимитов.
+
+Воркеры - отдельные задачи и не видят трассу обновления, поэтому сообщение
+запоминает текущий span при постановке и отправляется от его имени.
+"""
+
+import asyncio
+import itertools
+import logging
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Hashable, List, Optional
+
+from maxapi.exceptions.max import MaxApiError, MaxConnection
+
+from config import (
+    OUTBOX_RATE, OUTBOX_BURST, OUTBOX_CHAT_RATE, OUTBOX_CHAT_BURST, OUTBOX_WORKERS,
+    OUTBOX_MAX_PENDING, OUTBOX_MAX_RETRIES,
+)
+from metrics import REGISTRY, Counter, Gauge, Histogram
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты: меньше - важнее
+LANE_CHAT = 0
+LANE_REPLY = 1
+LANE_MENU = 2
+LANE_NAMES = {LANE_CHAT: 'chat', LANE_REPLY: 'reply', LANE_MENU: 'menu'}
+
+# Пауза перед повтором: base * 2^попытка, не больше предела, со случайным разбросом
+RETRY_BASE_SECONDS = 0.5
+RETRY_MAX_SECONDS = 30.0
+
+OUTBOX_MESSAGES_TOTAL = REGISTRY.register(Counter(
+    'dating_bot_outbox_messages_total', 'Исходящие сообщения по приоритету и результату', ('lane', 'result')))
+OUTBOX_PENDING = REGISTRY.register(Gauge(
+    'dating_bot_outbox_pending', 'Сообщения в очереди на отправку'))
+OUTBOX_DELAY = REGISTRY.register(Histogram(
+    'dating_bot_outbox_delay_seconds', 'Время от постановки в очередь до отправки'))
+OUTBOX_THROTTLED_TOTAL = REGISTRY.register(Counter(
+    'dating_bot_outbox_throttled_total', 'Задержки отправки из-за лимита', ('limit',)))
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше burst про запас"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Сколько ждать до появления токена (0 - можно сейчас)"""
+        self._refill(time.monotonic())
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self._refill(time.monotonic())
+        self.tokens -= 1
+
+    def drain(self):
+        """Сбросить запас (после 429 от API)"""
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, 0.0)
+
+    @property
+    def full(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.burst
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Стоит ли повторять отправку после такой ошибки"""
+    if isinstance(error, MaxApiError):
+        return error.code == 429 or error.code >= 500
+    return isinstance(error, (MaxConnection, asyncio.TimeoutError, ConnectionError))
+
+
+class _Message:
+    __slots__ = ('lane', 'send', 'enqueued_at', 'attempt', 'span')
+
+    def __init__(self, lane: int, send: Callable[[], Awaitable]):
+        self.lane = lane
+        self.send = send
+        self.enqueued_at = time.perf_counter()
+        self.attempt = 0
+        # span обновления, в трассу которого попадёт отправка
+        self.span = tracer.hold()
+
+
+class Outbox:
+    """Очереди сообщений по чатам поверх общего и початового ограничения частоты"""
+
+    def __init__(self, rate: float = 25.0, burst: float = 25.0, chat_rate: float = 1.0,
+                 chat_burst: float = 5.0, workers: int = 8, max_pending: int = 10000,
+                 max_retries: int = 5):
+        self.rate = rate
+        self.burst = burst
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.pending = 0
+        self.running = False
+        self._global = TokenBucket(rate, burst)
+        self._chat_buckets: Dict[Hashable, TokenBucket] = {}
+        # чат -> его неотправленные сообщения; ключ есть, пока в чате что-то не отправлено
+        self._chats: Dict[Hashable, Deque[_Message]] = {}
+        # чаты, чьё первое сообщение можно отправлять: (приоритет, порядок, чат)
+        self._ready: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._order = itertools.count()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._idle: Optional[asyncio.Event] = None
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        self._worker_tasks: List[asyncio.Task] = []
+
+    def start(self, rate_share: float = 1.0):
+        """Запустить воркеров; rate_share - доля общего лимита на этот процесс"""
+        self._global = TokenBucket(self.rate * rate_share, max(1.0, self.burst * rate_share))
+        self._slots = asyncio.Semaphore(self.max_pending)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._worker_tasks = [asyncio.create_task(self._worker(), name=f'outbox-worker-{i}')
+                              for i in range(self.workers)]
+        self.running = True
+        logger.info(f"📤 Очередь отправки: {self._global.rate:g} сообщ./с всего, "
+                    f"{self.chat_rate:g} сообщ./с на чат, {self.workers} воркеров")
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Дождаться отправки поставленных сообщений и остановить воркеров"""
+        if not self.running:
+            return
+        self.running = False
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Не отправлено сообщений: {self.pending}")
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+
+    async def send(self, chat: Hashable, send: Callable[[], Awaitable], lane: int = LANE_REPLY):
+        """Поставить отправку в очередь чата; ждёт, только если очередь переполнена"""
+        if not self.running:
+            await send()
+            return
+
+        await self._slots.acquire()
+        self.pending += 1
+        self._idle.clear()
+        queue = self._chats.get(chat)
+        if queue is None:
+            queue = self._chats[chat] = deque()
+            queue.append(_Message(lane, send))
+            self._push_ready(chat)
+        else:
+            queue.append(_Message(lane, send))
+        OUTBOX_PENDING.set(self.pending)
+
+    def _push_ready(self, chat: Hashable):
+        self._timers.pop(chat, None)
+        self._ready.put_nowait((self._chats[chat][0].lane, next(self._order), chat))
+
+    def _push_later(self, chat: Hashable, delay: float):
+        loop = asyncio.get_running_loop()
+        self._timers[chat] = loop.call_later(delay, self._push_ready, chat)
+
+    def _chat_bucket(self, chat: Hashable) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat)
+        if bucket is None:
+            if len(self._chat_buckets) > 10 * self.max_pending:
+                # Забываем чаты с полным запасом: для них новый bucket ничем не отличается
+                self._chat_buckets = {key: value for key, value in self._chat_buckets.items()
+                                      if not value.full}
+            bucket = self._chat_buckets[chat] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _done(self, chat: Hashable):
+        """Первое сообщение чата отправлено или отброшено"""
+        queue = self._chats[chat]
+        tracer.release(queue.popleft().span)
+        self.pending -= 1
+        self._slots.release()
+        if queue:
+            self._push_ready(chat)
+        else:
+            del self._chats[chat]
+        OUTBOX_PENDING.set(self.pending)
+        if not self.pending:
+            self._idle.set()
+
+    async def _worker(self):
+        while True:
+            _, _, chat = await self._ready.get()
+            message = self._chats[chat][0]
+
+            chat_bucket = self._chat_bucket(chat)
+            delay = chat_bucket.delay()
+            if delay:
+                OUTBOX_THROTTLED_TOTAL.inc('chat')
+                self._push_later(chat, delay)
+                continue
+            delay = self._global.delay()
+            if delay:
+                OUTBOX_THROTTLED_TOTAL.inc('global')
+                # Общий лимит касается всех чатов, поэтому воркер просто ждёт
+                while delay:
+                    await asyncio.sleep(delay)
+                    delay = self._global.delay()
+            self._global.take()
+            chat_bucket.take()
+
+            lane = LANE_NAMES.get(message.lane, str(message.lane))
+            try:
+                with tracer.resume(message.span):
+                    await message.send()
+            except Exception as e:
+                if is_retryable(e) and message.attempt < self.max_retries:
+                    if isinstance(e, MaxApiError) and e.code == 429:
+                        self._global.drain()
+                    retry_in = random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** message.attempt))
+                    message.attempt += 1
+                    OUTBOX_MESSAGES_TOTAL.inc(lane, 'retry')
+                    logger.warning(f"⚠️ Отправка не удалась ({e}), повтор {message.attempt} через {retry_in:.1f} с")
+                    self._push_later(chat, retry_in)
+                    continue
+                OUTBOX_MESSAGES_TOTAL.inc(lane, 'failed')
+                logger.error(f"❌ Сообщение не отправлено после {message.attempt + 1} попыток: {e}",
+                             exc_info=not is_retryable(e))
+            else:
+                OUTBOX_MESSAGES_TOTAL.inc(lane, 'sent')
+                OUTBOX_DELAY.observe(time.perf_counter() - message.enqueued_at)
+            self._done(chat)
+
+
+# Глобальный экземпляр очереди; запускает BotApp
+outbox = Outbox(OUTBOX_RATE, OUTBOX_BURST, OUTBOX_CHAT_RATE, OUTBOX_CHAT_BURST,
+                OUTBOX_WORKERS, OUTBOX_MAX_PENDING, OUTBOX_MAX_RETRIES)
@@ -0,0 +1,151 @@
+"""
+Семплирующий профилировщик, включаемый по требованию в работающем боте
+
+Пока профилировщик выключен, он ничего не делает: нет ни потока, ни хуков.
+После включения (сигнал SIGUSR2 или админская команда /profile) отдельный поток
+N секунд с заданным интервалом снимает стек главного потока через
+sys._current_frames() и дописывает к нему контекст asyncio: текущую трассу
+обновления (например, «update /like»), а если её нет — корутину задачи.
+Результат пишется в collapsed-stack файл (формат flamegraph.pl / speedscope):
+    update /like;cmd_like (handlers.py:400);get_matches (database.py:287);... 12
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from config import PROFILE_DIR, PROFILE_INTERVAL_MS, PROFILE_MAX_SECONDS
+from tracing import _current_span
+
+logger = logging.getLogger(__name__)
+
+# Словарь loop -> текущая задача, который ведёт сам asyncio
+_current_tasks: Dict = getattr(asyncio.tasks, '_current_tasks', {})
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})".replace(';', ',')
+
+
+def _task_label(task) -> Optional[str]:
+    """Контекст задачи: трасса обновления или имя корутины"""
+    if task is None:
+        return None
+    get_context = getattr(task, 'get_context', None)  # Python 3.12+
+    if get_context is not None:
+        span = get_context().get(_current_span)
+        if span is not None:
+            return span.trace.spans[0].name
+    coro = task.get_coro()
+    return f"task {getattr(coro, '__qualname__', task.get_name())}"
+
+
+class SamplingProfiler:
+    """Снимает стеки главного потока в отдельном потоке и пишет collapsed-stack файл"""
+
+    def __init__(self, output_dir: str = PROFILE_DIR, interval_ms: float = PROFILE_INTERVAL_MS,
+                 max_seconds: float = PROFILE_MAX_SECONDS):
+        self.output_dir = output_dir
+        self.interval = interval_ms / 1000
+        self.max_seconds = max_seconds
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float, loop: Optional[asyncio.AbstractEventLoop] = None) -> Optional[asyncio.Future]:
+        """Запустить профилирование; Future завершится путём к файлу и сводкой (None — уже идёт)"""
+        if self.running:
+            return None
+
+        loop = loop or asyncio.get_running_loop()
+        seconds = max(1.0, min(float(seconds), self.max_seconds))
+        future = loop.create_future()
+        target_thread_id = threading.get_ident()
+
+        def finish(result):
+            if not future.done():
+                future.set_result(result)
+
+        def run():
+            try:
+                result = self._sample(target_thread_id, loop, seconds)
+            except Exception as e:
+                logger.error(f"❌ Ошибка профилировщика: {e}", exc_info=True)
+                result = None
+            loop.call_soon_threadsafe(finish, result)
+
+        self._thread = threading.Thread(target=run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        logger.info(f"🔬 Профилирование запущено на {seconds:.0f} с")
+        return future
+
+    def _sample(self, thread_id: int, loop, seconds: float) -> Dict:
+        stacks: Counter = Counter()
+        samples = 0
+        deadline = time.monotonic() + seconds
+
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None:
+                labels: List[str] = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.reverse()
+                task_label = _task_label(_current_tasks.get(loop))
+                if task_label:
+                    labels.insert(0, task_label.replace(';', ','))
+                stacks[';'.join(labels)] += 1
+                samples += 1
+            time.sleep(self.interval)
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"profile-{datetime.now():%Y%m%d-%H%M%S}.folded")
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        # Самые горячие функции по «собственному» времени (верхний кадр стека)
+        leaf_counts: Counter = Counter()
+        context_counts: Counter = Counter()
+        for stack, count in stacks.items():
+            frames = stack.split(';')
+            leaf_counts[frames[-1]] += count
+            if not frames[0].endswith(')'):
+                context_counts[frames[0]] += count
+
+        logger.info(f"🔬 Профиль записан: {path} ({samples} семплов)")
+        return {
+            'path': path,
+            'samples': samples,
+            'top_functions': leaf_counts.most_common(5),
+            'top_contexts': context_counts.most_common(5),
+        }
+
+
+def format_profile_summary(result: Dict) -> str:
+    """Краткая сводка профиля для сообщения в чат"""
+    samples = result['samples'] or 1
+    text = f"🔬 Профиль готов: `{result['path']}` ({result['samples']} семплов)\n\n"
+    if result['top_contexts']:
+        text += "*Обновления и задачи:*\n"
+        for label, count in result['top_contexts']:
+            text += f"{count * 100 / samples:5.1f}% {label}\n"
+        text += "\n"
+    text += "*Горячие функции:*\n"
+    for label, count in result['top_functions']:
+        text += f"{count * 100 / samples:5.1f}% {label}\n"
+    return text
+
+
+# Глобальный профилировщик процесса
+profiler = SamplingProfiler()
@@ -0,0 +1,105 @@
+"""
+Рейтинг привлекательности анкеты (по образцу рейтинга Эло)
+
+Лайк - «победа» анкеты над тем, кто её оценил, дизлайк - «поражение». Ожидаемый
+исход зависит от разницы рейтингов: лайк от пользователя с высоким рейтингом
+поднимает сильнее, дизлайк от пользователя с низким - сильнее опускает:
+
+    E = 1 / (1 + 10 ^ ((R_оценившего - R_анкеты) / 400))
+    R_анкеты += RATING_K * (исход - E)
+
+Пересчитывать рейтинг по всей таблице likes дорого, поэтому add_like/add_dislike
+меняют одну строку users в той же транзакции, что и вставка лайка. Чтобы старые
+оценки со временем весили меньше, задача распада (python rating.py) раз в сутки
+приближает рейтинги к начальному: отклонение умножается на RATING_DECAY. Анкеты
+в пределах RATING_DECAY_MIN от начального не переписываются. Распад идёт пачками
+по RATING_DECAY_BATCH строк, каждая в своей транзакции, чтобы не держать
+блокировки на всей таблице.
+
+По рейтингу есть индекс: get_profile_for_user берёт пачку кандидатов как срез
+индекса от случайной точки рядом с рейтингом зрителя, без сортировки всех
+подходящих анкет.
+"""
+
+import argparse
+import logging
+import sys
+import time
+from typing import List, Optional
+
+import psycopg2
+
+from config import DATABASE_URL, RATING_K, RATING_DECAY, RATING_DECAY_BATCH
+
+logger = logging.getLogger(__name__)
+
+# Рейтинг новой анкеты (DEFAULT столбца users.rating в миграции 10 - плюс доля
+# балла случайно) и отклонение, меньше которого распад рейтинг не трогает
+RATING_INITIAL = 1000
+RATING_DECAY_MIN = 1.0
+
+# Обновление анкеты после оценки: рейтинг и счётчик лайков одной записью строки.
+# Параметры: исход (1 - лайк, 0 - дизлайк), кого оценили, кто оценил
+RATING_UPDATE_SQL = f'''
+    UPDATE users target
+    SET rating = target.rating + {RATING_K} * (
+            %(outcome)s - 1 / (1 + POWER(10, (rater.rating - target.rating) / 400))
+        ),
+        likes_received = target.likes_received + %(outcome)s
+    FROM users rater
+    WHERE target.user_id = %(target)s AND rater.user_id = %(rater)s
+'''
+
+
+def decay_ratings(database_url: str, factor: float = RATING_DECAY, batch_size: int = RATING_DECAY_BATCH) -> int:
+    """Приблизить рейтинги к начальному; вернуть число изменённых строк"""
+    started = time.perf_counter()
+    conn = psycopg2.connect(database_url)
+    updated = 0
+    last_id = ''
+    try:
+        with conn.cursor() as cursor:
+            while True:
+                # Граница пачки по первичному ключу
+                cursor.execute('''
+                    SELECT MAX(user_id) FROM (
+                        SELECT user_id FROM users WHERE user_id > %s ORDER BY user_id LIMIT %s
+                    ) batch
+                ''', (last_id, batch_size))
+                upper_id = cursor.fetchone()[0]
+                if upper_id is None:
+                    break
+
+                cursor.execute('''
+                    UPDATE users SET rating = %(initial)s + (rating - %(initial)s) * %(factor)s
+                    WHERE user_id > %(lower)s AND user_id <= %(upper)s
+                    AND ABS(rating - %(initial)s) >= %(min_deviation)s
+                ''', {'initial': RATING_INITIAL, 'factor': factor, 'lower': last_id, 'upper': upper_id,
+                      'min_deviation': RATING_DECAY_MIN})
+                updated += cursor.rowcount
+                conn.commit()
+                last_id = upper_id
+    finally:
+        conn.close()
+
+    logger.info(f"✅ Распад рейтинга: изменено {updated} анкет за {time.perf_counter() - started:.1f} с")
+    return updated
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Распад рейтинга анкет к начальному')
+    parser.add_argument('--database-url', default=DATABASE_URL, help='строка подключения к БД')
+    parser.add_argument('--factor', type=float, default=RATING_DECAY, help='множитель отклонения от начального')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    try:
+        decay_ratings(args.database_url, args.factor)
+    except Exception as e:
+        print(f"❌ Ошибка распада рейтинга: {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+Ранжирование кандидатов при просмотре анкет
+
+get_profile_for_user берёт из БД пачку непросмотренных анкет категории (до
+RECOMMENDER_BATCH_SIZE) сразу в виде признаков: возраст, пол, сколько дней
+пользователь не был активен, сколько лайков получил, оценку collaborative.py и
+флаги категорий. Колонки
+пачки превращаются в массивы NumPy, и оценка считается над всей пачкой сразу,
+без цикла по кандидатам на Python. Пачка из тысяч анкет ранжируется примерно
+за миллисекунду.
+
+Признаки (каждый от 0 до 1):
+    age         - близость возраста к возрасту зрителя
+    categories  - доля категорий зрителя, которые есть у кандидата
+    gender      - пол кандидата из тех, что ищет зритель (без настроек - противоположный)
+    activity    - недавняя активность (экспоненциальное затухание)
+    popularity  - полученные лайки (логарифм, нормированный по пачке)
+    rating      - близость рейтинга кандидата к рейтингу зрителя (rating.py)
+    collaborative - оценка «нравится похожим людям» из таблицы recommendations
+                  (collaborative.py), нормированная по пачке; у остальных анкет 0
+
+Оценка - взвешенная сумма признаков, веса настраиваются (RECOMMENDER_WEIGHTS).
+Выбирается не строго лучший кандидат: к оценке добавляется шум Гумбеля с
+масштабом temperature. Иначе «пропустить» показывало бы одну и ту же анкету
+снова и снова.
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from config import CATEGORIES, RECOMMENDER_WEIGHTS, RECOMMENDER_TEMPERATURE
+from rating import RATING_INITIAL
+
+GENDERS = ('male', 'female')
+
+DEFAULT_WEIGHTS = {'age': 1.0, 'categories': 1.0, 'gender': 1.5, 'activity': 0.5, 'popularity': 0.5,
+                   'rating': 0.5, 'collaborative': 2.0}
+
+# Порядок флагов категорий в колонках пачки
+CATEGORY_KEYS = list(CATEGORIES.keys())
+
+
+class CandidateBatch:
+    """Признаки пачки кандидатов в виде массивов (строка i - кандидат i)"""
+
+    __slots__ = ('user_ids', 'ages', 'genders', 'days_inactive', 'likes_received', 'ratings', 'cf_scores',
+                 'categories')
+
+    def __init__(self, rows: Sequence[tuple]):
+        """rows: (user_id, age, gender, days_inactive, likes_received, rating, cf_score,
+        *флаги CATEGORY_KEYS)"""
+        columns = list(zip(*rows)) if rows else [()] * (7 + len(CATEGORY_KEYS))
+        self.user_ids = columns[0]
+        self.ages = np.array(columns[1], dtype=np.float64)
+        self.genders = np.array(columns[2], dtype=object)
+        self.days_inactive = np.array(columns[3], dtype=np.float64)
+        self.likes_received = np.array(columns[4], dtype=np.float64)
+        self.ratings = np.array(columns[5], dtype=np.float64)
+        self.cf_scores = np.array(columns[6], dtype=np.float64)
+        self.categories = np.array(columns[7:], dtype=np.float64).T.reshape(len(rows), len(CATEGORY_KEYS))
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+
+class Recommender:
+    """Оценка и выбор кандидата для зрителя"""
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None, age_scale: float = 5.0,
+                 activity_half_life_days: float = 7.0, rating_scale: float = 200.0,
+                 temperature: float = 0.1, seed: Optional[int] = None):
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.age_scale = age_scale
+        self.rating_scale = rating_scale
+        self.activity_half_life_days = activity_half_life_days
+        self.temperature = temperature
+        self.rng = np.random.default_rng(seed)
+
+    def features(self, viewer: Dict, batch: CandidateBatch) -> Dict[str, np.ndarray]:
+        """Признаки кандидатов относительно зрителя"""
+        viewer_categories = np.array([cat in (viewer.get('categories') or []) for cat in CATEGORY_KEYS],
+                                     dtype=np.float64)
+        wanted = viewer_categories.sum()
+        likes = np.log1p(batch.likes_received)
+        top_likes = likes.max() if len(batch) else 0.0
+        top_cf = batch.cf_scores.max() if len(batch) else 0.0
+
+        return {
+            'age': np.exp(-np.abs(batch.ages - (viewer.get('age') or 0)) / self.age_scale),
+            'categories': batch.categories @ viewer_categories / wanted if wanted else np.zeros(len(batch)),
+            'gender': np.isin(batch.genders, self.wanted_genders(viewer)).astype(np.float64),
+            'activity': np.exp2(-np.maximum(batch.days_inactive, 0) / self.activity_half_life_days),
+            'popularity': likes / top_likes if top_likes else np.zeros(len(batch)),
+            'rating': np.exp(-np.abs(batch.ratings - viewer.get('rating', RATING_INITIAL)) / self.rating_scale),
+            'collaborative': batch.cf_scores / top_cf if top_cf > 0 else np.zeros(len(batch)),
+        }
+
+    @staticmethod
+    def wanted_genders(viewer: Dict) -> List[str]:
+        """Пол, который ищет зритель (настройки поиска, иначе противоположный)"""
+        return viewer.get('pref_genders') or [gender for gender in GENDERS if gender != viewer.get('gender')]
+
+    def score(self, viewer: Dict, batch: CandidateBatch) -> np.ndarray:
+        """Взвешенная сумма признаков для каждого кандидата"""
+        scores = np.zeros(len(batch))
+        for name, values in self.features(viewer, batch).items():
+            weight = self.weights.get(name, 0.0)
+            if weight:
+                scores += weight * values
+        return scores
+
+    def rank(self, viewer: Dict, batch: CandidateBatch) -> List[str]:
+        """user_id кандидатов от лучшего к худшему (без случайности)"""
+        order = np.argsort(-self.score(viewer, batch), kind='stable')
+        return [batch.user_ids[i] for i in order]
+
+    def choose(self, viewer: Dict, batch: CandidateBatch) -> Optional[str]:
+        """Кандидат для показа: лучший по оценке с шумом Гумбеля"""
+        if not len(batch):
+            return None
+        scores = self.score(viewer, batch)
+        if self.temperature:
+            scores = scores + self.temperature * self.rng.gumbel(size=len(batch))
+        return batch.user_ids[int(np.argmax(scores))]
+
+
+# Глобальный экземпляр с весами из конфига
+recommender = Recommender(RECOMMENDER_WEIGHTS, temperature=RECOMMENDER_TEMPERATURE)
@@ -0,0 +1,55 @@
+"""
+Сборка ответа на одно обновление: тексты и клавиатура уходят одним сообщением
+
+Обработчики привыкли отвечать несколькими сообщениями подряд: карточка анкеты,
+потом «Выбери действие:» с кнопками. На время обработки обновления
+DatingBotHandlers.process_update открывает ResponseBuilder, и ответы обработчика
+копятся в нём, а после обработчика уходят разом. Соседние тексты склеиваются
+через пустую строку, клавиатура закрывает сообщение: кнопки остаются под своим
+текстом, а следующий текст начинает новое сообщение. Сообщение длиннее
+MAX_MESSAGE_LENGTH тоже делится.
+"""
+
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+# Предел длины текста одного сообщения MAX
+MAX_MESSAGE_LENGTH = 4000
+
+
+class ResponseBuilder:
+    """Накопитель ответов обработчика"""
+
+    def __init__(self):
+        self.closed = False
+        self._messages: List[Tuple[str, Optional[list], int]] = []
+        self._parts: List[str] = []
+        self._lane: Optional[int] = None
+
+    def add(self, text: Optional[str], attachments: Optional[list], lane: int):
+        """Добавить ответ; при необходимости закрыть текущее сообщение"""
+        if text and self._parts and len('\n\n'.join(self._parts + [text])) > MAX_MESSAGE_LENGTH:
+            self._close_message(None)
+        if text:
+            self._parts.append(text)
+        # Сообщение уходит с самым важным приоритетом из склеенных частей
+        self._lane = lane if self._lane is None else min(self._lane, lane)
+        if attachments:
+            self._close_message(attachments)
+
+    def _close_message(self, attachments: Optional[list]):
+        if self._parts or attachments:
+            self._messages.append(('\n\n'.join(self._parts) or None, attachments, self._lane))
+        self._parts = []
+        self._lane = None
+
+    def close(self) -> List[Tuple[Optional[str], Optional[list], int]]:
+        """Закрыть сборку и вернуть сообщения к отправке (text, attachments, lane)"""
+        self._close_message(None)
+        self.closed = True
+        messages, self._messages = self._messages, []
+        return messages
+
+
+# Сборка ответа текущего обновления (None - отвечать сразу)
+current_response: ContextVar[Optional[ResponseBuilder]] = ContextVar('current_response', default=None)
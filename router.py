@@ -0,0 +1,101 @@
+"""
+Таблица маршрутов команд: точные команды в словаре, префиксные - в префиксном дереве
+
+Раньше текстовое сообщение проходило по очереди через два десятка фильтров
+@dp.message_created(F.message.body.text == ...), а нажатие кнопки - через match в
+cmd_command. Теперь и сообщения, и кнопки разрешаются одной таблицей: команда
+(первое слово текста) ищется в словаре, а если её там нет - в дереве префиксов
+(/chat_<id>). Стоимость не зависит от числа команд: поиск в словаре плюс проход
+по символам команды.
+"""
+
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from metrics import REGISTRY, Counter
+
+ROUTE_DISPATCH_TOTAL = REGISTRY.register(Counter(
+    'dating_bot_route_dispatch_total', 'Обновления по маршрутам и источнику (message/callback)',
+    ('route', 'source')))
+
+Handler = Callable[..., Awaitable]
+
+
+class Route:
+    """Маршрут: имя для метрик и обработчик"""
+
+    __slots__ = ('name', 'handler')
+
+    def __init__(self, name: str, handler: Handler):
+        self.name = name
+        self.handler = handler
+
+
+class _TrieNode:
+    __slots__ = ('children', 'route')
+
+    def __init__(self):
+        self.children: Dict[str, '_TrieNode'] = {}
+        self.route: Optional[Route] = None
+
+
+class Router:
+    """Разрешение команды в маршрут за постоянное (от числа команд) время"""
+
+    def __init__(self):
+        self._exact: Dict[str, Route] = {}
+        self._prefixes = _TrieNode()
+
+    def add(self, command: str, handler: Handler):
+        """Точная команда: /menu, /like"""
+        self._exact[command] = Route(command, handler)
+
+    def add_prefix(self, prefix: str, handler: Handler):
+        """Команда с параметром в самом имени: /chat_<id> (метка в метриках - /chat_*)"""
+        node = self._prefixes
+        for char in prefix:
+            node = node.children.setdefault(char, _TrieNode())
+        node.route = Route(f'{prefix}*', handler)
+
+    def prefixes(self) -> List[str]:
+        """Зарегистрированные префиксы (в них параметр - id пользователя)"""
+        found = []
+        stack = [('', self._prefixes)]
+        while stack:
+            prefix, node = stack.pop()
+            if node.route is not None:
+                found.append(prefix)
+            stack.extend((prefix + char, child) for char, child in node.children.items())
+        return sorted(found)
+
+    def resolve(self, text: Optional[str]) -> Optional[Route]:
+        """Маршрут для текста или payload кнопки (None - не команда или неизвестная)"""
+        if not text or not text.startswith('/'):
+            return None
+        command = text.split(maxsplit=1)[0]
+        route = self._exact.get(command)
+        if route is not None:
+            return route
+
+        # Самый длинный подходящий префикс
+        node = self._prefixes
+        for char in command:
+            node = node.children.get(char)
+            if node is None:
+                break
+            if node.route is not None:
+                route = node.route
+        return route
+
+    def route(self, text: Optional[str], source: str, fallback: Handler) -> Route:
+        """Маршрут обновления с учётом в метриках; если маршрута нет - fallback"""
+        route = self.resolve(text)
+        if route is None:
+            if not text:
+                name = 'empty'
+            elif text.startswith('/'):
+                name = 'other'
+            else:
+                name = 'text'
+            route = Route(name, fallback)
+        ROUTE_DISPATCH_TOTAL.inc(route.name, source)
+        return route
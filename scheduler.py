@@ -0,0 +1,137 @@
+"""
+Планировщик обновлений: по порядку для одного пользователя, параллельно для разных
+
+Каждому пользователю соответствует своя очередь, а очереди разбирает ограниченный
+пул воркеров. У пользователя в работе всегда не больше одного обновления:
+следующее начнётся только после того, как закончится предыдущее. Поэтому двойное
+нажатие «❤️» не перемешает get_user_state/set_user_state в cmd_like. Обновления
+разных пользователей при этом идут параллельно.
+
+Воркер берёт у пользователя одно обновление и, если там есть ещё, ставит
+пользователя в конец очереди готовых. Так один активный пользователь не держит
+воркер. Общее число ожидающих обновлений ограничено: submit() ждёт свободного
+места, и давление передаётся источнику (long polling или очереди вебхука).
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from metrics import REGISTRY, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_PENDING = REGISTRY.register(Gauge(
+    'dating_bot_scheduler_pending', 'Обновления в планировщике (ждут или обрабатываются)'))
+SCHEDULER_ACTIVE_USERS = REGISTRY.register(Gauge(
+    'dating_bot_scheduler_active_users', 'Пользователи с обновлениями в планировщике'))
+SCHEDULER_WAIT = REGISTRY.register(Histogram(
+    'dating_bot_scheduler_wait_seconds', 'Время ожидания обновления в очереди пользователя'))
+
+
+def get_update_user_id(event) -> Optional[str]:
+    """Пользователь, от которого пришло обновление (None, если его не определить)"""
+    callback = getattr(event, 'callback', None)
+    if callback is not None and getattr(callback, 'user', None) is not None:
+        return str(callback.user.user_id)
+    message = getattr(event, 'message', None)
+    sender = getattr(message, 'sender', None)
+    if sender is not None:
+        return str(sender.user_id)
+    user = getattr(event, 'user', None)
+    if user is not None:
+        return str(user.user_id)
+    return None
+
+
+def get_payload_user_id(update: Dict) -> Optional[str]:
+    """То же, что get_update_user_id, но для сырого JSON обновления (до разбора maxapi)"""
+    user = ((update.get('callback') or {}).get('user')
+            or ((update.get('message') or {}).get('sender'))
+            or update.get('user'))
+    if isinstance(user, dict) and user.get('user_id') is not None:
+        return str(user['user_id'])
+    return None
+
+
+class UpdateScheduler:
+    """Очереди по пользователям поверх ограниченного пула воркеров"""
+
+    def __init__(self, workers: int = 16, max_pending: int = 1000):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        # пользователь -> его обновления; ключ есть, пока у пользователя что-то ждёт или выполняется
+        self._queues: Dict[Hashable, Deque[Tuple[float, Callable[[], Awaitable]]]] = {}
+        # пользователи, чьё следующее обновление можно брать в работу
+        self._ready: asyncio.Queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(max_pending)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._worker_tasks: List[asyncio.Task] = []
+
+    def start(self):
+        self._worker_tasks = [asyncio.create_task(self._worker(), name=f'scheduler-worker-{i}')
+                              for i in range(self.workers)]
+        logger.info(f"🧮 Планировщик обновлений: {self.workers} воркеров, до {self.max_pending} в очереди")
+
+    async def join(self):
+        """Дождаться обработки всех принятых обновлений (воркеры продолжают работать)"""
+        await self._idle.wait()
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Дождаться обработки принятых обновлений и остановить воркеры"""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Не дообработано обновлений в планировщике: {self.pending}")
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+
+    async def submit(self, key: Optional[Hashable], job: Callable[[], Awaitable]):
+        """Поставить задачу в очередь пользователя key (None — без упорядочивания)"""
+        await self._slots.acquire()
+        if key is None:
+            key = object()  # отдельная очередь на одно обновление
+
+        self.pending += 1
+        self._idle.clear()
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+            self._ready.put_nowait(key)
+        queue.append((time.perf_counter(), job))
+        SCHEDULER_PENDING.set(self.pending)
+        SCHEDULER_ACTIVE_USERS.set(len(self._queues))
+
+    def wrap(self, handle: Callable[..., Awaitable],
+             key_func: Callable[[object], Optional[Hashable]] = get_update_user_id):
+        """Обернуть handle(event): вызов только ставит событие в очередь его пользователя"""
+        async def scheduled(event):
+            await self.submit(key_func(event), lambda: handle(event))
+        return scheduled
+
+    async def _worker(self):
+        while True:
+            key = await self._ready.get()
+            queue = self._queues[key]
+            enqueued_at, job = queue.popleft()
+            SCHEDULER_WAIT.observe(time.perf_counter() - enqueued_at)
+            try:
+                await job()
+            except Exception as e:
+                logger.error(f"❌ Ошибка обработки обновления: {e}", exc_info=True)
+            finally:
+                self.pending -= 1
+                self._slots.release()
+                if queue:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._queues[key]
+                SCHEDULER_PENDING.set(self.pending)
+                SCHEDULER_ACTIVE_USERS.set(len(self._queues))
+                if not self.pending:
+                    self._idle.set()
@@ -30,6 +30,9 @@ class UserState(Enum):
     EDIT_PROFILE = "edit_profile"
     EDIT_MENU = "edit_menu"
 
+    # Настройки поиска
+    ENTER_SEARCH_AGE = "enter_search_age"
+
 class MainMenuAction(Enum):
     """Действия в главном меню"""
     VIEW_PROFILE = "view_profile"
@@ -45,3 +48,4 @@ class EditAction(Enum):
     EDIT_GENDER = "edit_gender"
     EDIT_BIO = "edit_bio"
     EDIT_CATEGORIES = "edit_categories"
+    EDIT_PREFERENCES = "prefs"
@@ -0,0 +1,231 @@
+"""
+Многопроцессный режим: супервизор и N воркеров, поделивших пользователей по хэшу
+
+Один процесс Python упирается в одно ядро. В этом режиме главный процесс только
+получает обновления (long polling или вебхук) и раскладывает сырой JSON по
+воркерам: воркер выбирается по crc32(user_id) % N, поэтому все обновления
+пользователя попадают в один и тот же процесс, и его кэши профилей и состояний
+остаются согласованными. Каждый воркер - отдельный процесс с BotApp: свой пул
+подключений, свой планировщик и свои метрики на METRICS_PORT + 1 + номер.
+
+Супервизор следит за воркерами. Упавший процесс перезапускается с нарастающей
+паузой. Воркер, чей heartbeat (обновляется циклом событий раз в секунду) не
+менялся дольше WORKER_HEARTBEAT_TIMEOUT, считается зависшим: его убивают и
+запускают заново. Новый процесс получает новую очередь: убитый воркер мог
+умереть, держа блокировку старой. Обновления, которые были в очереди упавшего
+воркера или уже в обработке, теряются (доставка не больше одного раза).
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue as queue_module
+import signal
+import time
+import zlib
+from typing import Dict, List, Optional
+
+from config import METRICS_PORT, BOT_WORKERS
+from metrics import REGISTRY, Counter, Gauge, set_ready
+from scheduler import get_payload_user_id
+
+logger = logging.getLogger(__name__)
+
+# spawn, а не fork: родитель к моменту запуска воркеров уже крутит цикл событий
+_mp = multiprocessing.get_context('spawn')
+
+SUPERVISOR_ROUTED_TOTAL = REGISTRY.register(Counter(
+    'dating_bot_supervisor_routed_total', 'Обновления, переданные воркеру', ('worker',)))
+SUPERVISOR_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'dating_bot_supervisor_queue_depth', 'Обновления в очереди воркера', ('worker',)))
+SUPERVISOR_RESTARTS_TOTAL = REGISTRY.register(Counter(
+    'dating_bot_supervisor_worker_restarts_total', 'Перезапуски воркеров', ('worker', 'reason')))
+SUPERVISOR_WORKERS_ALIVE = REGISTRY.register(Gauge(
+    'dating_bot_supervisor_workers_alive', 'Живые воркеры'))
+
+# Пауза перед перезапуском упавшего воркера: растёт вдвое до предела
+RESTART_BACKOFF_MIN = 1.0
+RESTART_BACKOFF_MAX = 30.0
+
+
+def partition_for(user_id: Optional[str], workers: int) -> int:
+    """Номер воркера, владеющего пользователем (стабилен между запусками, в отличие от hash())"""
+    if user_id is None:
+        return 0
+    return zlib.crc32(user_id.encode()) % workers
+
+
+# ===== Воркер =====
+
+async def _heartbeat(heartbeat):
+    while True:
+        heartbeat.value = time.time()
+        await asyncio.sleep(1)
+
+
+def _next_update(updates, parent_pid: int) -> Optional[Dict]:
+    """Следующее обновление из очереди; None - пора завершаться (стоп или супервизор умер)"""
+    while True:
+        try:
+            return updates.get(timeout=1)
+        except queue_module.Empty:
+            if os.getppid() != parent_pid:
+                return None
+
+
+async def _worker_main(index: int, updates, heartbeat, ready):
+    from bot_app import BotApp
+
+    app = BotApp(metrics_port=METRICS_PORT + 1 + index if METRICS_PORT else 0,
+                 rate_share=1 / BOT_WORKERS)
+    heartbeat_task = asyncio.create_task(_heartbeat(heartbeat))
+    loop = asyncio.get_running_loop()
+    parent_pid = os.getppid()
+    try:
+        await app.start(polling=False)
+        ready.value = 1
+        logger.info(f"👷 Воркер {index} готов")
+        while True:
+            update = await loop.run_in_executor(None, _next_update, updates, parent_pid)
+            if update is None:
+                break
+            await app.handle_payload(update)
+    finally:
+        heartbeat_task.cancel()
+        await app.stop()
+
+
+def worker_process(index: int, updates, heartbeat, ready):
+    """Точка входа процесса-воркера"""
+    # Ctrl+C получает вся группа процессов, а останавливать воркеров должен супервизор
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f'%(asctime)s - worker-{index} - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(_worker_main(index, updates, heartbeat, ready))
+
+
+# ===== Супервизор =====
+
+class WorkerHandle:
+    """Процесс-воркер и его общие с супервизором объекты"""
+
+    def __init__(self, index: int, queue_size: int):
+        self.index = index
+        self.queue_size = queue_size
+        self.updates = None
+        self.heartbeat = _mp.Value('d', 0.0)
+        self.ready = _mp.Value('b', 0)
+        self.process: Optional[multiprocessing.process.BaseProcess] = None
+        self.started_at = 0.0
+        self.backoff = RESTART_BACKOFF_MIN
+        self.restart_at: Optional[float] = None
+
+    def spawn(self):
+        if self.updates is not None:
+            lost = self.updates.qsize()
+            if lost:
+                logger.warning(f"⚠️ Потеряно обновлений из очереди воркера {self.index}: {lost}")
+            self.updates.close()
+        self.updates = _mp.Queue(maxsize=self.queue_size)
+        self.heartbeat.value = time.time()
+        self.ready.value = 0
+        self.process = _mp.Process(target=worker_process, name=f'dating-bot-worker-{self.index}',
+                                   args=(self.index, self.updates, self.heartbeat, self.ready),
+                                   daemon=True)
+        self.process.start()
+        self.started_at = time.monotonic()
+        logger.info(f"👷 Запущен воркер {self.index} (pid {self.process.pid})")
+
+
+class Supervisor:
+    """Запускает воркеров, раскладывает по ним обновления и перезапускает упавших"""
+
+    def __init__(self, workers: int, queue_size: int = 1000, heartbeat_timeout: float = 30.0):
+        self.heartbeat_timeout = heartbeat_timeout
+        self.workers: List[WorkerHandle] = [WorkerHandle(i, queue_size) for i in range(workers)]
+        self._monitor_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        for worker in self.workers:
+            worker.spawn()
+        self._monitor_task = asyncio.create_task(self._monitor())
+
+    async def route(self, update: Dict):
+        """Передать обновление воркеру-владельцу; если его очередь полна - ждать"""
+        worker = self.workers[partition_for(get_payload_user_id(update), len(self.workers))]
+        while True:
+            try:
+                worker.updates.put_nowait(update)
+                break
+            except queue_module.Full:
+                await asyncio.sleep(0.05)
+        SUPERVISOR_ROUTED_TOTAL.inc(str(worker.index))
+
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(1)
+            await self.check_workers()
+
+    async def check_workers(self):
+        """Проверка здоровья: перезапуск упавших и зависших воркеров"""
+        now = time.monotonic()
+        alive = 0
+        for worker in self.workers:
+            process = worker.process
+            SUPERVISOR_QUEUE_DEPTH.set(worker.updates.qsize(), str(worker.index))
+
+            if worker.restart_at is not None:
+                if now >= worker.restart_at:
+                    worker.restart_at = None
+                    worker.spawn()
+                continue
+
+            if not process.is_alive():
+                logger.error(f"💥 Воркер {worker.index} завершился с кодом {process.exitcode}, "
+                             f"перезапуск через {worker.backoff:.0f} с")
+                SUPERVISOR_RESTARTS_TOTAL.inc(str(worker.index), 'exit')
+                self._schedule_restart(worker, now)
+                continue
+
+            stale = time.time() - worker.heartbeat.value
+            if stale > self.heartbeat_timeout:
+                logger.error(f"🧊 Воркер {worker.index} не отвечает {stale:.0f} с, перезапуск")
+                SUPERVISOR_RESTARTS_TOTAL.inc(str(worker.index), 'heartbeat')
+                process.kill()
+                # join в потоке: цикл событий супервизора продолжает раскладывать обновления
+                await asyncio.to_thread(process.join, 5)
+                self._schedule_restart(worker, now)
+                continue
+
+            alive += 1
+            # Проработал минуту без падений - сбрасываем паузу перезапуска
+            if now - worker.started_at > 60:
+                worker.backoff = RESTART_BACKOFF_MIN
+
+        SUPERVISOR_WORKERS_ALIVE.set(alive)
+        set_ready(alive == len(self.workers) and all(worker.ready.value for worker in self.workers))
+
+    def _schedule_restart(self, worker: WorkerHandle, now: float):
+        worker.restart_at = now + worker.backoff
+        worker.backoff = min(worker.backoff * 2, RESTART_BACKOFF_MAX)
+
+    async def stop(self, timeout: float = 15.0):
+        """Попросить воркеров дообработать очереди и завершиться"""
+        if self._monitor_task:
+            self._monitor_task.cancel()
+        for worker in self.workers:
+            try:
+                await asyncio.to_thread(worker.updates.put, None, True, 1)
+            except queue_module.Full:
+                pass
+        deadline = time.monotonic() + timeout
+        for worker in self.workers:
+            process = worker.process
+            await asyncio.to_thread(process.join, max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"⚠️ Воркер {worker.index} не завершился вовремя, останавливаю")
+                process.terminate()
+                await asyncio.to_thread(process.join, 1)
@@ -0,0 +1,68 @@
+"""
+Тесты выдачи подключений из пула (db_pool.ConnectionPool)
+
+Запуск: python -m pytest. База данных не нужна: подключения - заглушки с ping().
+"""
+
+import pytest
+
+from db_pool import ConnectionPool
+
+
+class StubConnection:
+    def __init__(self, alive: bool = True):
+        self.alive = alive
+        self.closed = 0
+        self.pings = 0
+        self.idle_since = 0.0
+        self.pool = None
+
+    def ping(self) -> bool:
+        self.pings += 1
+        return self.alive
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('db_pool.time.monotonic', lambda: now[0])
+    return now
+
+
+def make_pool(*idle: StubConnection) -> ConnectionPool:
+    pool = ConnectionPool('postgresql://unused', min_size=0, max_idle=10, check_after=30)
+    pool._idle.extend(idle)
+    pool._connect = StubConnection
+    return pool
+
+
+def test_recently_used_connection_not_checked(clock):
+    conn = StubConnection()
+    conn.idle_since = clock[0] - 5
+    assert make_pool(conn).acquire() is conn
+    assert conn.pings == 0
+
+
+def test_long_idle_connection_checked(clock):
+    conn = StubConnection()
+    conn.idle_since = clock[0] - 60
+    assert make_pool(conn).acquire() is conn
+    assert conn.pings == 1
+
+
+def test_dead_connection_replaced(clock):
+    alive, dead = StubConnection(), StubConnection(alive=False)
+    alive.idle_since = dead.idle_since = clock[0] - 60
+    pool = make_pool(alive, dead)
+    assert pool.acquire() is alive
+    assert dead.closed and pool.idle == 0
+
+
+def test_new_connection_when_all_dead(clock):
+    dead = StubConnection(alive=False)
+    dead.idle_since = clock[0] - 60
+    conn = make_pool(dead).acquire()
+    assert conn is not dead and dead.closed
@@ -0,0 +1,122 @@
+"""
+Тесты геохеша и поиска соседних ячеек (geo.py)
+
+Главное свойство expanding_cells: точка не дальше радиуса поиска попадает в одну
+из ячеек блока, отмеченного как накрывающий радиус. Запуск: python -m pytest.
+"""
+
+import math
+import random
+
+import pytest
+
+from geo import (
+    GEO_START_PRECISION, KM_PER_DEGREE, cell_size, covered_radius_km, distance_km, encode,
+    expanding_cells, neighbour_cells,
+)
+
+CENTERS = [
+    (55.7558, 37.6173),     # Москва
+    (59.9343, 30.3351),     # Санкт-Петербург
+    (68.9585, 33.0827),     # Мурманск, высокая широта
+    (64.7314, 177.5015),    # Анадырь, рядом с линией перемены дат
+    (-33.8688, 151.2093),   # южное полушарие
+    (0.0, 0.0),             # пересечение экватора и нулевого меридиана
+]
+
+
+def test_encode_known_value():
+    # Эталонное значение из описания геохеша
+    assert encode(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+
+
+def test_encode_prefix_by_precision():
+    full = encode(55.7558, 37.6173, 9)
+    assert all(encode(55.7558, 37.6173, precision) == full[:precision] for precision in range(1, 9))
+
+
+def test_neighbour_cells_block():
+    cells = neighbour_cells(55.7558, 37.6173, 5)
+    assert len(cells) == 9
+    assert len(set(cells)) == 9
+    assert cells[0] == encode(55.7558, 37.6173, 5)
+
+
+def test_neighbour_cells_wrap_dateline():
+    cells = neighbour_cells(10.0, 179.99, 4)
+    assert len(set(cells)) == 9
+    # Соседи справа - на другой стороне линии перемены дат
+    assert encode(10.0, -179.99, 4) in cells
+
+
+def test_neighbour_cells_near_pole_without_duplicates():
+    cells = neighbour_cells(89.99, 0.0, 3)
+    assert len(cells) == len(set(cells)) == 6
+
+
+def test_expanding_cells_from_fine_to_coarse():
+    steps = list(expanding_cells(55.7558, 37.6173, 300))
+    precisions = [len(cells[0]) for cells, _ in steps]
+    assert precisions == list(range(GEO_START_PRECISION, GEO_START_PRECISION - len(steps), -1))
+    assert [complete for _, complete in steps] == [False] * (len(steps) - 1) + [True]
+    assert covered_radius_km(55.7558, precisions[-1]) >= 300
+
+
+def test_expanding_cells_small_radius_complete_at_once():
+    steps = list(expanding_cells(55.7558, 37.6173, 1))
+    assert len(steps) == 1
+    assert steps[0][1] is True
+
+
+def test_expanding_cells_huge_radius_stops_at_one_char():
+    steps = list(expanding_cells(55.7558, 37.6173, 20000))
+    assert len(steps[-1][0][0]) == 1
+    assert steps[-1][1] is True
+
+
+def _random_point_within(rnd: random.Random, latitude: float, longitude: float, radius_km: float):
+    """Случайная точка не дальше radius_km (по смещению в градусах, с проверкой расстояния)"""
+    while True:
+        dlat = rnd.uniform(-1, 1) * radius_km / KM_PER_DEGREE
+        dlon = rnd.uniform(-1, 1) * radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+        lat = latitude + dlat
+        lon = (longitude + dlon + 180.0) % 360.0 - 180.0
+        if abs(lat) < 90 and distance_km(latitude, longitude, lat, lon) <= radius_km:
+            return lat, lon
+
+
+@pytest.mark.parametrize('latitude,longitude', CENTERS)
+@pytest.mark.parametrize('radius_km', [1, 5, 30, 150])
+def test_complete_block_covers_radius(latitude, longitude, radius_km):
+    rnd = random.Random(f'{latitude},{longitude},{radius_km}')
+    cells, complete = list(expanding_cells(latitude, longitude, radius_km))[-1]
+    assert complete
+    precision = len(cells[0])
+    for _ in range(300):
+        lat, lon = _random_point_within(rnd, latitude, longitude, radius_km)
+        assert encode(lat, lon, precision) in cells, (lat, lon)
+
+
+@pytest.mark.parametrize('latitude,longitude', CENTERS)
+def test_covered_radius_at_cell_edges(latitude, longitude):
+    # Центр у самого края своей ячейки: точки на гарантированном расстоянии
+    # по всем сторонам света всё равно в блоке 3x3
+    for precision in range(GEO_START_PRECISION, 1, -1):
+        lat_step, lon_step = cell_size(precision)
+        edge_lat = math.floor(latitude / lat_step) * lat_step + lat_step * 0.999
+        edge_lon = math.floor(longitude / lon_step) * lon_step + lon_step * 0.999
+        radius = covered_radius_km(edge_lat, precision) * 0.99
+        cells = neighbour_cells(edge_lat, edge_lon, precision)
+        for bearing in range(0, 360, 15):
+            dlat = radius * math.cos(math.radians(bearing)) / KM_PER_DEGREE
+            dlon = radius * math.sin(math.radians(bearing)) / (KM_PER_DEGREE * math.cos(math.radians(edge_lat)))
+            lat = edge_lat + dlat
+            lon = (edge_lon + dlon + 180.0) % 360.0 - 180.0
+            if distance_km(edge_lat, edge_lon, lat, lon) <= radius:
+                assert encode(lat, lon, precision) in cells, (precision, bearing)
+
+
+def test_distance_km():
+    # Москва - Санкт-Петербург около 634 км
+    assert distance_km(55.7558, 37.6173, 59.9343, 30.3351) == pytest.approx(634, abs=5)
+    assert distance_km(10.0, 20.0, 10.0, 20.0) == 0
@@ -0,0 +1,115 @@
+"""
+Тесты расписания cron фоновых задач (jobs.CronSchedule) и слотов Job
+
+Запуск: python -m pytest. База данных не нужна.
+"""
+
+from datetime import datetime
+
+import pytest
+
+from jobs import CronSchedule, Job
+
+# 2026-10-19 - понедельник
+MONDAY = datetime(2026, 10, 19, 12, 0)
+
+
+def next_runs(expression: str, moment: datetime, count: int):
+    schedule = CronSchedule(expression)
+    runs = []
+    for _ in range(count):
+        moment = schedule.next_after(moment)
+        runs.append(moment)
+    return runs
+
+
+def test_daily_time_today_and_tomorrow():
+    schedule = CronSchedule('30 4 * * *')
+    assert schedule.next_after(datetime(2026, 10, 19, 3, 0)) == datetime(2026, 10, 19, 4, 30)
+    assert schedule.next_after(datetime(2026, 10, 19, 5, 0)) == datetime(2026, 10, 20, 4, 30)
+
+
+def test_strictly_after_moment():
+    schedule = CronSchedule('30 4 * * *')
+    assert schedule.next_after(datetime(2026, 10, 19, 4, 30)) == datetime(2026, 10, 20, 4, 30)
+    assert schedule.next_after(datetime(2026, 10, 19, 4, 29, 59)) == datetime(2026, 10, 19, 4, 30)
+
+
+def test_steps_ranges_and_lists():
+    assert next_runs('*/15 9-10 * * *', datetime(2026, 10, 19, 10, 40), 3) == [
+        datetime(2026, 10, 19, 10, 45), datetime(2026, 10, 20, 9, 0), datetime(2026, 10, 20, 9, 15)]
+    assert next_runs('0 8,20 * * *', MONDAY, 2) == [datetime(2026, 10, 19, 20, 0), datetime(2026, 10, 20, 8, 0)]
+    assert next_runs('0 0 1-10/3 * *', datetime(2026, 10, 5), 2) == [datetime(2026, 10, 7), datetime(2026, 10, 10)]
+
+
+def test_weekday_only():
+    # 1-5 - будни: с субботы следующий запуск в понедельник
+    assert CronSchedule('0 9 * * 1-5').next_after(datetime(2026, 10, 17, 10, 0)) == datetime(2026, 10, 19, 9, 0)
+
+
+@pytest.mark.parametrize('sunday', ['0', '7'])
+def test_sunday_is_zero_and_seven(sunday):
+    assert CronSchedule(f'0 12 * * {sunday}').next_after(MONDAY) == datetime(2026, 10, 25, 12, 0)
+
+
+def test_day_of_month_or_day_of_week():
+    # Заданы оба поля - подходит 13-е число или пятница
+    assert next_runs('0 0 13 * 5', MONDAY, 4) == [
+        datetime(2026, 10, 23), datetime(2026, 10, 30), datetime(2026, 11, 6), datetime(2026, 11, 13)]
+    # 13-е число не пятница: оно тоже подходит
+    assert CronSchedule('0 0 13 * 5').next_after(datetime(2027, 1, 9)) == datetime(2027, 1, 13)
+
+
+def test_day_of_month_and_star_weekday():
+    # День недели '*' - только 13-е число
+    assert next_runs('0 0 13 * *', MONDAY, 2) == [datetime(2026, 11, 13), datetime(2026, 12, 13)]
+    # Шаг от '*' не считается ограничением: только понедельники
+    assert CronSchedule('0 0 */1 * 1').next_after(MONDAY) == datetime(2026, 10, 26)
+
+
+def test_month_rollover():
+    assert CronSchedule('0 0 1 * *').next_after(datetime(2026, 12, 15)) == datetime(2027, 1, 1)
+    # В апреле нет 31-го числа
+    assert CronSchedule('30 23 31 * *').next_after(datetime(2026, 4, 1)) == datetime(2026, 5, 31, 23, 30)
+    assert CronSchedule('59 23 31 12 *').next_after(datetime(2026, 12, 31, 23, 59)) == datetime(2027, 12, 31, 23, 59)
+
+
+def test_month_field():
+    assert CronSchedule('0 0 1 1,7 *').next_after(MONDAY) == datetime(2027, 1, 1)
+
+
+def test_leap_day():
+    assert CronSchedule('0 0 29 2 *').next_after(datetime(2026, 3, 1)) == datetime(2028, 2, 29)
+
+
+def test_never_firing_schedule():
+    with pytest.raises(ValueError):
+        CronSchedule('0 0 31 2 *').next_after(MONDAY)
+
+
+@pytest.mark.parametrize('expression', [
+    '* * *', '* * * * * *', '60 * * * *', '* 24 * * *', '* * 0 * *', '* * * 13 *', '* * * * 8',
+    '5-1 * * * *', '*/0 * * * *', 'a * * * *',
+])
+def test_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+
+def test_interval_slots_are_aligned():
+    job = Job('demo', lambda: None, interval=3600)
+    assert job.next_slot(7200.0) == ('3', 10800)
+    assert job.next_slot(7300.0) == ('3', 10800)
+    assert job.next_slot(10799.9) == ('3', 10800)
+
+
+def test_cron_slot_is_firing_time():
+    job = Job('demo', lambda: None, cron='30 4 * * *')
+    slot, run_at = job.next_slot(datetime(2026, 10, 19, 5, 0).timestamp())
+    assert slot == '2026-10-20T04:30'
+    assert run_at == datetime(2026, 10, 20, 4, 30).timestamp()
+
+
+def test_job_needs_schedule():
+    with pytest.raises(ValueError):
+        Job('demo', lambda: None)
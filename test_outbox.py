@@ -0,0 +1,89 @@
+"""
+Тесты очереди отправки (outbox.Outbox) вместе с трассировкой
+
+Запуск: python -m pytest. База данных и MAX не нужны: бот - fake_max.FakeBot.
+"""
+
+import asyncio
+
+import pytest
+
+from fake_max import FakeBot
+from metrics import instrument_bot
+from outbox import Outbox
+from tracing import tracer
+
+
+@pytest.fixture
+def traces(monkeypatch):
+    monkeypatch.setattr(tracer, 'enabled', True)
+    monkeypatch.setattr(tracer, 'file_path', '')
+    tracer.buffer.clear()
+    yield tracer.buffer
+    tracer.buffer.clear()
+
+
+def make_outbox() -> Outbox:
+    return Outbox(rate=1000.0, burst=1000.0, chat_rate=1000.0, chat_burst=1000.0, workers=2)
+
+
+def test_send_span_under_update_root(traces):
+    bot = instrument_bot(FakeBot())
+    outbox = make_outbox()
+
+    async def scenario():
+        outbox.start()
+        with tracer.trace('update'):
+            await outbox.send(42, lambda: bot.send_message(user_id=42, text='привет'))
+        # Трасса ждёт отправку из очереди
+        assert not traces
+        await outbox.stop()
+
+    asyncio.run(scenario())
+    assert len(bot.calls) == 1
+    (record,) = traces
+    root, send = record['spans']
+    assert root['name'] == 'update' and root['parent'] is None
+    assert send['name'] == 'max.send_message' and send['parent'] == root['id']
+
+
+def test_retry_attempts_in_one_trace(traces, monkeypatch):
+    monkeypatch.setattr('outbox.RETRY_BASE_SECONDS', 0.001)
+    bot = instrument_bot(FakeBot())
+    outbox = make_outbox()
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        await bot.send_message(user_id=42, text='привет')
+        if len(attempts) == 1:
+            raise ConnectionError('reset')
+
+    async def scenario():
+        outbox.start()
+        with tracer.trace('update'):
+            await outbox.send(42, flaky)
+        await outbox.stop()
+
+    asyncio.run(scenario())
+    (record,) = traces
+    assert [span['name'] for span in record['spans']] == ['update', 'max.send_message', 'max.send_message']
+
+
+def test_trace_without_sends_exported_at_once(traces):
+    with tracer.trace('update'):
+        pass
+    assert [record['name'] for record in traces] == ['update']
+
+
+def test_stopped_outbox_sends_inline(traces):
+    bot = instrument_bot(FakeBot())
+    outbox = make_outbox()
+
+    async def scenario():
+        with tracer.trace('update'):
+            await outbox.send(42, lambda: bot.send_message(user_id=42, text='привет'))
+
+    asyncio.run(scenario())
+    (record,) = traces
+    assert [span['name'] for span in record['spans']] == ['update', 'max.send_message']
@@ -0,0 +1,89 @@
+"""
+Тесты анонимизации записи обновлений (update_recorder.py) и подготовки воспроизведения
+
+Префиксные команды берутся из таблицы маршрутов настоящих DatingBotHandlers.
+Запуск: python -m pytest. База данных и MAX не нужны.
+"""
+
+import pytest
+
+from fake_max import FakeBot, FakeDispatcher, MESSAGE_CALLBACK, MESSAGE_CREATED, make_event
+from handlers import DatingBotHandlers
+from update_recorder import anonymize_text, anonymize_user_id, describe_event
+
+SALT = b'test-salt'
+
+
+@pytest.fixture(scope='module')
+def id_prefixes():
+    return DatingBotHandlers(FakeDispatcher(), FakeBot()).router.prefixes()
+
+
+def test_router_prefixes(id_prefixes):
+    assert id_prefixes == ['/chat_', '/show_']
+
+
+@pytest.mark.parametrize('prefix', ['/chat_', '/show_'])
+def test_id_routes_anonymized(id_prefixes, prefix):
+    text = anonymize_text(f'{prefix}123456789', SALT, id_prefixes)
+    assert text == f'{prefix}{anonymize_user_id("123456789", SALT)}'
+    assert '123456789' not in text
+
+
+def test_every_prefix_route_anonymized(id_prefixes):
+    for prefix in id_prefixes:
+        assert anonymize_text(f'{prefix}987654321', SALT, id_prefixes) != f'{prefix}987654321'
+
+
+def test_plain_commands_and_text(id_prefixes):
+    assert anonymize_text('/menu', SALT, id_prefixes) == '/menu'
+    assert anonymize_text('привет', SALT, id_prefixes) == 'xxxxxx'
+    assert anonymize_text(None, SALT, id_prefixes) == ''
+
+
+def test_describe_event(id_prefixes):
+    bot = FakeBot()
+    entry = describe_event(make_event(bot, MESSAGE_CALLBACK, 555, '/show_777', 1000), SALT, id_prefixes)
+    assert entry == {'t': 1000, 'k': 'c', 'u': anonymize_user_id(555, SALT),
+                     'x': f'/show_{anonymize_user_id("777", SALT)}'}
+    entry = describe_event(make_event(bot, MESSAGE_CREATED, 555, '/chat_777', 1000), SALT, id_prefixes)
+    assert entry['k'] == 'm' and '777' not in entry['x']
+
+
+@pytest.mark.parametrize('text', ['/search гитара горы', '/radius 10', '/profile 30', '/traces slow'])
+def test_command_arguments_kept(id_prefixes, text):
+    assert anonymize_text(text, SALT, id_prefixes) == text
+
+
+def test_search_cursor_id_anonymized(id_prefixes):
+    text = anonymize_text('/search_page 2 0.1:123456789 гитара', SALT, id_prefixes)
+    assert text == f'/search_page 2 0.1:{anonymize_user_id("123456789", SALT)} гитара'
+
+
+@pytest.mark.parametrize('text,expected', [
+    ('25', '25'),
+    ('20-30', '20-30'),
+    ('Иван', 'xxxx'),
+    ('Мой номер 89161234567, пиши!', 'xxx xxxxx 99999999999, xxxx!'),
+])
+def test_free_text_keeps_its_shape(id_prefixes, text, expected):
+    assert anonymize_text(text, SALT, id_prefixes) == expected
+
+
+def test_location_recorded_without_coordinates(id_prefixes):
+    from maxapi.types.attachments.location import Location
+
+    event = make_event(FakeBot(), MESSAGE_CREATED, 555, None, 1000)
+    event.message.body.attachments = [Location(type='location', latitude=55.75, longitude=37.61)]
+    assert describe_event(event, SALT, id_prefixes) == {
+        't': 1000, 'k': 'l', 'u': anonymize_user_id(555, SALT), 'x': ''}
+
+
+def test_replay_referenced_users(id_prefixes):
+    from replay_updates import referenced_users
+
+    entries = [{'t': 1, 'k': 'm', 'u': 1, 'x': '/chat_2'}, {'t': 2, 'k': 'c', 'u': 3, 'x': '/show_4'},
+               {'t': 3, 'k': 'm', 'u': 1, 'x': 'xxxx'}]
+    users, chats = referenced_users(entries, id_prefixes)
+    assert users == {'1', '2', '3', '4'}
+    assert chats == {('1', '2')}
@@ -0,0 +1,30 @@
+"""
+Тесты разбора аргументов команд (utils.py)
+
+Запуск: python -m pytest. База данных и MAX не нужны.
+"""
+
+import pytest
+
+from utils import parse_search_page_arg
+
+
+def test_cursor_parsed():
+    assert parse_search_page_arg('3 0.25:12345 гитара горы') == (3, (0.25, '12345'), 'гитара горы')
+
+
+def test_page_clamped():
+    assert parse_search_page_arg('0 0.25:12345 гитара') == (1, (0.25, '12345'), 'гитара')
+
+
+def test_old_format_keeps_query():
+    assert parse_search_page_arg('2 гитара горы') == (1, None, 'гитара горы')
+
+
+@pytest.mark.parametrize('arg', ['2 abc:def гитара', '2 0.5: гитара', '2 :123 гитара'])
+def test_malformed_cursor_dropped_from_query(arg):
+    assert parse_search_page_arg(arg) == (1, None, 'гитара')
+
+
+def test_empty_argument():
+    assert parse_search_page_arg(None) == (1, None, '')
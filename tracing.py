@@ -0,0 +1,222 @@
+"""
+Лёгкая трассировка обработки обновлений
+
+Каждое обновление получает корневой span (DatingBotHandlers.process_update),
+вызовы методов Database и исходящие вызовы MAX API становятся дочерними span.
+Завершённые трассы попадают в кольцевой буфер (смотреть админской командой
+/traces) и, если задан TRACE_FILE, пишутся в JSON lines файл.
+
+Вне трассы (например, при прогреве) дочерние span не создаются: проверка
+сводится к чтению одной contextvar.
+
+Ответы отправляют воркеры очереди outbox уже после обработчика. Очередь берёт
+текущий span при постановке (hold) и делает его текущим на время отправки
+(resume), поэтому span max.* попадают в трассу обновления. Трасса экспортируется,
+когда закончились и корневой span, и все такие отправки (release).
+"""
+
+import contextvars
+import json
+import logging
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from config import TRACING_ENABLED, TRACE_BUFFER_SIZE, TRACE_FILE
+
+logger = logging.getLogger(__name__)
+
+_current_span: contextvars.ContextVar[Optional['Span']] = contextvars.ContextVar('current_span', default=None)
+
+
+class Trace:
+    """Одна трасса: все span одного обновления"""
+
+    __slots__ = ('trace_id', 'started_at', 't0', 'spans', 'next_span_id', 'holds')
+
+    def __init__(self):
+        self.trace_id = secrets.token_hex(8)
+        self.started_at = time.time()
+        self.t0 = time.perf_counter()
+        self.spans: List['Span'] = []
+        self.next_span_id = 1
+        # Отложенные работы (hold), без которых трасса ещё не полная
+        self.holds = 0
+
+
+class Span:
+    """Участок работы внутри трассы"""
+
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'attrs', 'start_ms', 'duration_ms', 'error')
+
+    def __init__(self, trace: Trace, parent_id: Optional[int], name: str, attrs: Dict):
+        self.trace = trace
+        self.span_id = trace.next_span_id
+        trace.next_span_id += 1
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self.start_ms = (time.perf_counter() - trace.t0) * 1000
+        self.duration_ms: Optional[float] = None
+        self.error: Optional[str] = None
+        trace.spans.append(self)
+
+    def finish(self):
+        self.duration_ms = (time.perf_counter() - self.trace.t0) * 1000 - self.start_ms
+
+    def to_dict(self) -> Dict:
+        data = {'id': self.span_id, 'parent': self.parent_id, 'name': self.name,
+                'start_ms': round(self.start_ms, 3), 'duration_ms': round(self.duration_ms or 0.0, 3)}
+        if self.attrs:
+            data['attrs'] = self.attrs
+        if self.error:
+            data['error'] = self.error
+        return data
+
+
+class Tracer:
+    """Создаёт span и экспортирует завершённые трассы"""
+
+    def __init__(self, enabled: bool = TRACING_ENABLED, buffer_size: int = TRACE_BUFFER_SIZE,
+                 file_path: str = TRACE_FILE):
+        self.enabled = enabled
+        self.buffer: deque = deque(maxlen=buffer_size)
+        self.file_path = file_path
+        self._file = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def trace(self, name: str, **attrs):
+        """Корневой span обновления; по завершении трасса экспортируется"""
+        if not self.enabled:
+            yield None
+            return
+
+        trace = Trace()
+        span = Span(trace, None, name, attrs)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.error = repr(e)
+            raise
+        finally:
+            span.finish()
+            _current_span.reset(token)
+            if not trace.holds:
+                self._export(trace)
+
+    def start_span(self, name: str, **attrs) -> Optional[Tuple[Span, contextvars.Token]]:
+        """Открыть дочерний span, если идёт трасса (иначе None)"""
+        parent = _current_span.get()
+        if parent is None:
+            return None
+        span = Span(parent.trace, parent.span_id, name, attrs)
+        return span, _current_span.set(span)
+
+    def finish_span(self, span: Span, token: contextvars.Token, error: Optional[str] = None, **attrs):
+        """Закрыть дочерний span, открытый start_span"""
+        span.finish()
+        if error:
+            span.error = error
+        if attrs:
+            span.attrs.update(attrs)
+        _current_span.reset(token)
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """Дочерний span как контекстный менеджер"""
+        opened = self.start_span(name, **attrs)
+        if opened is None:
+            yield None
+            return
+        span, token = opened
+        error = None
+        try:
+            yield span
+        except Exception as e:
+            error = repr(e)
+            raise
+        finally:
+            self.finish_span(span, token, error)
+
+    def hold(self) -> Optional[Span]:
+        """Текущий span для работы после обновления; трасса ждёт release"""
+        span = _current_span.get()
+        if span is not None:
+            span.trace.holds += 1
+        return span
+
+    @contextmanager
+    def resume(self, span: Optional[Span]):
+        """Сделать span, взятый hold, текущим в другой задаче"""
+        if span is None:
+            yield
+            return
+        token = _current_span.set(span)
+        try:
+            yield
+        finally:
+            _current_span.reset(token)
+
+    def release(self, span: Optional[Span]):
+        """Отложенная работа закончена; последняя после корневого span экспортирует трассу"""
+        if span is None:
+            return
+        trace = span.trace
+        trace.holds -= 1
+        if not trace.holds and trace.spans[0].duration_ms is not None:
+            self._export(trace)
+
+    def _export(self, trace: Trace):
+        root = trace.spans[0]
+        record = {
+            'trace_id': trace.trace_id,
+            'name': root.name,
+            'started_at': round(trace.started_at, 3),
+            'duration_ms': round(root.duration_ms or 0.0, 3),
+            'spans': [span.to_dict() for span in trace.spans],
+        }
+        self.buffer.append(record)
+
+        if not self.file_path:
+            return
+        try:
+            with self._lock:
+                if self._file is None:
+                    self._file = open(self.file_path, 'a', encoding='utf-8', buffering=1)
+                self._file.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось записать трассу: {e}")
+
+    def recent(self, limit: int = 5, slowest: bool = False) -> List[Dict]:
+        """Последние (или самые медленные) трассы из буфера"""
+        traces = list(self.buffer)
+        if slowest:
+            traces.sort(key=lambda record: record['duration_ms'], reverse=True)
+            return traces[:limit]
+        return traces[-limit:][::-1]
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+def format_trace(record: Dict) -> str:
+    """Трасса в виде дерева span для вывода в чат"""
+    depth = {None: -1}
+    lines = []
+    for span in record['spans']:
+        level = depth.get(span['parent'], 0) + 1
+        depth[span['id']] = level
+        error = ' ❌' if span.get('error') else ''
+        lines.append(f"{'  ' * level}{span['name']} — {span['duration_ms']:.1f} мс{error}")
+    return '\n'.join(lines)
+
+
+# Глобальный трассировщик
+tracer = Tracer()
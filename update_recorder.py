@@ -0,0 +1,155 @@
+"""
+Запись входящего потока обновлений для последующего воспроизведения
+
+Каждое обновление пишется одной компактной JSON-строкой в append-only файл:
+    {"t":1700000000000,"k":"m","u":123456789,"x":"/menu"}
+где t — время в мс, k — тип (m — сообщение, c — нажатие кнопки, l — геолокация),
+u — анонимизированный user_id, x — команда/payload.
+
+Анонимизация: user_id заменяется на HMAC от секретной соли (стабилен в пределах
+записи, но не обратим). Команды сохраняются вместе с аргументами (/search гитара,
+/radius 10), кроме id пользователя: в префиксных командах (/chat_<id>, /show_<id> -
+список берётся из таблицы маршрутов бота, Router.prefixes) и в курсоре
+/search_page <релевантность>:<id> он тоже заменяется на HMAC. В свободном тексте
+буквы заменяются на x, а длинные числа - на девятки; короткие числа (возраст,
+диапазон «20-30», радиус) остаются, чтобы при воспроизведении ввод проходил ту же
+проверку. У геолокации координаты не записываются.
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import re
+import time
+from typing import Dict, Iterator, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+KIND_MESSAGE = 'm'
+KIND_CALLBACK = 'c'
+KIND_LOCATION = 'l'
+
+# Максимальная длина заглушки вместо текста пользователя
+MAX_PLACEHOLDER_LENGTH = 200
+
+# Аргумент с id пользователя: курсор /search_page <релевантность>:<user_id>
+ID_ARGUMENT_RE = re.compile(r'^(-?[\d.]+):(.+)$')
+# Числа длиннее трёх цифр (телефоны, номера) в свободном тексте не сохраняются
+LONG_NUMBER_RE = re.compile(r'\d{4,}')
+LETTER_RE = re.compile(r'[^\W\d_]')
+
+
+def anonymize_user_id(user_id, salt: bytes) -> int:
+    """Стабильный необратимый псевдоним для user_id"""
+    digest = hmac.new(salt, str(user_id).encode(), hashlib.sha256).hexdigest()
+    return int(digest[:12], 16)
+
+
+def anonymize_text(text: Optional[str], salt: bytes, id_prefixes: Sequence[str]) -> str:
+    """Оставить команды, заменить свободный текст заглушкой той же длины
+
+    id_prefixes - префиксы команд, в которых после префикса идёт id пользователя
+    """
+    if not text:
+        return ''
+    command = text.split(maxsplit=1)[0]
+    for prefix in id_prefixes:
+        if command.startswith(prefix) and len(command) > len(prefix):
+            return f"{prefix}{anonymize_user_id(command[len(prefix):], salt)}"
+    if text.startswith('/'):
+        command, *args = text.split()
+        return ' '.join([command] + [_anonymize_argument(arg, salt) for arg in args])
+    return placeholder(text)
+
+
+def _anonymize_argument(arg: str, salt: bytes) -> str:
+    match = ID_ARGUMENT_RE.match(arg)
+    if match:
+        return f"{match.group(1)}:{anonymize_user_id(match.group(2), salt)}"
+    return arg
+
+
+def placeholder(text: str) -> str:
+    """Заглушка того же вида: буквы - x, длинные числа - девятки, остальное как есть"""
+    text = LONG_NUMBER_RE.sub(lambda match: '9' * len(match.group()), text[:MAX_PLACEHOLDER_LENGTH])
+    return LETTER_RE.sub('x', text)
+
+
+def _is_location(attachment) -> bool:
+    attachment_type = getattr(attachment, 'type', None)
+    return getattr(attachment_type, 'value', attachment_type) == 'location'
+
+
+def _update_type(event) -> str:
+    update_type = getattr(event, 'update_type', '')
+    return getattr(update_type, 'value', update_type)
+
+
+def describe_event(event, salt: bytes, id_prefixes: Sequence[str]) -> Optional[Dict]:
+    """Превратить событие maxapi в анонимную запись (None — тип не записывается)"""
+    update_type = _update_type(event)
+    timestamp = getattr(event, 'timestamp', None) or int(time.time() * 1000)
+
+    if update_type == 'message_created':
+        user_id = event.message.sender.user_id
+        body = event.message.body
+        text = body.text if body else None
+        kind = KIND_MESSAGE
+        if not text and body and any(_is_location(attachment) for attachment in body.attachments or []):
+            kind = KIND_LOCATION
+    elif update_type == 'message_callback':
+        user_id = event.callback.user.user_id
+        text = event.callback.payload
+        kind = KIND_CALLBACK
+    else:
+        return None
+
+    return {'t': timestamp, 'k': kind, 'u': anonymize_user_id(user_id, salt),
+            'x': anonymize_text(text, salt, id_prefixes)}
+
+
+class UpdateRecorder:
+    """Пишет анонимизированные обновления в append-only JSON lines файл"""
+
+    def __init__(self, path: str, salt: str, id_prefixes: Sequence[str]):
+        self.path = path
+        self.salt = salt.encode()
+        # Самый длинный префикс первым, как в Router.resolve
+        self.id_prefixes = tuple(sorted(id_prefixes, key=len, reverse=True))
+        self.recorded = 0
+        self._file = open(path, 'a', encoding='utf-8', buffering=1)
+
+    def record(self, event):
+        """Записать одно обновление; ошибки записи не должны мешать обработке"""
+        try:
+            entry = describe_event(event, self.salt, self.id_prefixes)
+            if entry is None:
+                return
+            self._file.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+            self.recorded += 1
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось записать обновление: {e}")
+
+    def install(self, dp):
+        """Перехватывать все обновления, которые получает диспетчер"""
+        original_handle = dp.handle
+
+        async def handle(event_object, *args, **kwargs):
+            self.record(event_object)
+            return await original_handle(event_object, *args, **kwargs)
+
+        dp.handle = handle
+        logger.info(f"📼 Запись обновлений в {self.path}")
+
+    def close(self):
+        self._file.close()
+
+
+def read_recording(path: str) -> Iterator[Dict]:
+    """Прочитать записанные обновления по порядку"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
@@ -2,7 +2,9 @@
 Утилиты и вспомогательные функции
 """
 
-from config import MIN_AGE, MAX_AGE, MAX_BIO_LENGTH
+from config import (
+    MIN_AGE, MAX_AGE, MAX_BIO_LENGTH, MAX_SEARCH_QUERY_LENGTH, GEO_DEFAULT_RADIUS_KM, GEO_MAX_RADIUS_KM,
+)
 from database import db
 from typing import Tuple, Optional
 import re
@@ -29,6 +31,36 @@ def validate_age(age_str: str) -> int:
     except ValueError:
         raise ValidationError("Возраст должен быть числом")
 
+def validate_age_range(range_str: str) -> Tuple[int, int]:
+    """Проверить диапазон возраста вида «20-30»"""
+    parts = range_str.replace('—', '-').replace('–', '-').split('-')
+    if len(parts) != 2:
+        raise ValidationError("Напиши диапазон через дефис, например 20-30")
+    age_min = validate_age(parts[0].strip())
+    age_max = validate_age(parts[1].strip())
+    if age_min > age_max:
+        raise ValidationError("Минимальный возраст больше максимального")
+    return age_min, age_max
+
+def validate_radius(radius_str: str) -> int:
+    """Проверить радиус поиска в км"""
+    try:
+        radius = int(radius_str)
+    except ValueError:
+        raise ValidationError("Радиус должен быть числом километров")
+    if radius < 1 or radius > GEO_MAX_RADIUS_KM:
+        raise ValidationError(f"Радиус должен быть от 1 до {GEO_MAX_RADIUS_KM} км")
+    return radius
+
+def validate_search_query(query: Optional[str]) -> str:
+    """Проверить запрос поиска по описанию"""
+    query = ' '.join((query or '').split())
+    if len(query) < 2:
+        raise ValidationError("Напиши, что искать в описании: `/search гитара горы`")
+    if len(query) > MAX_SEARCH_QUERY_LENGTH:
+        raise ValidationError(f"Запрос должен быть не длиннее {MAX_SEARCH_QUERY_LENGTH} символов")
+    return query
+
 def validate_bio(bio: str) -> bool:
     """Проверить биографию"""
     if not bio or len(bio) < 5 or len(bio) > MAX_BIO_LENGTH:
@@ -76,6 +108,61 @@ def format_user_profile(user: dict) -> str:
 """
     return profile_text
 
+def format_search_preferences(user: dict) -> str:
+    """Форматировать настройки поиска"""
+    age_min, age_max = user.get('pref_age_min'), user.get('pref_age_max')
+    ages = f"{age_min}-{age_max}" if age_min is not None else "любой"
+    genders = user.get('pref_genders') or []
+    genders_text = ', '.join(get_gender_text(gender) for gender in genders) if genders else "любой"
+    if user.get('geohash'):
+        radius = f"{user.get('pref_radius_km') or GEO_DEFAULT_RADIUS_KM} км (/radius)"
+    else:
+        radius = "не ограничен, геолокация не указана (/location)"
+
+    return f"""
+🔍 *Кого я ищу*
+
+🎂 Возраст: {ages}
+⚧️ Пол: {genders_text}
+📍 Радиус: {radius}
+"""
+
+def format_search_results(query: str, page: int, results: list) -> str:
+    """Форматировать страницу результатов поиска"""
+    if not results:
+        if page > 1:
+            return f"🔎 По запросу «{query}» больше ничего нет"
+        return f"😔 По запросу «{query}» никого не нашлось. Попробуй другие слова."
+
+    lines = [f"🔎 *Поиск: «{query}»* (стр. {page})", ""]
+    for profile in results:
+        lines.append(f"👤 *{profile['name']}*, {profile['age']} лет")
+        lines.append(f"{profile['headline']}")
+        lines.append(f"👀 /show_{profile['user_id']}")
+        lines.append("")
+    return '\n'.join(lines)
+
+def parse_search_page_arg(arg: Optional[str]) -> Tuple[int, Optional[Tuple[float, str]], str]:
+    """Разобрать аргумент /search_page <страница> <релевантность>:<user_id> <слова>
+
+    Возвращает (страница не меньше 1, курсор для search_profiles, запрос). Без
+    курсора (кнопка старого формата или ручной ввод) поиск начинается с первой страницы.
+    Испорченный курсор (второе слово с двоеточием) в запрос не попадает
+    """
+    page, _, rest = (arg or '').partition(' ')
+    cursor, _, query = rest.partition(' ')
+    if ':' not in cursor:
+        # Старый формат: /search_page <страница> <слова>
+        return 1, None, rest
+    rank, _, after_id = cursor.partition(':')
+    try:
+        after = (float(rank), after_id) if after_id else None
+    except ValueError:
+        after = None
+    if after is None:
+        return 1, None, query
+    return max(1, int(page)) if page.isdigit() else 1, after, query
+
 def extract_user_from_command(command: str) -> Optional[str]:
     """Извлечь user_id из команды типа /like_user123"""
     parts = command.split('_', 1)
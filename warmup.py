@@ -0,0 +1,54 @@
+"""
+Прогрев процесса перед началом приёма обновлений
+
+После выкатки первые обновления упирались в холодные подключения, пустые кэши
+и сборку клавиатур. warm_up() выполняется в main.py до dp.start_polling():
+открывает пул до минимального размера и прогоняет на каждом подключении запросы
+горячих путей (psycopg2 не готовит выражения на клиенте, поэтому «подготовка» -
+это прогрев каталога и индексов в backend), загружает в кэш профили и состояния
+недавно активных пользователей и собирает клавиатуры и их вложения. Готовность
+(GET /ready, метрика dating_bot_ready) выставляется только после прогрева.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict
+
+from keyboards import preload_keyboards
+from metrics import set_ready
+
+logger = logging.getLogger(__name__)
+
+
+def _warm_up_sync(db, preload_users: int) -> Dict:
+    stats = {}
+    started = time.perf_counter()
+    stats['pool_connections'] = db.open_pool()
+    stats['pool_ms'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    stats['preloaded_users'] = db.preload_recent_users(preload_users) if preload_users else 0
+    stats['preload_ms'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    stats['keyboards'] = preload_keyboards()
+    stats['keyboards_ms'] = (time.perf_counter() - started) * 1000
+    return stats
+
+
+async def warm_up(db, preload_users: int) -> Dict:
+    """Прогреть пул, кэши и клавиатуры, затем отметить процесс готовым"""
+    started = time.perf_counter()
+    # Синхронная работа с БД уходит в поток, чтобы /metrics и /ready отвечали во время прогрева
+    stats = await asyncio.to_thread(_warm_up_sync, db, preload_users)
+    stats['total_ms'] = (time.perf_counter() - started) * 1000
+
+    logger.info(
+        f"🔥 Прогрев завершён за {stats['total_ms']:.0f} мс: "
+        f"подключений {stats['pool_connections']} ({stats['pool_ms']:.0f} мс), "
+        f"пользователей в кэше {stats['preloaded_users']} ({stats['preload_ms']:.0f} мс), "
+        f"клавиатур {stats['keyboards']} ({stats['keyboards_ms']:.0f} мс)"
+    )
+    set_ready(True)
+    return stats
@@ -0,0 +1,154 @@
+"""
+Приём обновлений MAX через вебхук вместо long polling
+
+HTTP-сервер на asyncio принимает POST с JSON обновления, проверяет секрет
+(заголовок X-Max-Bot-Api-Secret) и форму тела и кладёт обновление в ограниченную
+очередь. Ответ 200 уходит сразу, обработку ведут воркеры. Если очередь полна,
+сервер отвечает 503 с Retry-After, и MAX повторит доставку позже - так процесс
+не набирает бесконечный хвост при всплеске трафика.
+
+Несколько процессов с вебхуком можно поставить за балансировщик. Воркеры
+забирают обновления из очереди по порядку; если handle_update обёрнут планировщиком
+(scheduler.py), порядок обновлений одного пользователя сохраняется.
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from metrics import REGISTRY, Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'x-max-bot-api-secret'
+MAX_BODY_BYTES = 1024 * 1024
+
+WEBHOOK_REQUESTS_TOTAL = REGISTRY.register(Counter(
+    'dating_bot_webhook_requests_total', 'Запросы к вебхуку по HTTP-статусу ответа', ('status',)))
+WEBHOOK_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'dating_bot_webhook_queue_depth', 'Обновления в очереди вебхука'))
+WEBHOOK_QUEUE_WAIT = REGISTRY.register(Histogram(
+    'dating_bot_webhook_queue_wait_seconds', 'Время ожидания обновления в очереди вебхука'))
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 401: 'Unauthorized', 404: 'Not Found',
+            405: 'Method Not Allowed', 413: 'Payload Too Large', 503: 'Service Unavailable'}
+
+
+class WebhookServer:
+    """HTTP-приёмник обновлений с ограниченной очередью и пулом воркеров"""
+
+    def __init__(self, handle_update: Callable[[Dict], Awaitable[None]], secret: str = '',
+                 path: str = '/webhook', queue_size: int = 1000, workers: int = 4):
+        self.handle_update = handle_update
+        self.secret = secret
+        self.path = path
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.workers = workers
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._worker_tasks: List[asyncio.Task] = []
+
+    async def start(self, host: str, port: int):
+        """Запустить воркеры и HTTP-сервер"""
+        self._worker_tasks = [asyncio.create_task(self._worker(), name=f'webhook-worker-{i}')
+                              for i in range(self.workers)]
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        logger.info(f"🪝 Вебхук слушает http://{host}:{port}{self.path} "
+                    f"(очередь {self.queue.maxsize}, воркеров {self.workers})")
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Перестать принимать запросы, дообработать очередь и остановить воркеры"""
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Не дообработано обновлений из очереди: {self.queue.qsize()}")
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+
+    # ===== HTTP =====
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            # keep-alive: балансировщик может слать несколько запросов в одном соединении
+            while True:
+                request_line = await asyncio.wait_for(reader.readline(), timeout=30)
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await asyncio.wait_for(reader.readline(), timeout=5)
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                status, keep_alive = await self._handle_request(request_line, headers, reader)
+                WEBHOOK_REQUESTS_TOTAL.inc(str(status))
+                body = _REASONS[status].encode()
+                extra = 'Retry-After: 1\r\n' if status == 503 else ''
+                writer.write(
+                    f'HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Type: text/plain\r\n'
+                    f'Content-Length: {len(body)}\r\n{extra}'
+                    f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode() + body
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, request_line: bytes, headers: Dict[str, str],
+                              reader: asyncio.StreamReader):
+        """Разобрать запрос и поставить обновление в очередь; вернуть (статус, keep-alive)"""
+        parts = request_line.decode('latin-1').split()
+        try:
+            length = int(headers.get('content-length', '0'))
+        except ValueError:
+            return 400, False
+        if length > MAX_BODY_BYTES:
+            return 413, False
+        body = await reader.readexactly(length) if length else b''
+        keep_alive = headers.get('connection', '').lower() != 'close'
+
+        if len(parts) < 2 or parts[1].split('?')[0] != self.path:
+            return 404, keep_alive
+        if parts[0] != 'POST':
+            return 405, keep_alive
+        if self.secret and not hmac.compare_digest(headers.get(SECRET_HEADER, ''), self.secret):
+            return 401, keep_alive
+
+        try:
+            update = json.loads(body)
+        except ValueError:
+            return 400, keep_alive
+        if not isinstance(update, dict) or not isinstance(update.get('update_type'), str):
+            return 400, keep_alive
+
+        try:
+            self.queue.put_nowait((time.perf_counter(), update))
+        except asyncio.QueueFull:
+            return 503, keep_alive
+        WEBHOOK_QUEUE_DEPTH.set(self.queue.qsize())
+        return 200, keep_alive
+
+    # ===== Обработка =====
+
+    async def _worker(self):
+        while True:
+            enqueued_at, update = await self.queue.get()
+            WEBHOOK_QUEUE_DEPTH.set(self.queue.qsize())
+            WEBHOOK_QUEUE_WAIT.observe(time.perf_counter() - enqueued_at)
+            try:
+                await self.handle_update(update)
+            except Exception as e:
+                logger.error(f"❌ Ошибка обработки обновления из вебхука: {e}", exc_info=True)
+            finally:
+                self.queue.task_done()
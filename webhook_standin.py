@@ -0,0 +1,166 @@
+"""
+Локальная замена MAX для проверки вебхука: шлёт поддельные обновления POST-запросами
+
+Отправляет --updates обновлений (вперемешку /menu, /browse, /likes, текст) от
+--users пользователей с заданной конкурентностью и печатает статусы ответов
+(сколько 200 и сколько 503 из-за переполненной очереди) и задержку ответа.
+
+С --serve скрипт сам поднимает WebhookServer на --url. По умолчанию обработчик
+только ждёт --handler-ms (удобно проверять backpressure без БД), с --handlers
+обновления идут в DatingBotHandlers на FakeDispatcher/FakeBot (нужна база DATABASE_URL).
+
+Примеры:
+    python webhook_standin.py --serve --updates 2000 --concurrency 50 --queue-size 100 --handler-ms 20
+    UPDATES_MODE=webhook WEBHOOK_SECRET=s3cret python main.py   # в другом терминале
+    python webhook_standin.py --url http://127.0.0.1:8080/webhook --secret s3cret --updates 100
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+# Добавляем текущую директорию в path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from bench_database import summarize
+from fake_max import FakeBot, FakeDispatcher, MESSAGE_CALLBACK, MESSAGE_CREATED, event_from_payload, make_update_payload
+from webhook_server import SECRET_HEADER, WebhookServer
+
+# Смесь обновлений, которую шлёт замена
+UPDATE_MIX = [
+    (MESSAGE_CREATED, '/menu'),
+    (MESSAGE_CALLBACK, '/browse'),
+    (MESSAGE_CALLBACK, '/view_profile'),
+    (MESSAGE_CALLBACK, '/likes'),
+    (MESSAGE_CALLBACK, '/notifications'),
+    (MESSAGE_CREATED, 'привет'),
+]
+
+
+async def post_update(host: str, port: int, path: str, secret: str, payload: Dict) -> int:
+    """Отправить одно обновление и вернуть HTTP-статус ответа"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        body = json.dumps(payload).encode()
+        headers = (f'POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n'
+                   f'Content-Length: {len(body)}\r\nConnection: close\r\n')
+        if secret:
+            headers += f'{SECRET_HEADER}: {secret}\r\n'
+        writer.write(headers.encode() + b'\r\n' + body)
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def send_updates(url: str, secret: str, users: int, updates: int, concurrency: int,
+                       rnd: random.Random) -> Dict:
+    parts = urlsplit(url)
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses: Counter = Counter()
+    latencies: List[float] = []
+
+    async def send_one():
+        update_type, text = rnd.choice(UPDATE_MIX)
+        payload = make_update_payload(update_type, rnd.randint(1, users), text)
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                status = await post_update(parts.hostname, parts.port or 80, parts.path, secret, payload)
+            except OSError:
+                status = 'connection_error'
+            latencies.append((time.perf_counter() - started) * 1000)
+        statuses[str(status)] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send_one() for _ in range(updates)))
+    elapsed = time.perf_counter() - started
+    return {'statuses': dict(statuses), 'response': summarize(latencies),
+            'elapsed_s': round(elapsed, 3), 'sent_per_sec': round(updates / elapsed, 1)}
+
+
+def build_handler(args: argparse.Namespace):
+    """Обработчик обновлений для локального сервера"""
+    processed = Counter()
+
+    if not args.handlers:
+        async def handle_update(update: Dict):
+            await asyncio.sleep(args.handler_ms / 1000)
+            processed[update['update_type']] += 1
+        return handle_update, processed
+
+    from handlers import DatingBotHandlers
+
+    bot = FakeBot()
+    dp = FakeDispatcher()
+    DatingBotHandlers(dp, bot)
+
+    async def handle_update(update: Dict):
+        await dp.feed(event_from_payload(bot, update))
+        processed[update['update_type']] += 1
+    return handle_update, processed
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Поддельные обновления MAX для вебхука')
+    parser.add_argument('--url', default='http://127.0.0.1:8080/webhook', help='адрес вебхука')
+    parser.add_argument('--secret', default='', help='значение заголовка X-Max-Bot-Api-Secret')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--updates', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=20, help='одновременных запросов')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--serve', action='store_true', help='поднять локальный WebhookServer на --url')
+    parser.add_argument('--handlers', action='store_true', help='с --serve: обрабатывать DatingBotHandlers')
+    parser.add_argument('--handler-ms', type=float, default=5.0, help='с --serve: время «обработки» обновления')
+    parser.add_argument('--queue-size', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=4)
+    return parser.parse_args(argv)
+
+
+async def run(args: argparse.Namespace) -> Dict:
+    server = None
+    processed = None
+    if args.serve:
+        parts = urlsplit(args.url)
+        handle_update, processed = build_handler(args)
+        server = WebhookServer(handle_update, args.secret, parts.path, args.queue_size, args.workers)
+        await server.start(parts.hostname, parts.port or 80)
+
+    try:
+        report = await send_updates(args.url, args.secret, args.users, args.updates,
+                                    args.concurrency, random.Random(args.seed))
+    finally:
+        if server:
+            await server.stop()
+    if processed is not None:
+        report['processed'] = dict(processed)
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+
+    print(f"\n📮 Отправлено {args.updates} обновлений за {report['elapsed_s']} с "
+          f"({report['sent_per_sec']} в секунду)")
+    for status, count in sorted(report['statuses'].items()):
+        print(f"   HTTP {status}: {count}")
+    response = report['response']
+    print(f"⏱️  Ответ вебхука: p50 {response['p50_ms']:.2f} мс, p95 {response['p95_ms']:.2f} мс, "
+          f"p99 {response['p99_ms']:.2f} мс")
+    if 'processed' in report:
+        print(f"✅ Обработано: {sum(report['processed'].values())}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())